@@ -0,0 +1,63 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import vs_circuit_solver as vs  # noqa: E402
+
+
+def board(curves_per_pin):
+    curve = {'voltages': [0., 1.], 'currents': [0., 1e-3],
+             'measurement_settings': {'probe_signal_frequency': 100, 'max_voltage': 5., 'internal_resistance': 475.}}
+    pins = [{'iv_curves': [curve]*n} for n in curves_per_pin]
+    return {'elements': [{'pins': pins}]}
+
+
+class TestBoardProcess(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.out = os.path.join(self.dir, 'board.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_out(self, lines):
+        with open(self.out, 'w') as f:
+            f.write('\n'.join(lines))
+
+    def test_done_keys(self):
+        self.write_out([json.dumps({'element': 0, 'pin': 0, 'iv_curve': 0, 'misfit': 0.01}),
+                        json.dumps({'element': 0, 'pin': 1, 'iv_curve': 0, 'error': 'ngspice failed'}),
+                        json.dumps({'element': 0, 'pin': 2, 'iv_curve': 0, 'misfit': 0.02}),
+                        '{"element": 0, "pin": 3, "iv_cu'])
+        self.assertEqual(vs.board_done_keys(self.out), {(0, 0, 0), (0, 2, 0)})
+
+    def test_done_keys_no_file(self):
+        self.assertEqual(vs.board_done_keys(self.out), set())
+
+    def test_resume(self):
+        board_file = os.path.join(self.dir, 'board.json')
+        with open(board_file, 'w') as f:
+            json.dump(board([1, 1, 1]), f)
+        self.write_out([json.dumps({'element': 0, 'pin': 0, 'iv_curve': 0, 'misfit': 0.01}),
+                        json.dumps({'element': 0, 'pin': 1, 'iv_curve': 0, 'error': 'ngspice failed'}),
+                        '{"element": 0, "pin": 2'])
+
+        def solve(key, curve, cirFileName, **settings):
+            return {'element': key[0], 'pin': key[1], 'iv_curve': key[2], 'misfit': 0.}
+
+        with mock.patch.object(vs, 'solve_iv_curve', side_effect=solve) as solver:
+            records = list(vs.Board_process(board_file, self.out))
+        # подбирается кривая с ошибкой и недописанная
+        self.assertEqual([c[0][0] for c in solver.call_args_list], [(0, 1, 0), (0, 2, 0)])
+        self.assertEqual(len(records), 2)
+        self.assertEqual(vs.board_done_keys(self.out), {(0, 0, 0), (0, 1, 0), (0, 2, 0)})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import MySpice.MySpice as spice  # noqa: E402
+import vs_circuit_solver as vs  # noqa: E402
+
+
+def cvc(value):
+    return spice.CVC_Data(np.full(4, value), np.full(4, -value))
+
+
+# R1 с закороченными C1 и D1, остальные ветви отключены - схема считается PhasorCVC
+def resistor_xi(context, r):
+    sch = vs.Sch_init()
+    sch['R1'] = r
+    sch['_R_D1'] = vs.NULL_R
+    return context.Sch_get_Xi(sch)
+
+
+class TestSimulationCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_lru_eviction(self):
+        cache = spice.SimulationCache(2)
+        cache.put('a', cvc(1.))
+        cache.put('b', cvc(2.))
+        self.assertIsNotNone(cache.get('a'))  # 'a' становится последней использованной
+        cache.put('c', cvc(3.))
+        self.assertIsNone(cache.get('b'))
+        np.testing.assert_array_equal(cache.get('a').input_dummy, np.full(4, 1.))
+        np.testing.assert_array_equal(cache.get('c').VCurrent, np.full(4, -3.))
+        self.assertEqual(cache.stats(), {'hits': 3, 'disk_hits': 0, 'misses': 1, 'size': 2})
+
+    def test_pickle(self):
+        cache = spice.SimulationCache(16, self.dir)
+        cache.put('a', cvc(1.))
+        copy = pickle.loads(pickle.dumps(cache))
+        # передаются только настройки, память у копии своя
+        self.assertEqual((copy.maxsize, copy.path), (16, self.dir))
+        self.assertEqual(copy.stats()['size'], 0)
+
+    def test_npz_persistence(self):
+        spice.SimulationCache(16, self.dir).put('a', cvc(1.))
+        self.assertEqual(len([f for f in os.listdir(self.dir) if f.endswith('.npz')]), 1)
+        cache = spice.SimulationCache(16, self.dir)
+        np.testing.assert_array_equal(cache.get('a').input_dummy, np.full(4, 1.))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats(), {'hits': 0, 'disk_hits': 1, 'misses': 1, 'size': 1})
+
+
+class TestContextCache(unittest.TestCase):
+    def context(self, snr):
+        return vs.SolverContext(SIM_CACHE=spice.SimulationCache(16), INIT_SNR=snr, INIT_F=1e3, INIT_V=5.,
+                                INIT_Rcs=100., SHOW_PLOTS=False)
+
+    def test_key_quantisation(self):
+        ctx = self.context(None)
+        # номиналы в тексте схемы округлены форматом {:e}
+        self.assertEqual(ctx.simulation_key(resistor_xi(ctx, 1000.)), ctx.simulation_key(resistor_xi(ctx, 1000.0001)))
+        self.assertNotEqual(ctx.simulation_key(resistor_xi(ctx, 1000.)), ctx.simulation_key(resistor_xi(ctx, 1001.)))
+
+    def test_noise_after_cache(self):
+        ctx = self.context(40.)
+        xi = resistor_xi(ctx, 1000.)
+        ctx.process_circuit_by_values(xi)
+        first = ctx.analysis.VCurrent.copy()
+        ctx.process_circuit_by_values(xi)
+        self.assertEqual(ctx.SIM_CACHE.stats()['hits'], 1)
+        # повторное вычисление из кэша получает новый шум
+        self.assertFalse(np.array_equal(first, ctx.analysis.VCurrent))
+        clean = ctx.SIM_CACHE.get(ctx.simulation_key(xi)).VCurrent
+        np.testing.assert_allclose(ctx.analysis.VCurrent, clean, atol=0.05*np.ptp(clean))
+
+
+if __name__ == '__main__':
+    unittest.main()
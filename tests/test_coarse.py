@@ -0,0 +1,83 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import vs_circuit_solver as vs  # noqa: E402
+
+
+# R2 параллельно C2, ветви 1 и 3 отключены: схема без диодов считается PhasorCVC
+def rc_sch(R2, C2):
+    sch = vs.Sch_init()
+    for name in ('R1', 'R3'):
+        sch[name] = vs.HUGE_R
+    sch['R2'] = R2
+    sch['C2'] = C2
+    sch['_R_C2'] = vs.HUGE_R
+    return sch
+
+
+class TestCoarseBoundaries(unittest.TestCase):
+    def setUp(self):
+        self.context = vs.SolverContext(SHOW_PLOTS=False)
+        self.context.coarse_fev = 3
+        self.context.coarse_best = None
+        self.context.FitterCount = 0
+        # точки не моделируются: misfit - первая координата, запоминается точность расчета
+        self.coarse_flags = []
+        self.context.Xi_unroll = lambda x: list(x)
+        self.context.calculate_misfit = self.calculate_misfit
+        self.context.evaluate_batch = self.evaluate_batch
+        self.context.fitter_record = lambda xi, misfit, ivcmp_value=None: None
+
+    def calculate_misfit(self, xi):
+        self.coarse_flags += [self.context.coarse]
+        return xi[0]
+
+    def evaluate_batch(self, xis):
+        self.coarse_flags += [self.context.coarse]*len(xis)
+        return [(xi[0], xi[0], np.zeros(1)) for xi in xis]
+
+    def test_subroutine(self):
+        # точка грубая - ее misfit получает оптимизатор, конкурентная пересчитывается точно
+        for x in (5., 4., 3., 2., 1.):
+            self.context.fitter_subroutine([x])
+        self.assertEqual(self.coarse_flags, [True, False, True, False, True, False, False, False])
+
+    def test_batch_split(self):
+        misfits = self.context.fitter_batch([[5.], [4.], [3.], [2.], [1.]])
+        np.testing.assert_array_equal(misfits, [5., 4., 3., 2., 1.])
+        self.assertEqual(self.coarse_flags.count(True), 3)
+        self.assertEqual(self.context.FitterCount, 5)
+        # следующий пакет уже целиком точный
+        self.coarse_flags = []
+        self.context.fitter_batch([[1.], [2.]])
+        self.assertEqual(self.coarse_flags, [False, False])
+
+    def test_sim_points(self):
+        self.context.MAX_NUM_POINTS = 40
+        self.context.coarse = True
+        self.assertEqual(self.context.sim_points(), 40)
+
+
+class TestCoarseStart(unittest.TestCase):
+    def test_start_sessions(self):
+        context = vs.SolverContext(MULTI_FIDELITY=True, INIT_SNR=None, SHOW_PLOTS=False, IVCMP_ENGINE='numpy',
+                                   MISFIT_METHOD='type_ps')
+        context.init_target_by_Sch(rc_sch(1e3, 1e-7))
+        exact = vs.Session_create(rc_sch(1e3, 1e-7))
+        far = vs.Session_create(rc_sch(1e5, 1e-9))
+        context.Session_run_batch([far, exact])
+
+        # точный misfit только у схемы, которая может удовлетворить условию останова
+        self.assertLess(exact['misfit'], 1e-6)
+        self.assertIn('coarse_misfit', exact)
+        self.assertEqual(far['misfit'], np.inf)
+        self.assertGreater(far['coarse_misfit'], exact['misfit'])
+
+
+if __name__ == '__main__':
+    unittest.main()
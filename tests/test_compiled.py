@@ -0,0 +1,63 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import MySpice.MySpice as spice  # noqa: E402
+import vs_circuit_solver as vs  # noqa: E402
+
+MODELS = {vs.DIODE_MODEL_NAME: ('D', vs.DIODE_MODEL)}
+
+# R1-C1-D1, R2 и R3-D3: схемы с конденсаторами и диодами
+SCHEMATICS = [
+    [('R1', '_net1', 'input', 1e3), ('C1', '_net0', '_net1', 1e-7), ('R_D1', '0', '_net0', 1e-6),
+     ('R2', '0', 'input', 5e3)],
+    [('R1', '_net0', 'input', 1e3), ('D1', '_net0', '0', vs.DIODE_MODEL_NAME)],
+    [('R1', '_net1', 'input', 2e2), ('C1', '_net0', '_net1', 1e-6), ('D1', '_net0', '0', vs.DIODE_MODEL_NAME),
+     ('R2', '0', 'input', 1e4), ('R3', '_net2', 'input', 5e2), ('D3', '0', '_net2', vs.DIODE_MODEL_NAME)],
+]
+
+
+def ngspice_available():
+    try:
+        spice.NgSpiceShared.new_instance()
+    except Exception:
+        return False
+    return True
+
+
+# номиналы R и C схемы, умноженные на k
+def scaled(elements, k):
+    return [(name, n1, n2, value*k if name[0] in ('R', 'C') else value) for name, n1, n2, value in elements]
+
+
+@unittest.skipUnless(ngspice_available(), 'ngspice shared library is not available')
+class TestCompiledCircuit(unittest.TestCase):
+    def assert_same(self, compiled, reference):
+        for a, b in ((compiled.input_dummy, reference.input_dummy), (compiled.VCurrent, reference.VCurrent)):
+            b = np.asarray(b, dtype=float)
+            np.testing.assert_allclose(a, b, atol=1e-3*np.ptp(b))
+
+    def test_against_create_cvc1(self):
+        data = spice.Init_Data(1e4, 5., 100., None)
+        for elements in SCHEMATICS:
+            compiled = spice.CompiledCircuit(spice.CreateCircuit(elements, MODELS), data, 100, 'input', 10)
+            # сначала исходные номиналы, затем измененные командой alter, без перезагрузки схемы
+            results = []
+            try:
+                for k in (1., 1.5, 0.5):
+                    values = {name: value for name, n1, n2, value in scaled(elements, k) if name[0] in ('R', 'C')}
+                    results += [compiled.run(values)]
+            finally:
+                compiled.release()
+
+            for k, result in zip((1., 1.5, 0.5), results):
+                reference = spice.CreateCVC1(spice.CreateCircuit(scaled(elements, k), MODELS), data, 100, 'input', 10)
+                self.assert_same(result, reference)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import MySpice.MySpice as spice  # noqa: E402
+import vs_circuit_solver as vs  # noqa: E402
+
+
+# R2 параллельно C2, ветви 1 и 3 отключены: схема без диодов считается PhasorCVC
+def rc_sch(R2, C2):
+    sch = vs.Sch_init()
+    for name in ('R1', 'R3'):
+        sch[name] = vs.HUGE_R
+    sch['R2'] = R2
+    sch['C2'] = C2
+    sch['_R_C2'] = vs.HUGE_R
+    return sch
+
+
+# две цели с разными частотами, кэшами и кривыми
+TARGETS = [({'INIT_F': 1e4}, rc_sch(1e3, 1e-7), [rc_sch(r, 1e-7) for r in (1e3, 2e3, 5e2)]),
+           ({'INIT_F': 1e3}, rc_sch(5e3, 1e-8), [rc_sch(5e3, c) for c in (1e-8, 3e-8, 1e-9)])]
+
+
+def create_context(settings, target, cache=None):
+    context = vs.SolverContext(INIT_SNR=None, SHOW_PLOTS=False, IVCMP_ENGINE='numpy', SIM_CACHE=cache, **settings)
+    context.init_target_by_Sch(target)
+    return context
+
+
+class TestSolverContext(unittest.TestCase):
+    def test_independent(self):
+        # каждая цель отдельно, без кэша
+        expected = []
+        for settings, target, candidates in TARGETS:
+            context = create_context(settings, target)
+            expected += [[context.calculate_misfit(context.Sch_get_Xi(sch)) for sch in candidates]]
+
+        module_f = vs.INIT_F
+        contexts = [create_context(settings, target, spice.SimulationCache(16)) for settings, target, _ in TARGETS]
+        # вызовы контекстов чередуются, каждая схема считается дважды (второй раз из кэша)
+        for repeat in range(2):
+            for i in range(3):
+                for k, (context, (settings, target, candidates)) in enumerate(zip(contexts, TARGETS)):
+                    misfit = context.calculate_misfit(context.Sch_get_Xi(candidates[i]))
+                    self.assertAlmostEqual(misfit, expected[k][i], places=12)
+
+        # в кэше контекста только его схемы: цель совпадает с первой схемой
+        for context, (settings, target, candidates) in zip(contexts, TARGETS):
+            self.assertEqual(context.INIT_F, settings['INIT_F'])
+            self.assertEqual(context.SIM_CACHE.stats()['misses'], 3)
+            self.assertEqual(context.SIM_CACHE.stats()['hits'], 4)
+        self.assertEqual(vs.INIT_F, module_f)
+        self.assertNotEqual(contexts[0].min_var_c, contexts[1].min_var_c)
+        self.assertIsNot(contexts[0].Xi_long, contexts[1].Xi_long)
+        self.assertIsNot(contexts[0].Xi_mask, contexts[1].Xi_mask)
+
+    def test_unknown_setting(self):
+        with self.assertRaises(TypeError):
+            vs.SolverContext(NO_SUCH_SETTING=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import vs_circuit_solver as vs  # noqa: E402
+
+
+# R2 параллельно C2, ветви 1 и 3 отключены: схема без диодов считается PhasorCVC
+def rc_sch(R2, C2):
+    sch = vs.Sch_init()
+    for name in ('R1', 'R3'):
+        sch[name] = vs.HUGE_R
+    sch['R2'] = R2
+    sch['C2'] = C2
+    sch['_R_C2'] = vs.HUGE_R
+    return sch
+
+
+class TestFitterLM(unittest.TestCase):
+    def test_recovers_rc(self):
+        np.random.seed(0)
+        context = vs.SolverContext(FITTER_METHOD='lm', MAXFEV=60, INIT_SNR=None, SHOW_PLOTS=False,
+                                   IVCMP_ENGINE='numpy', IVCMP_NUMPY_TOLERANCE=1e-6, MISFIT_METHOD='type_ps')
+        context.init_target_by_Sch(rc_sch(1e3, 1e-7))
+
+        ses = vs.Session_create(rc_sch(3e3, 3e-8))
+        ses['Xi_variable'] = ['R2', 'C2']
+        context.Session_run_fitter(ses)
+
+        sch = ses['result_sch']
+        self.assertAlmostEqual(sch['R2']/1e3, 1., delta=0.01)
+        self.assertAlmostEqual(sch['C2']/1e-7, 1., delta=0.01)
+
+
+class TestFitterDE(unittest.TestCase):
+    def fit(self, maxfev=400):
+        context = vs.SolverContext(FITTER_METHOD='de', MAXFEV=maxfev, INIT_SNR=None, SHOW_PLOTS=False, DE_SEED=1,
+                                   IVCMP_ENGINE='numpy', IVCMP_NUMPY_TOLERANCE=1e-3, MISFIT_METHOD='type_ps')
+        context.init_target_by_Sch(rc_sch(1e3, 1e-7))
+        ses = vs.Session_create(rc_sch(3e3, 3e-8))
+        ses['Xi_variable'] = ['R2', 'C2']
+        context.Session_run_fitter(ses)
+        return ses
+
+    def test_recovers_rc(self):
+        sch = self.fit()['result_sch']
+        self.assertAlmostEqual(sch['R2']/1e3, 1., delta=0.05)
+        self.assertAlmostEqual(sch['C2']/1e-7, 1., delta=0.05)
+
+    def test_reproducible(self):
+        first = self.fit(40)
+        second = self.fit(40)
+        self.assertEqual(first['result_sch'], second['result_sch'])
+        self.assertEqual(first['misfit'], second['misfit'])
+
+
+# DE сравнивает пробную точку и родителя при одной точности моделирования
+class TestFitterDEFidelity(unittest.TestCase):
+    def test_same_fidelity(self):
+        context = vs.SolverContext(DE_SEED=0, DE_POPULATION=2, SHOW_PLOTS=False)
+        context.Xi_log_bounds = lambda: (np.array([-5.]), np.array([5.]))
+        context.coarse_fev = 4
+        context.coarse_best = None
+        context.FitterCount = 0
+        context.Xi_unroll = lambda x: np.array(x, dtype=float)
+        context.fitter_record = lambda xi, misfit, ivcmp_value=None: None
+        # misfit - модуль координаты, грубый misfit занижен на 10
+        compared = []
+
+        def evaluate_batch(xis):
+            return [(abs(xi[0]) - (10. if context.coarse else 0.), None, np.zeros(1)) for xi in xis]
+
+        context.evaluate_batch = evaluate_batch
+        fitter_batch_fidelity = context.fitter_batch_fidelity
+
+        def batch_fidelity(X_list):
+            misfits, coarse = fitter_batch_fidelity(X_list)
+            compared.append(coarse.copy())
+            return misfits, coarse
+
+        context.fitter_batch_fidelity = batch_fidelity
+        x = vs.fitter_de(context, np.array([3.]), 40)
+        # первое поколение грубое, потомки уже точные, и перед сравнением с ними
+        # родители пересчитываются точно
+        self.assertTrue(all(compared[0]))
+        self.assertFalse(any(compared[1]))
+        self.assertEqual(len(compared[2]), 4)
+        self.assertFalse(any(compared[2]))
+        # с грубыми родителями (misfit < -6) ни один точный потомок не был бы принят
+        self.assertLess(x[0], 2.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import vs_circuit_solver as vs  # noqa: E402
+
+
+class TestHalfwaveSplit(unittest.TestCase):
+    def setUp(self):
+        self.context = vs.SolverContext(HALFWAVE_SPLIT=True, HALFWAVE_FEV_SHARE=0.5, HALFWAVE_MIN_FEV=10,
+                                        MAXFEV=100, SHOW_PLOTS=False)
+        # подбор не моделирует схемы: запоминаются вызовы
+        self.halfwaves = []
+        self.joint = []
+        self.context.Session_run_halfwave_fitter = self.run_halfwave_fitter
+        self.context.Session_run_fitter = self.run_fitter
+        self.session = vs.Session_create(vs.Sch_init())
+        self.session['Xi_variable'] = ['R1', 'C1', 'R2', 'R3', 'C3']
+
+    def run_halfwave_fitter(self, ses, maxfev, coarse_fev, halfwave):
+        self.halfwaves += [(halfwave, sorted(ses['Xi_variable']), maxfev)]
+        ses['result_sch'] = dict(ses['start_sch'])
+        ses['fCount'] = maxfev
+        ses['mCount'] = 0
+
+    def run_fitter(self, ses, maxfev=None, coarse_fev=None, split=True):
+        self.joint += [maxfev]
+        ses['fCount'] = maxfev
+
+    def test_split(self):
+        self.assertTrue(self.context.Session_run_halfwave(self.session, 100))
+        self.assertEqual(self.halfwaves, [(1, ['C1', 'R1'], 25), (-1, ['C3', 'R3'], 25)])
+        self.assertEqual(self.joint, [50])
+        self.assertEqual(self.session['fCount'], 100)
+
+    def test_small_maxfev(self):
+        # 'halving' с HALVING_MIN_FEV = 10: по 2 вычисления на полуволну - подбор не делится
+        self.assertFalse(self.context.Session_run_halfwave(self.session, 10))
+        self.assertEqual(self.halfwaves, [])
+
+    def test_success_reset(self):
+        # успех прошлой сессии не принимается за успех полуволны
+        self.context.FITTER_SUCCESS = True
+        self.assertTrue(self.context.Session_run_halfwave(self.session, 100))
+        self.assertEqual(self.joint, [50])
+
+    def test_no_diode_branch(self):
+        self.session['Xi_variable'] = ['R1', 'C1', 'R2']
+        self.assertFalse(self.context.Session_run_halfwave(self.session, 100))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import ctypes
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import ivcmp.ivcmp as ivcmp  # noqa: E402
+import MySpice.MySpice as spice  # noqa: E402
+import vs_circuit_solver as vs  # noqa: E402
+
+PHASE = 2 * np.pi * np.arange(100) / 100
+
+
+# синусоидальная ВАХ резистора r с амплитудой напряжения 5 В
+def resistor_curve(r):
+    voltages = 5. * np.sin(PHASE)
+    return ivcmp.IvCurve(voltages, voltages / r)
+
+
+class TestCompareIvcNumpy(unittest.TestCase):
+    def test_identical(self):
+        curve = resistor_curve(1e3)
+        self.assertEqual(ivcmp.CompareIvcNumpy(curve, curve, 0.05, 5e-5), 0.)
+
+    def test_single_points(self):
+        # у одной точки разброс нулевой, масштаб осей - пороги шума
+        first = ivcmp.IvCurve([0.], [0.])
+        second = ivcmp.IvCurve([0.3], [0.8])
+        self.assertAlmostEqual(ivcmp.CompareIvcNumpy(first, second, 0.1, 0.2), 5.)
+
+    def test_two_points(self):
+        # точки (0, 0), (2, 0) против (0, 1), (2, 1): масштаб напряжения - разброс 1,
+        # тока - порог 0.5, каждая точка на расстоянии 2 от ближайшей
+        first = ivcmp.IvCurve([0., 2.], [0., 0.])
+        second = ivcmp.IvCurve([0., 2.], [1., 1.])
+        self.assertAlmostEqual(ivcmp.CompareIvcNumpy(first, second, 0.1, 0.5), 2.)
+
+    def test_tolerance_reference(self):
+        misfit = ivcmp.CompareIvcNumpy(resistor_curve(1e3), resistor_curve(1.06e3), 0.05, 5e-5)
+        self.assertAlmostEqual(misfit, 0.0435, places=4)
+        self.assertLessEqual(misfit, ivcmp.NUMPY_TOLERANCE)
+        misfit = ivcmp.CompareIvcNumpy(resistor_curve(1e3), resistor_curve(1.1e3), 0.05, 5e-5)
+        self.assertGreater(misfit, ivcmp.NUMPY_TOLERANCE)
+
+    def test_batch(self):
+        target = resistor_curve(1e3)
+        curves = [resistor_curve(r) for r in (900., 1e3, 1.2e3)]
+        batch = ivcmp.CompareIvcBatch(target, [c.voltages for c in curves], [c.currents for c in curves],
+                                      0.05, 5e-5, engine='numpy')
+        for misfit, curve in zip(batch, curves):
+            self.assertAlmostEqual(misfit, ivcmp.CompareIvcNumpy(target, curve, 0.05, 5e-5))
+
+    def test_engine_is_explicit(self):
+        curve = resistor_curve(1e3)
+        self.assertEqual(ivcmp.ENGINE, 'native')
+        self.assertEqual(ivcmp.CompareIvc(curve, curve, 0.05, 5e-5, engine='numpy'), 0.)
+        if ivcmp.lib is None:
+            with self.assertRaises(OSError):
+                ivcmp.CompareIvc(curve, curve, 0.05, 5e-5)
+
+
+# указатели, передаваемые в CompareIVC, должны указывать на сами массивы кривой
+class TestIvCurveBuffers(unittest.TestCase):
+    def address(self, pointer):
+        return ctypes.cast(pointer, ctypes.c_void_p).value
+
+    def test_pointers(self):
+        curve = resistor_curve(1e3)
+        voltages, currents, length = curve._pointers()
+        self.assertEqual(self.address(voltages), curve.voltages.ctypes.data)
+        self.assertEqual(self.address(currents), curve.currents.ctypes.data)
+        self.assertEqual(length, 100)
+        self.assertEqual(voltages[1], curve.voltages[1])
+
+    def test_float64_not_copied(self):
+        voltages = 5. * np.sin(PHASE)
+        currents = voltages / 1e3
+        curve = ivcmp.IvCurve(voltages, currents)
+        self.assertIs(curve.voltages, voltages)
+        self.assertIs(curve.currents, currents)
+
+    def test_converted(self):
+        voltages = 5. * np.sin(2 * np.pi * np.arange(200) / 200)
+        # каждая вторая точка - массив не непрерывный; float32 и список
+        for v, c in ((voltages[::2], voltages[::2] / 1e3),
+                     (voltages[:100].astype(np.float32), (voltages[:100] / 1e3).astype(np.float32)),
+                     (list(voltages[:100]), list(voltages[:100] / 1e3))):
+            curve = ivcmp.IvCurve(v, c)
+            for array, source in ((curve.voltages, v), (curve.currents, c)):
+                self.assertEqual(array.dtype, np.float64)
+                self.assertTrue(array.flags['C_CONTIGUOUS'])
+                np.testing.assert_array_equal(array, np.asarray(source, dtype=np.float64))
+            pointers = curve._pointers()
+            self.assertEqual(self.address(pointers[0]), curve.voltages.ctypes.data)
+            self.assertEqual(self.address(pointers[1]), curve.currents.ctypes.data)
+
+    def test_length(self):
+        with self.assertRaises(ValueError):
+            ivcmp.IvCurve([0., 1.], [0.])
+        # length меньше числа точек ограничивает сравниваемую часть кривой
+        curve = resistor_curve(1e3)
+        curve.length = 50
+        self.assertEqual(curve._pointers()[2], 50)
+
+
+DATA = spice.Init_Data(1e4, 5., 100., None)
+DIODE_MODEL = {'Is': 2.22e-10, 'N': 1.65, 'Rs': 0.0686}
+
+
+# кривые разной формы, k - множитель определяющего номинала
+def shape_curve(shape, k):
+    if shape == 'resistor':
+        cvc = spice.PhasorCVC([('R2', '0', 'input', 1e3*k)], DATA, 100)
+    elif shape == 'rc':
+        cvc = spice.PhasorCVC([('R2', '_net4', 'input', 1e3), ('C2', '0', '_net4', 1e-8*k)], DATA, 100)
+    else:
+        R, D = {'diode': ([1e3*k, np.inf, np.inf], [1, 0, 0]),
+                'diode_resistor': ([1e2*k, 1e3, np.inf], [1, 0, 0]),
+                'two_diodes': ([1e3*k, np.inf, 3e2], [1, 0, -1])}[shape]
+        # без конденсаторов установившийся режим наступает сразу
+        cvc = spice.BranchNetworkCVC([R], [[0., 0., 0.]], [D], DATA, 100, DIODE_MODEL, cycle=2)[0]
+    return ivcmp.IvCurve(cvc.input_dummy[:99], cvc.VCurrent[:99])
+
+
+class TestNumpyTolerance(unittest.TestCase):
+    # порог NUMPY_TOLERANCE принимает отклонение номинала на 6% и отвергает
+    # отклонение на 30% на кривых всех форм
+    def test_shapes(self):
+        for shape in ('resistor', 'rc', 'diode', 'diode_resistor', 'two_diodes'):
+            target = shape_curve(shape, 1.)
+            min_var_v = 0.01*np.max(target.voltages)
+            min_var_c = 0.01*np.max(target.currents)
+            close = ivcmp.CompareIvcNumpy(target, shape_curve(shape, 1.06), min_var_v, min_var_c)
+            far = ivcmp.CompareIvcNumpy(target, shape_curve(shape, 1.3), min_var_v, min_var_c)
+            self.assertLessEqual(close, ivcmp.NUMPY_TOLERANCE, shape)
+            self.assertGreater(far, ivcmp.NUMPY_TOLERANCE, shape)
+
+
+# R2 параллельно C2, ветви 1 и 3 отключены: схема без диодов считается PhasorCVC
+def rc_sch(R2, C2):
+    sch = vs.Sch_init()
+    for name in ('R1', 'R3'):
+        sch[name] = vs.HUGE_R
+    sch['R2'] = R2
+    sch['C2'] = C2
+    sch['_R_C2'] = vs.HUGE_R
+    return sch
+
+
+class TestContextBatch(unittest.TestCase):
+    def test_evaluate_batch(self):
+        context = vs.SolverContext(INIT_SNR=None, SHOW_PLOTS=False, IVCMP_ENGINE='numpy')
+        context.init_target_by_Sch(rc_sch(1e3, 1e-7))
+        xis = [context.Sch_get_Xi(rc_sch(r, 1e-7)) for r in (1e3, 2e3, 5e2)]
+
+        calls = []
+        compare = context.compare_IVCurves_batch
+
+        def compare_batch(voltages, currents):
+            calls.append(len(voltages))
+            return compare(voltages, currents)
+
+        context.compare_IVCurves_batch = compare_batch
+        results = context.evaluate_batch(xis)
+        # все кривые пакета сравниваются одним вызовом
+        self.assertEqual(calls, [3])
+        for xi, (misfit, ivcmp_value, residuals) in zip(xis, results):
+            expected = context.evaluate_Xi(xi)
+            self.assertAlmostEqual(misfit, expected[0])
+            self.assertAlmostEqual(ivcmp_value, expected[1])
+            np.testing.assert_allclose(residuals, expected[2])
+        self.assertAlmostEqual(results[0][0], 0.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import vs_circuit_solver as vs  # noqa: E402
+
+# перемычки D1 и D3: схемы без диодов считаются PhasorCVC, без ngspice
+DIODES_SHORTED = 16+64
+SETTINGS = {'IVCMP_ENGINE': 'numpy', 'INIT_SNR': None, 'MAXFEV': 100}
+
+
+# R1 1 кОм последовательно с C1 10 нФ, R2 5 кОм, R3 20 кОм
+def target_sch():
+    sch = vs.Sch_init()
+    sch['R1'] = 1e3
+    sch['C1'] = 1e-8
+    sch['_R_C1'] = vs.HUGE_R
+    sch['_R_D1'] = vs.NULL_R
+    sch['R2'] = 5e3
+    sch['R3'] = 2e4
+    sch['_R_D3'] = vs.NULL_R
+    return sch
+
+
+def board_curve(F):
+    context = vs.SolverContext(INIT_F=F, INIT_SNR=None, SHOW_PLOTS=False)
+    context.init_target_by_Sch(target_sch())
+    return {'voltages': list(context.target_input_dummy), 'currents': list(context.target_VCurrent),
+            'measurement_settings': {'probe_signal_frequency': F, 'max_voltage': context.INIT_V,
+                                     'internal_resistance': context.INIT_Rcs}}
+
+
+# исходные функции, на время подбора подменяются вариантами без диодов
+switchers_list = vs.switchers_list
+reopened_switchers = vs.reopened_switchers
+
+
+def switchers_without_diodes():
+    codes, skipped = switchers_list()
+    return [swcode for swcode in codes if (swcode & DIODES_SHORTED) == DIODES_SHORTED], skipped
+
+
+def reopened_without_diodes(swcode):
+    return [code for code in reopened_switchers(swcode) if (code & DIODES_SHORTED) == DIODES_SHORTED]
+
+
+class TestMultifrequency(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        # файлы плат перечислены не по возрастанию частоты
+        self.files = []
+        for F in (1e5, 1.):
+            fileName = os.path.join(self.dir, '{:g}.json'.format(F))
+            with open(fileName, 'w') as f:
+                json.dump({'elements': [{'pins': [{'iv_curves': [board_curve(F)]}]}]}, f)
+            self.files += [fileName]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_frequency_curves(self):
+        curves = vs.board_frequency_curves(self.files, 0, 0)
+        self.assertEqual([F for F, curve in curves], [1., 1e5])
+        self.assertEqual(curves[0][1]['measurement_settings']['probe_signal_frequency'], 1.)
+
+    def test_freeze_reopen(self):
+        fitted = []
+        solve = vs.SolverContext.Session_processAll
+
+        def processAll(context, fileName='result.txt', codes=None):
+            ses = solve(context, fileName, codes)
+            fitted.append((context.frozen_sch, dict(ses['result_sch'])))
+            return ses
+
+        with mock.patch.object(vs, 'switchers_list', switchers_without_diodes), \
+                mock.patch.object(vs, 'reopened_switchers', reopened_without_diodes), \
+                mock.patch.object(vs.SolverContext, 'Session_processAll', processAll):
+            ses = vs.Board_solve_multifrequency(self.files, 0, 0, os.path.join(self.dir, 'result.cir'), **SETTINGS)
+
+        (frozen_low, low), (frozen_high, high) = fitted
+        # на 1 Гц ветвь с C1 не проводит: R2||R3 = 4 кОм, конденсаторов нет
+        self.assertIsNone(frozen_low)
+        self.assertEqual(vs.switchers_by_sch(low) & vs.CAPACITORS_SHORTED, vs.CAPACITORS_SHORTED)
+        self.assertAlmostEqual(1/sum(1/low[r] for r in ('R1', 'R2', 'R3') if low[r] < vs.BIG_R)/4e3, 1., delta=1e-3)
+
+        # на 100 кГц номиналы включенных ветвей не меняются, отключенная ветвь включается с конденсатором
+        self.assertEqual(frozen_high, low)
+        for r in ('R1', 'R2', 'R3'):
+            if low[r] < vs.BIG_R:
+                self.assertEqual(high[r], low[r])
+        reopened = [(r, r_c) for r, r_c in (('R1', '_R_C1'), ('R3', '_R_C3')) if low[r] >= vs.BIG_R > high[r]]
+        self.assertTrue(reopened)
+        self.assertTrue(all(high[r_c] >= vs.BIG_R for r, r_c in reopened))
+
+        tolerance = vs.SolverContext(**SETTINGS).ivcmp_tolerance()
+        self.assertEqual(sorted(ses['frequency_misfit']), [1., 1e5])
+        self.assertTrue(all(misfit < tolerance for misfit in ses['frequency_misfit'].values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
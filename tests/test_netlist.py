@@ -0,0 +1,131 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import MySpice.MySpice as spice  # noqa: E402
+import vs_circuit_solver as vs  # noqa: E402
+
+
+# файл схемы, как его писал generate_circuitFile_by_values до построения схемы в памяти
+def baseline_netlist(rc_values):
+    BIG_R = vs.BIG_R
+    text = '* cir file corresponding to the equivalent circuit.\n'
+    # * Цепь 1
+    if rc_values[0] < BIG_R:  # цепь R1 присутствует
+        if rc_values[2] >= BIG_R:  # C1 присутствует
+            text += 'R1 _net1 input {:e}\n'.format(rc_values[0])
+            text += 'C1 _net0 _net1 {:e}\n'.format(rc_values[1])
+        else:  # С1 нет
+            text += 'R1 _net0 input {:e}\n'.format(rc_values[0])
+
+        if rc_values[3] >= BIG_R:  # D1 присутствует
+            text += 'D1 _net0 0 DMOD_D1 AREA=1.0 Temp=26.85\n'
+        else:  # вместо D1 перемычка
+            text += 'R_D1 0 _net0 {:e}\n'.format(rc_values[3])
+
+    # * Цепь 2
+    if rc_values[4] < BIG_R:
+        if rc_values[6] >= BIG_R:  # C2 присутствует
+            text += 'R2 _net4 input {:e}\n'.format(rc_values[4])
+            text += 'C2 0 _net4 {:e}\n'.format(rc_values[5])
+        else:  # вместо С2 перемычка, R2 сразу на землю
+            text += 'R2 0 input {:e}\n'.format(rc_values[4])
+
+    # * Цепь 3
+    if rc_values[7] < BIG_R:
+        if rc_values[9] >= BIG_R:  # C3 присутствует
+            text += 'R3 _net3 input {:e}\n'.format(rc_values[7])
+            text += 'C3 _net2 _net3 {:e}\n'.format(rc_values[8])
+        else:  # С3 нет
+            text += 'R3 _net2 input {:e}\n'.format(rc_values[7])
+
+        if rc_values[10] >= BIG_R:  # D3 присутствует
+            text += 'D3 0 _net2 DMOD_D1 AREA=1.0 Temp=26.85\n'
+        else:  # вместо D3 перемычка
+            text += 'R_D3 0 _net2 {:e}\n'.format(rc_values[10])
+
+    # есть диоды, добавляем модель
+    if (rc_values[10] >= BIG_R) or (rc_values[3] >= BIG_R):
+        text += ('.MODEL DMOD_D1 D (Is=2.22e-10 N=1.65 Cj0=4e-12 M=0.333 '
+                 'Vj=0.7 Fc=0.5 Rs=0.0686 Tt=5.76e-09 Ikf=0 Kf=0 Af=1 Bv=75 '
+                 'Ibv=1e-06 Xti=3 Eg=1.11 Tcv=0 Trs=0 Ttt1=0 Ttt2=0 Tm1=0 Tm2=0 Tnom=26.85 )\n')
+
+    return text+'.END'
+
+
+# прежний файл добавлял модель диода и тогда, когда ветви с диодом нет в схеме.
+# Новая схема неиспользуемую модель не содержит, на результат моделирования она не влияет
+def without_unused_model(lines):
+    if any(line.startswith('D') for line in lines):
+        return lines
+    return [line for line in lines if not line.upper().startswith('.MODEL')]
+
+
+# строки элементов str(circuit) без заголовка. Числа приводятся к формату {:e}
+# файла схемы: в файле номиналы округлены до 7 значащих цифр
+def element_lines(circuit):
+    lines = []
+    for line in str(circuit).splitlines()[1:]:
+        tokens = []
+        for token in line.split():
+            try:
+                token = '{:e}'.format(float(token))
+            except ValueError:
+                pass
+            tokens += [token]
+        if tokens:
+            lines += [' '.join(tokens)]
+    return lines
+
+
+def schematic(**values):
+    sch = vs.Sch_init()
+    sch.update(values)
+    return sch
+
+
+# схемы с разным набором ветвей, конденсаторов и перемычек вместо диодов, пустая схема
+SCHEMATICS = [
+    schematic(R1=1e3, C1=1e-7, R2=5e3, C2=1e-9, R3=200.),
+    schematic(R1=123.456789, C1=2.2e-8, _R_C1=vs.HUGE_R, R2=4.7e3, C2=3.3e-7, _R_C2=vs.HUGE_R,
+              R3=1e4, C3=1e-6, _R_C3=vs.HUGE_R),
+    schematic(R1=1e3, _R_D1=10., R2=vs.HUGE_R, R3=2e3, C3=1e-8, _R_C3=vs.HUGE_R, _R_D3=1.),
+    schematic(R1=vs.HUGE_R, R2=1e3, R3=vs.HUGE_R),
+    schematic(R1=vs.HUGE_R, R2=vs.HUGE_R, R3=vs.HUGE_R),
+]
+
+
+class TestCircuitInMemory(unittest.TestCase):
+    def setUp(self):
+        self.context = vs.SolverContext(SHOW_PLOTS=False)
+        self.dir = tempfile.TemporaryDirectory()
+        self.fileName = os.path.join(self.dir.name, 'var1.cir')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    # схема из файла, записанного прежним способом
+    def load_baseline(self, Xi):
+        with open(self.fileName, 'w') as f:
+            f.write(baseline_netlist(self.context.Xi_to_RC(Xi)))
+        return spice.LoadFile(self.fileName)
+
+    def test_same_as_file(self):
+        for sch in SCHEMATICS:
+            Xi = self.context.Sch_get_Xi(sch)
+            expected = without_unused_model(element_lines(self.load_baseline(Xi)))
+            self.assertEqual(element_lines(self.context.generate_circuit_by_values(Xi)), expected)
+
+    def test_file_unchanged(self):
+        # файл схемы по-прежнему совпадает с прежним текстом
+        for sch in SCHEMATICS:
+            Xi = self.context.Sch_get_Xi(sch)
+            expected = without_unused_model(baseline_netlist(self.context.Xi_to_RC(Xi)).split('\n'))
+            self.assertEqual(self.context.generate_netlist_by_values(Xi).split('\n'), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import MySpice.MySpice as spice  # noqa: E402
+
+# отношение сигнал/шум, при котором шум не влияет на сравнение
+NO_NOISE_SNR = 300.
+
+# R1-C1 последовательно и R2 на землю, диоды закорочены
+RC_ELEMENTS = [('R1', '_net1', 'input', 1e3), ('C1', '_net0', '_net1', 1e-7),
+               ('R_D1', '0', '_net0', 1e-6), ('R2', '0', 'input', 5e3)]
+
+
+def ngspice_available():
+    try:
+        spice.NgSpiceShared.new_instance()
+    except Exception:
+        return False
+    return True
+
+
+class TestPhasorCVC(unittest.TestCase):
+    def test_resistor(self):
+        data = spice.Init_Data(1e3, 5., 100., NO_NOISE_SNR)
+        cvc = spice.PhasorCVC([('R2', '0', 'input', 400.)], data, 100)
+        t = np.arange(1, 101) / 100
+        current = -5. / 500. * np.sin(2 * np.pi * t)
+        np.testing.assert_allclose(cvc.VCurrent, current, atol=1e-6)
+        np.testing.assert_allclose(cvc.input_dummy, 400. * current, atol=1e-4)
+
+    def test_zero_rcs(self):
+        # без токового резистора напряжение на входе равно напряжению источника
+        data = spice.Init_Data(1e3, 5., 0., NO_NOISE_SNR)
+        t = np.arange(1, 101) / 100
+        voltage = -5. * np.sin(2 * np.pi * t)
+        cvc = spice.PhasorCVC([('R2', '0', 'input', 400.)], data, 100)
+        np.testing.assert_allclose(cvc.input_dummy, voltage, atol=1e-9)
+        np.testing.assert_allclose(cvc.VCurrent, voltage / 400., atol=1e-9)
+
+        cvc = spice.PhasorCVC(RC_ELEMENTS, data, 100)
+        np.testing.assert_allclose(cvc.input_dummy, voltage, atol=1e-9)
+
+    def test_open_circuit(self):
+        data = spice.Init_Data(1e3, 5., 100., None)
+        cvc = spice.PhasorCVC([], data, 100)
+        t = np.arange(1, 101) / 100
+        np.testing.assert_allclose(cvc.input_dummy, -5. * np.sin(2 * np.pi * t), atol=1e-9)
+        np.testing.assert_allclose(cvc.VCurrent, 0., atol=1e-12)
+
+    def test_diode_rejected(self):
+        data = spice.Init_Data(1e3, 5., 100., NO_NOISE_SNR)
+        with self.assertRaises(ValueError):
+            spice.PhasorCVC([('D1', '_net0', '0', 'DMOD_D1')], data, 100)
+
+    @unittest.skipUnless(ngspice_available(), 'ngspice shared library is not available')
+    def test_against_ngspice(self):
+        data = spice.Init_Data(1e4, 5., 100., NO_NOISE_SNR)
+        # постоянная времени много меньше 50 периодов, переходный процесс затухает
+        analysis = spice.CreateCVC1(spice.CreateCircuit(RC_ELEMENTS), data, 400, 'input', 50)
+        cvc = spice.PhasorCVC(RC_ELEMENTS, data, 400)
+
+        for simulated, phasor in ((analysis.input_dummy, cvc.input_dummy), (analysis.VCurrent, cvc.VCurrent)):
+            simulated = np.asarray(simulated, dtype=float)
+            scale = np.ptp(phasor)
+            self.assertAlmostEqual(np.max(simulated) / scale, np.max(phasor) / scale, delta=0.01)
+            self.assertAlmostEqual(np.min(simulated) / scale, np.min(phasor) / scale, delta=0.01)
+            self.assertAlmostEqual(np.std(simulated) / scale, np.std(phasor) / scale, delta=0.01)
+
+
+class TestBranchNetworkCVC(unittest.TestCase):
+    # R1-C1 и R2 на землю; постоянная времени 10 мкс, переходный процесс затухает за период
+    ELEMENTS = [('R1', '_net1', 'input', 1e3), ('C1', '0', '_net1', 1e-8), ('R2', '0', 'input', 5e3)]
+    R = [[1e3, 5e3, np.inf]]
+    C = [[1e-8, 0., 0.]]
+    D = [[0, 0, 0]]
+
+    def check_against_phasor(self, Rcs):
+        data = spice.Init_Data(1e3, 5., Rcs, None)
+        cvc = spice.BranchNetworkCVC(self.R, self.C, self.D, data, 100, {'Is': 1e-14}, cycle=5)[0]
+        phasor = spice.PhasorCVC(self.ELEMENTS, data, 100)
+        np.testing.assert_allclose(cvc.input_dummy, phasor.input_dummy, atol=1e-6)
+        np.testing.assert_allclose(cvc.VCurrent, phasor.VCurrent, atol=1e-8)
+
+    def test_rc_against_phasor(self):
+        self.check_against_phasor(100.)
+
+    def test_zero_rcs(self):
+        self.check_against_phasor(0.)
+
+
+class TestCreateCVCBatch(unittest.TestCase):
+    @unittest.skipUnless(ngspice_available(), 'ngspice shared library is not available')
+    def test_against_phasor(self):
+        data = spice.Init_Data(1e4, 5., 100., NO_NOISE_SNR)
+        elements_list = [RC_ELEMENTS, [('R2', '0', 'input', 400.)]]
+        results = spice.CreateCVCBatch(elements_list, data, 400, cycle=50)
+
+        self.assertEqual(len(results), 2)
+        for elements, cvc in zip(elements_list, results):
+            phasor = spice.PhasorCVC(elements, data, 400)
+            for simulated, expected in ((cvc.input_dummy, phasor.input_dummy), (cvc.VCurrent, phasor.VCurrent)):
+                np.testing.assert_allclose(simulated, expected, atol=0.01*np.ptp(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
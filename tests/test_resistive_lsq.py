@@ -0,0 +1,96 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import vs_circuit_solver as vs  # noqa: E402
+
+# ветвь 1 - R1 с диодом, ветвь 2 - R2, ветвь 3 отключена, конденсаторы закорочены
+DIODE_R1_R2 = 4+8+32+64+128
+# только R2
+R2_ONLY = 1+4+8+16+32+64+128
+
+
+class TestResistiveLsq(unittest.TestCase):
+    def setUp(self):
+        self.context = vs.SolverContext(SHOW_PLOTS=False)
+        self.V = 5.*np.sin(2*np.pi*np.arange(200)/200)
+
+    def set_target(self, current):
+        self.context.target_input_dummy = self.V
+        self.context.target_VCurrent = current
+
+    def test_diode_branch(self):
+        # идеальный диод с напряжением открывания DIODE_VOLTAGE
+        V = self.V
+        self.set_target(V/5e3 + np.where(V > vs.DIODE_VOLTAGE, (V-vs.DIODE_VOLTAGE)/1e3, 0.))
+        R, deviation = self.context.resistive_lsq(DIODE_R1_R2)
+        self.assertEqual(sorted(R), ['R1', 'R2'])
+        self.assertAlmostEqual(R['R1']/1e3, 1., delta=1e-3)
+        self.assertAlmostEqual(R['R2']/5e3, 1., delta=1e-3)
+        self.assertLess(deviation, 1e-6)
+
+    def test_linear_session(self):
+        # без диодов номиналы точные и исключаются из подбираемых
+        self.set_target(self.V/2e3 + 1e-5)
+        R, deviation = self.context.resistive_lsq(R2_ONLY)
+        self.assertAlmostEqual(R['R2']/2e3, 1., delta=1e-6)
+
+        ses = vs.Session_create(vs.Sch_init())
+        self.context.Session_set_switchers(ses, R2_ONLY)
+        self.context.Session_resistive_lsq(ses, R2_ONLY)
+        self.assertAlmostEqual(ses['start_sch']['R2']/2e3, 1., delta=1e-6)
+        self.assertNotIn('R2', ses['Xi_variable'])
+
+    def test_diode_seed(self):
+        V = self.V
+        self.set_target(V/5e3 + np.where(V > vs.DIODE_VOLTAGE, (V-vs.DIODE_VOLTAGE)/1e3, 0.))
+        # оценка не моделируется, она отсеивается вместе с остальными стартовыми сессиями
+        self.context.calculate_misfit = None
+        ses = vs.Session_create(vs.Sch_init())
+        self.context.Session_set_switchers(ses, DIODE_R1_R2)
+        start = dict(ses['start_sch'])
+        self.context.Session_resistive_lsq(ses, DIODE_R1_R2)
+        self.assertEqual(ses['start_sch'], start)
+
+        seed = self.context.Session_resistive_seed(ses, DIODE_R1_R2)
+        self.assertEqual(ses['start_sch'], start)
+        self.assertEqual(seed['Xi_variable'], ses['Xi_variable'])
+        self.assertAlmostEqual(seed['start_sch']['R1']/1e3, 1., delta=1e-3)
+        self.assertAlmostEqual(seed['start_sch']['R2']/5e3, 1., delta=1e-3)
+        self.assertIsNone(self.context.Session_resistive_seed(ses, R2_ONLY))
+
+    def test_seed_screened_in_batch(self):
+        V = self.V
+        self.set_target(V/5e3 + np.where(V > vs.DIODE_VOLTAGE, (V-vs.DIODE_VOLTAGE)/1e3, 0.))
+        self.context.SIMULATOR = 'numpy'
+        screened = []
+
+        def init_by_approximation(ses, swcode, code2, title='', run=True):
+            self.assertFalse(run)
+            self.context.Session_set_switchers(ses, swcode)
+            return False
+
+        def run_batch(ses_list):
+            screened.extend(ses_list)
+            for ses in ses_list:
+                ses['misfit'] = 1.
+
+        self.context.Session_init_by_approximation = init_by_approximation
+        self.context.Session_run_batch = run_batch
+        ses_list, ses = self.context.Session_init_all('result.txt', codes=[DIODE_R1_R2, R2_ONLY])
+        # у кода с диодом две стартовые сессии: пристрелка и оценка МНК
+        self.assertEqual(len(ses_list), 3)
+        self.assertEqual(screened, ses_list)
+        self.assertAlmostEqual(ses_list[1]['start_sch']['R1']/1e3, 1., delta=1e-3)
+
+    def test_capacitor(self):
+        self.set_target(self.V/2e3)
+        self.assertIsNone(self.context.resistive_lsq(R2_ONLY & ~128))
+
+
+if __name__ == '__main__':
+    unittest.main()
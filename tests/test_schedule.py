@@ -0,0 +1,79 @@
+import itertools
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import vs_circuit_solver as vs  # noqa: E402
+
+TOLERANCE = 1e-3
+
+
+# синтетическая цель: сессия сходится к своему пределу floor, невязка убывает
+# с суммарным числом вычислений. Подбор продолжается с прошлого результата,
+# как Session_run_fitter
+def fake_run_fitter(context):
+    def run(ses, maxfev=None):
+        if maxfev is None:
+            maxfev = context.MAXFEV
+        ses['fCount'] = ses.get('fCount', 0)+maxfev
+        ses['misfit'] = ses['floor']+1./ses['fCount']
+        if ses['misfit'] < TOLERANCE:
+            context.FITTER_SUCCESS = True
+    return run
+
+
+def best_session(fitted):
+    best = None
+    for ses, success in fitted:
+        if (best is None) or (ses['misfit'] < best['misfit']):
+            best = ses
+    return best
+
+
+class TestHalvingSchedule(unittest.TestCase):
+    def setUp(self):
+        self.context = vs.SolverContext(MAXFEV=80, HALVING_MIN_FEV=10, HALVING_KEEP=0.5, SHOW_PLOTS=False)
+        self.context.Session_run_fitter = fake_run_fitter(self.context)
+
+    def sessions(self, floors):
+        return [{'name': i, 'floor': floor, 'misfit': 1.} for i, floor in enumerate(floors)]
+
+    def test_same_best_as_sequential(self):
+        floors = [0.3, 0.05, 0.2, 0.01, 0.5, 0.02, 0.1]
+        sequential = best_session(self.context.Session_run_fitter_serial(self.sessions(floors)))
+        halving = best_session(self.context.Session_run_fitter_halving(self.sessions(floors)))
+        self.assertEqual(sequential['name'], 3)
+        self.assertEqual(halving['name'], sequential['name'])
+        self.assertLessEqual(halving['misfit'], sequential['misfit'])
+
+    def test_success_reset(self):
+        # после успешной сессии следующая неуспешная не наследует FITTER_SUCCESS
+        floors = [0., 0.1, 0.2]
+        for fitted in (self.context.Session_run_fitter_serial(self.sessions(floors)),
+                       self.context.Session_run_fitter_halving(self.sessions(floors))):
+            for ses, success in fitted:
+                self.assertEqual(success, ses['misfit'] < TOLERANCE)
+
+    def test_degenerate_settings(self):
+        # HALVING_KEEP >= 1 и HALVING_MIN_FEV <= 0 не зацикливают расписание
+        for keep, min_fev in ((1., 0), (2., -5), (0.5, 0)):
+            context = vs.SolverContext(MAXFEV=80, HALVING_MIN_FEV=min_fev, HALVING_KEEP=keep, SHOW_PLOTS=False)
+            budgets = []
+            run = fake_run_fitter(context)
+
+            def run_fitter(ses, maxfev=None):
+                budgets.append(maxfev)
+                run(ses, maxfev)
+            context.Session_run_fitter = run_fitter
+            schedule = context.Session_run_fitter_halving(self.sessions([0.3, 0.1, 0.2, 0.4]))
+            fitted = list(itertools.islice(schedule, 100))
+            self.assertLess(len(fitted), 100)
+            self.assertGreaterEqual(min(budgets), 1)
+            self.assertEqual(budgets[-1], context.MAXFEV)
+            self.assertEqual(fitted[-1][0]['name'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import math
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import MySpice.MySpice as spice  # noqa: E402
+
+# R1 от входа к узлу _net0, C1 от _net0 на землю: постоянная времени 1 мс,
+# при частоте 1 кГц переходный процесс затухает за несколько периодов
+ELEMENTS = [('R1', '_net0', 'input', 1e3), ('C1', '0', '_net0', 1e-6)]
+R1 = 1e3
+C1 = 1e-6
+
+
+def ngspice_available():
+    try:
+        spice.NgSpiceShared.new_instance()
+    except Exception:
+        return False
+    return True
+
+
+class FakeAnalysis:
+    def __init__(self, nodes, VCurrent):
+        self.nodes = nodes
+        self.VCurrent = VCurrent
+
+    def __getitem__(self, name):
+        return self.nodes[name]
+
+
+# Заменяет симулятор PySpice: считает ту же RC цепь (без Rcs) с напряжением
+# источника на входе и запоминает параметры каждого запуска
+class FakeSimulator:
+    def __init__(self, runs, V, F):
+        self.runs = runs
+        self.V = V
+        self.F = F
+        self.ic = {}
+        self.saved = None
+
+    def save(self, nodes):
+        self.saved = nodes
+
+    def options(self, **kwargs):
+        pass
+
+    def initial_condition(self, **kwargs):
+        self.ic.update(kwargs)
+
+    def transient(self, step_time, end_time, start_time=0, use_initial_condition=False):
+        self.runs += [{'end_time': end_time, 'uic': use_initial_condition, 'ic': dict(self.ic),
+                       'saved': self.saved}]
+        vc = self.ic.get('_net0', 0.) if use_initial_condition else 0.
+        points = int(round(end_time / step_time)) + 1
+        t = np.arange(points) * step_time
+        u = -self.V * np.sin(2 * math.pi * self.F * t)
+        v_c = np.empty(points)
+        v_c[0] = vc
+        substeps = 50
+        h = step_time / substeps
+        for k in range(1, points):
+            for j in range(substeps):
+                time = t[k-1] + (j + 0.5) * h
+                vc += h * (-self.V * math.sin(2 * math.pi * self.F * time) - vc) / (R1 * C1)
+            v_c[k] = vc
+        keep = t >= start_time - step_time / 2
+        return FakeAnalysis({'input': u[keep], '_net0': v_c[keep]}, ((u - v_c) / R1)[keep])
+
+
+def fake_circuit(runs, data):
+    circuit = spice.CreateCircuit(ELEMENTS)
+    circuit.simulator = lambda: FakeSimulator(runs, data.V, data.F)
+    return circuit
+
+
+class TestSteadyState(unittest.TestCase):
+    def setUp(self):
+        self.data = spice.Init_Data(1e3, 5., 100., None)
+
+    def test_periods_converged(self):
+        period = np.sin(2 * np.pi * np.arange(100) / 100)
+        self.assertTrue(spice.periods_converged(np.tile(period, 2), np.tile(period, 2), 100, 1e-6))
+        self.assertFalse(spice.periods_converged(period, period, 100, 1e-6))
+        growing = np.concatenate([0.9 * period, period])
+        self.assertFalse(spice.periods_converged(growing, np.tile(period, 2), 100, 1e-3))
+
+    def test_stops_early(self):
+        runs = []
+        fixed = spice.CreateCVC1(fake_circuit(runs, self.data), self.data, 100, cycle=20)
+        self.assertEqual(len(runs), 1)
+
+        runs = []
+        steady = spice.CreateCVC1(fake_circuit(runs, self.data), self.data, 100, cycle=20, steady_tol=1e-3)
+        self.assertLess(len(runs), 20 // spice.STEADY_CHUNK)
+        self.assertEqual(steady.periods, spice.STEADY_CHUNK * len(runs))
+        self.assertIn('_net0', runs[0]['saved'])
+        np.testing.assert_allclose(steady.VCurrent, fixed.VCurrent, atol=1e-3 * np.ptp(fixed.VCurrent))
+        np.testing.assert_allclose(steady.input_dummy, fixed.input_dummy, atol=1e-9)
+
+    def test_chunks_continue_state(self):
+        runs = []
+        spice.CreateCVC1(fake_circuit(runs, self.data), self.data, 100, cycle=6, steady_tol=1e-9)
+        # не сошлось за cycle периодов - три порции, каждая со своим начальным состоянием
+        self.assertEqual(len(runs), 3)
+        self.assertFalse(runs[0]['uic'])
+        for run in runs[1:]:
+            self.assertTrue(run['uic'])
+            self.assertNotEqual(run['ic']['_net0'], 0.)
+            self.assertAlmostEqual(run['end_time'], spice.STEADY_CHUNK / self.data.F)
+
+    @unittest.skipUnless(ngspice_available(), 'ngspice shared library is not available')
+    def test_against_fixed_cycle(self):
+        data = spice.Init_Data(1e3, 5., 100., None)
+        fixed = spice.CreateCVC1(spice.CreateCircuit(ELEMENTS), data, 100, cycle=20)
+        steady = spice.CreateCVC1(spice.CreateCircuit(ELEMENTS), data, 100, cycle=20, steady_tol=1e-3)
+        self.assertLess(steady.periods, 20)
+        np.testing.assert_allclose(steady.VCurrent, fixed.VCurrent, atol=0.01 * np.ptp(fixed.VCurrent))
+        np.testing.assert_allclose(steady.input_dummy, fixed.input_dummy, atol=0.01 * np.ptp(fixed.input_dummy))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import vs_circuit_solver as vs  # noqa: E402
+
+
+class TestSwitchers(unittest.TestCase):
+    def setUp(self):
+        self.valid = [swcode for swcode in range(255) if vs.is_valid_switchers(swcode)]
+        self.codes, self.skipped = vs.switchers_list()
+
+    def test_count(self):
+        self.assertEqual(len(self.valid), 60)
+        self.assertEqual(len(self.codes), 39)
+        self.assertEqual(len(self.codes)+len(self.skipped), len(self.valid))
+
+    def test_distinct_schematics(self):
+        canonical = [vs.canonical_switchers(swcode) for swcode in self.codes]
+        self.assertEqual(len(set(canonical)), len(canonical))
+        for swcode in self.codes:
+            self.assertTrue(vs.is_valid_switchers(swcode))
+
+    def test_skipped_covered(self):
+        # каждый пропущенный код дает ту же схему, что и оставленный
+        for swcode, kept in self.skipped.items():
+            self.assertIn(kept, self.codes)
+            self.assertEqual(vs.canonical_switchers(swcode), vs.canonical_switchers(kept))
+
+    def test_canonical(self):
+        self.assertEqual(vs.canonical_switchers(0), 0)
+        self.assertEqual(vs.canonical_switchers(1), 1+8+16)
+        self.assertEqual(vs.canonical_switchers(2+8), 2+8+128)
+        self.assertEqual(vs.canonical_switchers(4), 4+32+64)
+        for swcode in range(255):
+            canonical = vs.canonical_switchers(swcode)
+            self.assertEqual(vs.canonical_switchers(canonical), canonical)
+
+
+if __name__ == '__main__':
+    unittest.main()
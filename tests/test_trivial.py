@@ -0,0 +1,70 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import vs_circuit_solver as vs  # noqa: E402
+
+
+# только ветвь 2 без C2 (R2 >= BIG_R - обрыв): схема считается PhasorCVC
+def resistor_sch(R2):
+    sch = vs.Sch_init()
+    for name in ('R1', 'R3'):
+        sch[name] = vs.HUGE_R
+    sch['R2'] = R2
+    return sch
+
+
+class TestClassifyTarget(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.context = vs.SolverContext(INIT_SNR=None, SHOW_PLOTS=False, IVCMP_ENGINE='numpy')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_open(self):
+        self.context.init_target_by_Sch(resistor_sch(vs.HUGE_R))
+        self.assertEqual(self.context.classify_target(), ('open', vs.HUGE_R))
+        ses = self.context.Session_trivial(os.path.join(self.dir, 'open.cir'))
+        self.assertEqual(ses['kind'], 'open')
+        self.assertTrue(self.context.FITTER_SUCCESS)
+
+    def test_short(self):
+        self.context.init_target_by_Sch(resistor_sch(1e-3))
+        self.assertEqual(self.context.classify_target(), ('short', vs.R_MIN))
+
+    def test_resistor(self):
+        self.context.init_target_by_Sch(resistor_sch(1e3))
+        kind, R = self.context.classify_target()
+        self.assertEqual(kind, 'resistor')
+        self.assertAlmostEqual(R/1e3, 1., delta=1e-6)
+
+    def test_diode(self):
+        # ток идет только при напряжении больше DIODE_VOLTAGE
+        V = 5.*np.sin(2*np.pi*np.arange(100)/100)
+        self.context.target_input_dummy = V
+        self.context.target_VCurrent = np.where(V > vs.DIODE_VOLTAGE, (V-vs.DIODE_VOLTAGE)/1e3, 0.)
+        self.assertEqual(self.context.classify_target(), (None, None))
+        self.assertIsNone(self.context.Session_trivial(os.path.join(self.dir, 'diode.cir')))
+
+    def test_session_trivial(self):
+        self.context.init_target_by_Sch(resistor_sch(1e3))
+        fileName = os.path.join(self.dir, 'resistor.cir')
+        ses = self.context.Session_trivial(fileName)
+        self.assertEqual(ses['kind'], 'resistor')
+        self.assertAlmostEqual(ses['result_sch']['R2']/1e3, 1., delta=1e-6)
+        # misfit - по моделированию найденной схемы
+        self.assertLess(ses['misfit'], 1e-6)
+        self.assertLessEqual(self.context.ivcmp_result, self.context.ivcmp_tolerance())
+        self.assertTrue(self.context.FITTER_SUCCESS)
+        self.assertTrue(os.path.exists(fileName))
+
+
+if __name__ == '__main__':
+    unittest.main()
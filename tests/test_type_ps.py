@@ -0,0 +1,56 @@
+import math
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import MySpice.MySpice as spice  # noqa: E402
+import vs_circuit_solver as vs  # noqa: E402
+
+N = 100
+RCS = 100.
+
+
+# прежний расчет 'type_ps': выравнивание фаз по максимуму полного напряжения, цикл по точкам
+def type_ps_loop(target_V, target_I, V, current):
+    fullV_target = [target_V[i]+RCS*target_I[i] for i in range(N)]
+    fullV_A = [V[i]+RCS*current[i] for i in range(N)]
+    phase_shift = int(np.argmax(fullV_A)) - int(np.argmax(fullV_target)) + N
+    return math.fsum((target_I[i]-current[(i+phase_shift) % N])**2 for i in range(N))
+
+
+# ВАХ резистора r, сдвинутая на shift отсчетов
+def resistor_cvc(r, shift=0):
+    phase = 2*np.pi*(np.arange(N)+shift)/N
+    current = 5./(RCS+r)*np.sin(phase)
+    return current*r, current
+
+
+class TestTypePs(unittest.TestCase):
+    def context(self, r):
+        ctx = vs.SolverContext(MISFIT_METHOD='type_ps', SHOW_PLOTS=False)
+        V, current = resistor_cvc(r)
+        ctx.init_target_Data(V, current, initF=1e3, initV=5., initRcs=RCS)
+        return ctx
+
+    def test_against_loop(self):
+        ctx = self.context(1e3)
+        for r, shift in ((1e3, 0), (1.2e3, 7), (500., 31), (2e3, 93)):
+            ctx.analysis = spice.CVC_Data(*resistor_cvc(r, shift))
+            expected = type_ps_loop(ctx.target_input_dummy, ctx.target_VCurrent,
+                                    ctx.analysis.input_dummy, ctx.analysis.VCurrent)
+            self.assertAlmostEqual(ctx.analysis_misfit(), expected, delta=1e-12+1e-9*expected)
+
+    def test_shifted_copy(self):
+        # та же кривая со сдвигом фазы совпадает с целью после выравнивания
+        ctx = self.context(1e3)
+        ctx.analysis = spice.CVC_Data(*resistor_cvc(1e3, 17))
+        self.assertAlmostEqual(ctx.analysis_misfit(), 0.)
+        np.testing.assert_allclose(ctx.analysis_residuals(), 0., atol=1e-15)
+
+
+if __name__ == '__main__':
+    unittest.main()
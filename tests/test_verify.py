@@ -0,0 +1,97 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import vs_circuit_solver as vs  # noqa: E402
+
+
+# R2 параллельно C2, ветви 1 и 3 отключены: схема без диодов считается PhasorCVC
+def rc_sch(R2, C2):
+    sch = vs.Sch_init()
+    for name in ('R1', 'R3'):
+        sch[name] = vs.HUGE_R
+    sch['R2'] = R2
+    sch['C2'] = C2
+    sch['_R_C2'] = vs.HUGE_R
+    return sch
+
+
+def session(sch):
+    ses = vs.Session_create(sch)
+    ses['Xi_variable'] = ['R2', 'C2']
+    return ses
+
+
+# При SIMULATOR = 'numpy' успех по пакетам встроенного решателя проверяется
+# одиночным моделированием (Session_run1). Здесь пакетные результаты подменены
+# ложным успехом, одиночное моделирование - настоящее
+class TestNumpySimulatorVerify(unittest.TestCase):
+    def setUp(self):
+        self.context = vs.SolverContext(SIMULATOR='numpy', IVCMP_ENGINE='numpy', INIT_SNR=None, SHOW_PLOTS=False,
+                                        TRIVIAL_CLASSIFIER=False)
+        self.context.init_target_by_Sch(rc_sch(1e3, 1e-7))
+        self.saved = []
+        self.context.Sch_saveToFile = lambda ses, fileName: self.saved.append(ses)
+
+    def test_start_sessions(self):
+        schs = {1: rc_sch(5e3, 1e-7), 2: rc_sch(1e3, 1e-7)}
+
+        def init_by_approximation(ses, swcode, code2, title='', run=True):
+            ses['start_sch'] = schs[swcode]
+            ses['Xi_variable'] = ['R2', 'C2']
+            return False
+
+        def run_batch(ses_list):
+            for ses in ses_list:
+                ses['misfit'] = 0.
+
+        self.context.Session_init_by_approximation = init_by_approximation
+        self.context.Session_run_batch = run_batch
+        ses_list, ses = self.context.Session_init_all('result.txt', codes=[1, 2])
+        self.assertIs(ses, ses_list[1])
+        self.assertGreater(ses_list[0]['misfit'], self.context.ivcmp_tolerance())
+        self.assertLess(ses['misfit'], self.context.ivcmp_tolerance())
+
+    def test_start_sessions_not_confirmed(self):
+        def init_by_approximation(ses, swcode, code2, title='', run=True):
+            ses['start_sch'] = rc_sch(5e3, 1e-7)
+            ses['Xi_variable'] = ['R2', 'C2']
+            return False
+
+        def run_batch(ses_list):
+            for ses in ses_list:
+                ses['misfit'] = 0.
+
+        self.context.Session_init_by_approximation = init_by_approximation
+        self.context.Session_run_batch = run_batch
+        ses_list, ses = self.context.Session_init_all('result.txt', codes=[1])
+        # сессия не принята и идет в подбор с настоящим misfit
+        self.assertIsNone(ses)
+        self.assertGreater(ses_list[0]['misfit'], self.context.ivcmp_tolerance())
+
+    def test_fitter_success(self):
+        wrong = session(rc_sch(5e3, 1e-7))
+        right = session(rc_sch(1e3, 1e-7))
+        for ses in (wrong, right):
+            ses['misfit'] = 1.
+
+        # подбор по пакетам встроенного решателя сообщает об успехе обеих сессий
+        def run_fitter_serial(ses_list):
+            for ses in (wrong, right):
+                ses['result_sch'] = ses['start_sch']
+                ses['misfit'] = 0.
+                yield ses, True
+
+        self.context.Session_init_all = lambda fileName, codes=None: ([wrong, right], None)
+        self.context.Session_run_fitter_serial = run_fitter_serial
+        result = self.context.Session_process_sessions('result.txt', None)
+        self.assertIs(result, right)
+        self.assertTrue(self.context.FITTER_SUCCESS)
+        self.assertGreater(wrong['misfit'], self.context.ivcmp_tolerance())
+        self.assertEqual(self.saved, [right])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import vs_circuit_solver as vs  # noqa: E402
+
+
+class TestXiLogParameters(unittest.TestCase):
+    def setUp(self):
+        self.context = vs.SolverContext(SHOW_PLOTS=False)
+        sch = vs.Sch_init()
+        sch.update({'R1': 1e3, 'C1': 1e-7, 'R2': 5e3, 'C2': 1e-9, 'R3': 200.})
+        self.Xi = np.array(self.context.Sch_get_Xi(sch))
+        self.context.set_circuit_nominals(self.Xi)
+        self.context.reset_Xi_variable()
+        self.context.set_Xi_variable(['R1', 'C1', 'R2', 'C2', 'R3'])
+
+    def test_zero_is_start(self):
+        np.testing.assert_allclose(self.context.Xi_unroll(np.zeros(5)), self.Xi)
+
+    def test_round_trip(self):
+        x = np.array([0.5, -1., 2., 0.25, -0.75])
+        XL = self.context.Xi_unroll(x)
+        nominals = np.array([self.context.Xi_nominal(i) for i in range(len(self.Xi)) if self.context.Xi_mask[i]])
+        np.testing.assert_allclose(np.log10(np.array(self.context.Xi_pack(XL))/nominals), x)
+        # неподбираемые номиналы не меняются
+        for i in range(len(self.Xi)):
+            if not self.context.Xi_mask[i]:
+                self.assertEqual(XL[i], self.Xi[i])
+
+    def test_clipped_to_bounds(self):
+        low, high = self.context.Xi_log_bounds()
+        XL = self.context.Xi_unroll(np.concatenate([[-20., 20.], high[2:]+5.]))
+        packed = self.context.Xi_pack(XL)
+        bounds = [self.context.Xi_bounds(i) for i in range(len(self.Xi)) if self.context.Xi_mask[i]]
+        self.assertAlmostEqual(packed[0], bounds[0][0])
+        self.assertEqual(bounds[0][0], vs.R_MIN)
+        self.assertAlmostEqual(packed[1]/bounds[1][1], 1.)
+        for value, (lower, upper) in zip(packed[2:], bounds[2:]):
+            self.assertAlmostEqual(value/upper, 1.)
+        # емкость на верхней границе реактивного сопротивления - наименьшая емкость NONE_C
+        self.assertAlmostEqual(self.context.R_to_C(packed[1])/vs.NONE_C, 1.)
+
+    def test_start_out_of_bounds(self):
+        # отрицательный и нулевой начальные номиналы приводятся в допустимые пределы
+        self.context.Xi_long[0] = -1e3
+        self.context.Xi_long[4] = 0.
+        XL = self.context.Xi_unroll(np.zeros(5))
+        self.assertEqual(XL[0], 1e3)
+        self.assertEqual(XL[4], vs.R_MIN)
+        low, high = self.context.Xi_log_bounds()
+        self.assertTrue(np.all(low <= 0.) and np.all(high >= 0.))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import math
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'vs_circuit_solver'))
+
+import vs_circuit_solver as vs  # noqa: E402
+
+RCS = 100.
+
+
+# прежний поточечный расчет тока упрощенной цепи
+def current_loop(V, R1, R2, R3):
+    I_ = V/(RCS+R2)
+    R1, R2, R3 = abs(R1), abs(R2), abs(R3)
+    if R2*I_ >= vs.DIODE_VOLTAGE:
+        return (V*(R1+R2)-R2*vs.DIODE_VOLTAGE)/(R1*R2+R1*RCS+R2*RCS)
+    if R2*I_ <= -vs.DIODE_VOLTAGE:
+        return (V*(R3+R2)+R2*vs.DIODE_VOLTAGE)/(R3*R2+R3*RCS+R2*RCS)
+    return I_
+
+
+class TestZ123(unittest.TestCase):
+    def setUp(self):
+        self.ctx = vs.SolverContext(INIT_Rcs=RCS, Z123_GRID_POINTS=3, Z123_GRID_DECADES=1., SHOW_PLOTS=False)
+        V = 5.*np.sin(2*np.pi*np.arange(100)/100)
+        self.ctx.target_fullVoltage = V
+        self.ctx.corrected_VCurrent = np.array([current_loop(v, 1e3, 5e3, 2e3) for v in V])
+
+    def test_batch_against_loop(self):
+        candidates = [[1e3, 5e3, 2e3], [500., 1e4, vs.HUGE_R], [vs.HUGE_R, 200., 3e3], [-1e3, 5e3, 2e3]]
+        misfits = self.ctx.min_r123_batch(candidates)
+        for r, misfit in zip(candidates, misfits):
+            expected = math.fsum((current_loop(v, *r)-i)**2
+                                 for v, i in zip(self.ctx.target_fullVoltage, self.ctx.corrected_VCurrent))
+            self.assertAlmostEqual(misfit, expected, delta=1e-15+1e-9*expected)
+        # лучший вариант запоминается
+        self.assertEqual(self.ctx.min_r123_x, [1e3, 5e3, 2e3])
+        self.assertAlmostEqual(self.ctx.min_r123_misfit, 0.)
+
+    def test_nan_not_selected(self):
+        self.ctx.min_r123_misfit = None
+        self.ctx.min_r123_batch([[np.nan, 5e3, 2e3], [2e3, 5e3, 2e3]])
+        self.assertEqual(self.ctx.min_r123_x, [2e3, 5e3, 2e3])
+
+    def test_grid(self):
+        grid = self.ctx.r123_grid(1e3, 5e3, 2e3)
+        # 3 значения на декаду вокруг оценки и HUGE_R по каждому сопротивлению
+        self.assertEqual(grid.shape, (64, 3))
+        np.testing.assert_allclose(sorted(set(grid[:, 0])), [1e2, 1e3, 1e4, vs.HUGE_R])
+        np.testing.assert_allclose(sorted(set(grid[:, 1])), [5e2, 5e3, 5e4, vs.HUGE_R])
+        self.assertEqual(len(vs.SolverContext(Z123_GRID_POINTS=0).r123_grid(1e3, 5e3, 2e3)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
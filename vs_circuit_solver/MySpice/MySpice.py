@@ -1,12 +1,23 @@
 import math
 import csv
+import os
+import hashlib
+import threading
+import collections
 import numpy
 
+from PySpice.Spice.Netlist import Circuit
+from PySpice.Spice.NgSpice.Shared import NgSpiceShared
 from PySpice.Spice.Parser import SpiceParser
 from PySpice.Spice.Parser import Model
 from PySpice.Spice.Parser import Element
 
 
+# Разделяемый экземпляр ngspice один на процесс, моделирование из разных
+# потоков выполняется по очереди
+SPICE_LOCK = threading.RLock()
+
+
 # Переопределяем парсер spice так чтобы он игнорировал секции .include и .subckt
 class MySpiceParser(SpiceParser):
     @staticmethod
@@ -25,6 +36,12 @@ class Init_Data:
     Rcs: float = 0.0
     SNR: float = 40.0
 
+    def __init__(self, F, V, Rcs=0.0, SNR=40.0):
+        self.F = F
+        self.V = V
+        self.Rcs = Rcs
+        self.SNR = SNR
+
 
 def LoadFile(path):
     parser = MySpiceParser(path=path)
@@ -32,6 +49,46 @@ def LoadFile(path):
     return circuit
 
 
+# Построить схему в памяти, без записи и разбора файла .cir
+# elements - список (имя, узел+, узел-, номинал), для диода вместо номинала имя модели
+# models - словарь {имя модели: (тип, {параметр: значение})}
+def CreateCircuit(elements, models=None, title='cir file corresponding to the equivalent circuit.'):
+    circuit = Circuit(title)
+    for name, node_plus, node_minus, value in elements:
+        _add_element(circuit, name, node_plus, node_minus, value)
+    _add_models(circuit, models)
+    return circuit
+
+
+def _add_element(circuit, name, node_plus, node_minus, value):
+    kind = name[0].upper()
+    if kind == 'R':
+        circuit.R(name[1:], node_plus, node_minus, value)
+    elif kind == 'C':
+        circuit.C(name[1:], node_plus, node_minus, value)
+    elif kind == 'D':
+        circuit.D(name[1:], node_plus, node_minus, model=value, area=1.0, temperature=26.85)
+    else:
+        raise ValueError("unsupported element '{}'".format(name))
+
+
+def _add_models(circuit, models):
+    if models is not None:
+        for model_name, (model_type, parameters) in models.items():
+            circuit.model(model_name, model_type, **parameters)
+
+
+# Добавить к сигналу шум с заданным отношением сигнал/шум, дБ. SNR = None - без шума
+def AddNoise(values, SNR):
+    values = numpy.array(values, dtype=float)
+    if SNR is None:
+        return values
+    avg_db = 10 * numpy.log10(numpy.mean(values ** 2))
+    avg_noise_db = avg_db - SNR
+    noise = numpy.random.normal(0, numpy.sqrt(10 ** (avg_noise_db / 10)), len(values))
+    return values + noise
+
+
 def SaveFile(analysis, path):
     with open(path, 'w') as csv_file:
         csv_writer = csv.writer(csv_file, delimiter=';')
@@ -62,25 +119,431 @@ def CreateCVC(circuit, input_data, lendata, cycle=1):
     return analysis
 
 
-def CreateCVC1(circuit, input_data, lendata, name="input", cycle=1):
+# Установившийся режим: моделирование идет порциями по STEADY_CHUNK периодов,
+# каждая порция начинается с напряжений узлов конденсаторов в конце предыдущей
+# (.ic и tran ... uic). Моделирование останавливается, когда два последних периода
+# порции совпадают с точностью steady_tol (доля от размаха сигнала), но длится
+# не больше cycle периодов.
+STEADY_CHUNK = 2
+
+
+# совпадают ли два последних периода записи (lendata точек на период)
+def periods_converged(input_dummy, VCurrent, lendata, steady_tol):
+    if len(input_dummy) < 2*lendata:
+        return False
+    for values in (input_dummy, VCurrent):
+        values = numpy.asarray(values, dtype=float)
+        last = values[-lendata:]
+        previous = values[-2*lendata:-lendata]
+        if numpy.max(numpy.abs(last-previous)) > steady_tol*max(numpy.ptp(last), 1e-30):
+            return False
+    return True
+
+
+# узлы конденсаторов схемы, кроме земли
+def capacitor_nodes(circuit):
+    nodes = set()
+    for element in circuit.elements:
+        if element.name[0].upper() == 'C':
+            nodes |= {str(node).lower() for node in element.nodes}
+    nodes.discard('0')
+    return sorted(nodes)
+
+
+# моделирование порциями до установившегося режима, см. STEADY_CHUNK.
+# Число смоделированных периодов возвращается в analysis.periods
+def _steady_transient(circuit, name, period, lendata, cycle, steady_tol, reltol=None):
+    state = None
+    state_nodes = capacitor_nodes(circuit)
+    done = 0
+    while True:
+        chunk = min(STEADY_CHUNK, cycle-done)
+        simulator = circuit.simulator()
+        simulator.save([name, 'vcurrent#branch'] + state_nodes)
+        if reltol is not None:
+            simulator.options(reltol=reltol)
+        if state:
+            simulator.initial_condition(**state)
+        analysis = simulator.transient(step_time=period / lendata, end_time=period * chunk,
+                                       use_initial_condition=bool(state))
+        done += chunk
+        state = {node: float(analysis.nodes[node][-1]) for node in state_nodes}
+        if (done >= cycle) or periods_converged(analysis[name], analysis.VCurrent, lendata, steady_tol):
+            break
+    analysis.periods = done
+    return analysis
+
+
+# reltol - относительная точность ngspice, None - по умолчанию (1e-3)
+# steady_tol - точность установившегося режима (см. STEADY_CHUNK), None - всегда cycle периодов
+def CreateCVC1(circuit, input_data, lendata, name="input", cycle=1, reltol=None, steady_tol=None):
     # lendata не может принимать значения меньше 59
     period = 1 / input_data.F
     rms_voltage = input_data.V / math.sqrt(2)
     circuit.R('cs', 'input', 'input_dummy', input_data.Rcs)
     circuit.AcLine('Current', circuit.gnd, 'input_dummy', rms_voltage=rms_voltage, frequency=input_data.F)
-    simulator = circuit.simulator()
-    analysis = simulator.transient(step_time=period / lendata, end_time=period * cycle)
+    with SPICE_LOCK:
+        # разделяемый экземпляр ngspice загрузит другую схему
+        CompiledCircuit._loaded = None
+        if steady_tol is None:
+            simulator = circuit.simulator()
+            # ngspice записывает только последний период и только нужные векторы
+            simulator.save([name, 'vcurrent#branch'])
+            if reltol is not None:
+                simulator.options(reltol=reltol)
+            analysis = simulator.transient(step_time=period / lendata, end_time=period * cycle,
+                                           start_time=period * (cycle-1))
+        else:
+            analysis = _steady_transient(circuit, name, period, lendata, cycle, steady_tol, reltol)
     analysis.input_dummy = analysis[name]
     analysis.input_dummy = analysis.input_dummy[len(analysis.input_dummy)-lendata:len(analysis.input_dummy)]
     analysis.input_dummy = analysis.input_dummy[len(analysis.input_dummy)-lendata:len(analysis.input_dummy)]
     analysis.VCurrent = analysis.VCurrent[len(analysis.VCurrent)-lendata:len(analysis.VCurrent)]
     # Расчитываем шум независмо для тока и напряжения исходя из среднеквадратичных значений и одинакового SNR
-    avg_V_db = 10 * numpy.log10(numpy.mean(numpy.array(analysis.input_dummy, dtype=float) ** 2))
-    avg_Vnoise_db = avg_V_db - input_data.SNR
-    Vnoise = numpy.random.normal(0, numpy.sqrt(10 ** (avg_Vnoise_db / 10)), len(analysis.input_dummy))
-    analysis.input_dummy = numpy.array(analysis.input_dummy, dtype=float) + Vnoise
-    avg_I_db = 10 * numpy.log10(numpy.mean(numpy.array(analysis.VCurrent, dtype=float) ** 2))
-    avg_Inoise_db = avg_I_db - input_data.SNR
-    Inoise = numpy.random.normal(0, numpy.sqrt(10 ** (avg_Inoise_db / 10)), len(analysis.VCurrent))
-    analysis.VCurrent = numpy.array(analysis.VCurrent, dtype=float) + Inoise
+    analysis.input_dummy = AddNoise(analysis.input_dummy, input_data.SNR)
+    analysis.VCurrent = AddNoise(analysis.VCurrent, input_data.SNR)
     return analysis
+
+
+# Несколько схем в одном запуске ngspice. Каждая схема - отдельная подсеть со своими
+# Rcs и источником, подключенными так же, как в CreateCVC1; к узлам (кроме земли) и
+# именам элементов k-й схемы добавляется суффикс _k. Один transient анализ считает
+# все подсети, моделируется cycle периодов, записывается последний.
+# elements_list - список списков элементов как в CreateCircuit. Возвращает список CVC_Data
+def CreateCVCBatch(elements_list, input_data, lendata, models=None, name="input", cycle=1, reltol=None):
+    period = 1 / input_data.F
+    rms_voltage = input_data.V / math.sqrt(2)
+    circuit = Circuit('batch of {} circuits'.format(len(elements_list)))
+    saved = []
+    for k, elements in enumerate(elements_list):
+        def node(n):
+            return n if str(n) == '0' else '{}_{}'.format(n, k)
+
+        for element_name, node_plus, node_minus, value in elements:
+            _add_element(circuit, '{}_{}'.format(element_name, k), node(node_plus), node(node_minus), value)
+        circuit.R('cs_{}'.format(k), node(name), node('input_dummy'), input_data.Rcs)
+        circuit.AcLine('Current_{}'.format(k), circuit.gnd, node('input_dummy'), rms_voltage=rms_voltage,
+                       frequency=input_data.F)
+        saved += [node(name), 'vcurrent_{}#branch'.format(k)]
+    _add_models(circuit, models)
+
+    with SPICE_LOCK:
+        # разделяемый экземпляр ngspice загрузит другую схему
+        CompiledCircuit._loaded = None
+        simulator = circuit.simulator()
+        simulator.save(saved)
+        if reltol is not None:
+            simulator.options(reltol=reltol)
+        analysis = simulator.transient(step_time=period / lendata, end_time=period * cycle,
+                                       start_time=period * (cycle-1))
+
+    results = []
+    for k in range(len(elements_list)):
+        input_dummy = numpy.array(analysis.nodes['{}_{}'.format(name, k).lower()], dtype=float)[-lendata:]
+        VCurrent = numpy.array(analysis.branches['vcurrent_{}'.format(k)], dtype=float)[-lendata:]
+        results += [CVC_Data(AddNoise(input_dummy, input_data.SNR), AddNoise(VCurrent, input_data.SNR))]
+    return results
+
+
+# Результат моделирования без объекта анализа PySpice
+class CVC_Data:
+    input_dummy: numpy.ndarray
+    VCurrent: numpy.ndarray
+
+    def __init__(self, input_dummy, VCurrent):
+        self.input_dummy = input_dummy
+        self.VCurrent = VCurrent
+
+
+# Перевести результат моделирования на lendata точек периода (t = (k+1)*period/lendata,
+# как в CreateCVC1) линейной интерполяцией с учетом периодичности
+def ResampleCVC(analysis, lendata):
+    n = len(analysis.VCurrent)
+    if n == lendata:
+        return analysis
+    t = numpy.arange(1, n+1) / n
+    t_new = numpy.arange(1, lendata+1) / lendata
+    return CVC_Data(numpy.interp(t_new, t, numpy.asarray(analysis.input_dummy, dtype=float), period=1.),
+                    numpy.interp(t_new, t, numpy.asarray(analysis.VCurrent, dtype=float), period=1.))
+
+
+# Установившийся режим линейной RC схемы без ngspice, методом комплексных
+# амплитуд. elements - список (имя, узел+, узел-, номинал) как в CreateCircuit,
+# только резисторы и конденсаторы. Схема подключается к источнику так же, как
+# в CreateCVC1: VCurrent 0 input_dummy SIN(0 V F) и Rcs между input_dummy и input.
+# Точки берутся равномерно по последнему периоду, t = (k+1)*period/lendata.
+# С CreateCVC1 совпадает, когда переходный процесс успевает затухнуть за cycle периодов.
+def PhasorCVC(elements, input_data, lendata, name="input"):
+    nodes = {name: 0}
+    for element_name, node_plus, node_minus, value in elements:
+        if element_name[0].upper() not in ('R', 'C'):
+            raise ValueError("PhasorCVC() supports only R and C, got '{}'".format(element_name))
+        for node in (node_plus, node_minus):
+            if (node != '0') and (node not in nodes):
+                nodes[node] = len(nodes)
+
+    omega = 2 * math.pi * input_data.F
+    Y = numpy.zeros((len(nodes), len(nodes)), dtype=complex)
+    for element_name, node_plus, node_minus, value in elements:
+        if element_name[0].upper() == 'R':
+            y = 1 / value
+        else:
+            y = 1j * omega * value
+        for a, b, sign in ((node_plus, node_plus, 1), (node_minus, node_minus, 1),
+                           (node_plus, node_minus, -1), (node_minus, node_plus, -1)):
+            if (a != '0') and (b != '0'):
+                Y[nodes[a], nodes[b]] += sign * y
+
+    # источник: комплексная амплитуда напряжения input_dummy равна -V.
+    # Rcs - последовательное сопротивление источника, может быть равно 0, поэтому
+    # ток источника I (втекающий в узел input) - отдельное неизвестное:
+    # Y*U = I в узле input, U[input] + Rcs*I = -V
+    source = -input_data.V
+    n = len(nodes)
+    A = numpy.zeros((n+1, n+1), dtype=complex)
+    A[:n, :n] = Y
+    A[0, n] = -1
+    A[n, 0] = 1
+    A[n, n] = input_data.Rcs
+    J = numpy.zeros(n+1, dtype=complex)
+    J[n] = source
+    solution = numpy.linalg.solve(A, J)
+    U, I_source = solution[0], solution[n]
+
+    phase = numpy.exp(2j * math.pi * numpy.arange(1, lendata + 1) / lendata)
+    input_dummy = numpy.imag(U * phase)
+    VCurrent = numpy.imag(I_source * phase)
+    return CVC_Data(AddNoise(input_dummy, input_data.SNR), AddNoise(VCurrent, input_data.SNR))
+
+
+# Параметры численного решателя сети ветвей BranchNetworkCVC
+# шагов интегрирования на один отсчет записи
+BRANCH_SUBSTEPS = 4
+# наибольшее изменение напряжения диода за одну итерацию Ньютона, В
+BRANCH_MAX_DX = 0.1
+# точность итераций Ньютона по напряжению, доля от амплитуды источника
+BRANCH_NEWTON_TOL = 1e-9
+BRANCH_NEWTON_ITER = 50
+# показатель экспоненты диода, после которого ВАХ продолжается линейно
+BRANCH_EXP_LIMIT = 40.
+# тепловой потенциал при температуре 26.85 C, В
+THERMAL_VOLTAGE = 1.380649e-23 * 300.0 / 1.602176634e-19
+
+
+# Периодический режим сети параллельных ветвей между узлом input и землей,
+# подключенной к источнику так же, как в CreateCVC1 (Rcs может быть равно 0). Ветвь - последовательно
+# резистор, конденсатор и диод. Сразу считается пакет из K вариантов номиналов:
+# R - массив (K, ветви) сопротивлений, numpy.inf - ветвь отключена;
+# C - емкости, 0 - конденсатора нет (перемычка);
+# D - диоды: 1 - анодом к input, -1 - катодом к input, 0 - диода нет.
+# Диод - экспонента Шокли с параметрами Is, N, Rs из diode_model, без емкостей.
+# Интегрирование - метод трапеций с шагом period/(lendata*BRANCH_SUBSTEPS),
+# на каждом шаге итерации Ньютона по напряжению input и напряжениям диодов.
+# Моделирование начинается с нулевого состояния и длится до совпадения двух
+# последних периодов с точностью steady_tol (None - ровно cycle периодов).
+# Возвращает список из K CVC_Data по последнему периоду.
+def BranchNetworkCVC(R, C, D, input_data, lendata, diode_model, cycle=10, steady_tol=None):
+    R = numpy.atleast_2d(numpy.asarray(R, dtype=float))
+    C = numpy.atleast_2d(numpy.asarray(C, dtype=float))
+    D = numpy.atleast_2d(numpy.asarray(D, dtype=float))
+    K = len(R)
+    Rcs = input_data.Rcs
+    omega = 2 * math.pi * input_data.F
+    steps = lendata * BRANCH_SUBSTEPS
+    h = 1 / (input_data.F * steps)
+
+    Is = diode_model['Is']
+    NVt = diode_model.get('N', 1.) * THERMAL_VOLTAGE
+    present = numpy.isfinite(R)
+    m = present & (D != 0)  # ветви с диодом
+    s = numpy.where(D < 0, -1., 1.)
+    R_series = numpy.where(present, R + numpy.where(m, diode_model.get('Rs', 0.), 0.), 1.)
+    # трапеции: напряжение конденсатора w_new = w + hc*(i + i_new)
+    hc = numpy.where(present & (C > 0), h / (2 * numpy.where(C > 0, C, 1.)), 0.)
+    R_tr = R_series + hc
+    G_lin = numpy.where(present & ~m, 1 / R_tr, 0.)
+    G_sum = numpy.sum(G_lin, axis=1)
+    tol = BRANCH_NEWTON_TOL * max(abs(input_data.V), 1e-30)
+
+    # ток диода и его производная по напряжению x
+    def diode(x):
+        z = s * x / NVt
+        zc = numpy.minimum(z, BRANCH_EXP_LIMIT)
+        e = numpy.exp(zc)
+        return s * Is * (e - 1 + e * (z - zc)), Is * e / NVt
+
+    u = numpy.zeros(K)
+    x = numpy.zeros(R.shape)
+    w = numpy.zeros(R.shape)
+    i = numpy.zeros(R.shape)
+    input_dummy = numpy.zeros((K, lendata))
+    VCurrent = numpy.zeros((K, lendata))
+    previous = None
+    for period in range(cycle):
+        for n in range(steps):
+            source = -input_data.V * math.sin(omega * (n + 1) * h)
+            a = w + hc * i
+            for iteration in range(BRANCH_NEWTON_ITER):
+                f, g = diode(x)
+                # уравнение узла input, умноженное на Rcs
+                F0 = source - u - Rcs * numpy.sum(G_lin * (u[:, None] - a) + numpy.where(m, f, 0.), axis=1)
+                Fk = numpy.where(m, u[:, None] - a - R_tr * f - x, x)
+                Dk = numpy.where(m, -(R_tr * g + 1), 1.)
+                gk = numpy.where(m, g, 0.)
+                du = (-F0 - Rcs * numpy.sum(gk * Fk / Dk, axis=1)) / (-1 - Rcs * (G_sum - numpy.sum(gk / Dk, axis=1)))
+                dx = numpy.clip((-Fk - numpy.where(m, du[:, None], 0.)) / Dk, -BRANCH_MAX_DX, BRANCH_MAX_DX)
+                u += du
+                x += dx
+                if (numpy.max(numpy.abs(du)) < tol) and (numpy.max(numpy.abs(dx)) < tol):
+                    break
+            f, g = diode(x)
+            i = numpy.where(m, f, G_lin * (u[:, None] - a))
+            w = a + hc * i
+            if (n + 1) % BRANCH_SUBSTEPS == 0:
+                input_dummy[:, (n + 1) // BRANCH_SUBSTEPS - 1] = u
+                VCurrent[:, (n + 1) // BRANCH_SUBSTEPS - 1] = numpy.sum(i, axis=1)
+
+        if (steady_tol is not None) and (previous is not None):
+            swing = numpy.maximum(numpy.ptp(input_dummy, axis=1), 1e-30)
+            if numpy.all(numpy.max(numpy.abs(input_dummy - previous), axis=1) <= steady_tol * swing):
+                break
+        previous = input_dummy.copy()
+
+    return [CVC_Data(AddNoise(input_dummy[k], input_data.SNR), AddNoise(VCurrent[k], input_data.SNR))
+            for k in range(K)]
+
+
+# Кэш результатов моделирования. Ключ - строка, однозначно задающая схему
+# и входные данные (например текст netlist и поля Init_Data).
+# Первый уровень - в памяти, не больше maxsize записей, вытесняются давно
+# не использованные. Второй уровень (если задан path) - каталог с файлами .npz,
+# переживает перезапуск программы и общий для нескольких процессов.
+class SimulationCache:
+    def __init__(self, maxsize=1024, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    # в другие процессы передаются только настройки, память у каждого своя
+    def __getstate__(self):
+        return {'maxsize': self.maxsize, 'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['maxsize'], state['path'])
+
+    def _file_name(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.npz')
+
+    def _remember(self, key, data):
+        self._data[key] = data
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    # CVC_Data для ключа key или None
+    def get(self, key):
+        with self._lock:
+            data = self._data.get(key)
+            if data is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return CVC_Data(data[0], data[1])
+
+            if self.path is not None:
+                try:
+                    with numpy.load(self._file_name(key)) as f:
+                        data = (f['input_dummy'], f['VCurrent'])
+                except (OSError, KeyError, ValueError):
+                    data = None
+                if data is not None:
+                    self._remember(key, data)
+                    self.disk_hits += 1
+                    return CVC_Data(data[0], data[1])
+
+            self.misses += 1
+            return None
+
+    def put(self, key, analysis):
+        data = (numpy.array(analysis.input_dummy, dtype=float), numpy.array(analysis.VCurrent, dtype=float))
+        with self._lock:
+            self._remember(key, data)
+            if self.path is None:
+                return
+            fileName = self._file_name(key)
+            # пишем во временный файл и переименовываем, чтобы другой процесс
+            # не прочитал недописанный файл
+            tmpName = '{}.{}.tmp.npz'.format(fileName[:-4], os.getpid())
+            try:
+                numpy.savez(tmpName, input_dummy=data[0], VCurrent=data[1])
+                os.replace(tmpName, fileName)
+            except OSError:
+                print('SimulationCache: cannot write ' + fileName)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses, 'size': len(self._data)}
+
+
+# Схема, один раз загруженная в разделяемый экземпляр ngspice.
+# При вычислении меняются только номиналы элементов (команда alter),
+# после чего заново выполняется тот же transient анализ.
+class CompiledCircuit:
+    # схема, загруженная в ngspice в данный момент
+    _loaded = None
+
+    def __init__(self, circuit, input_data, lendata, name="input", cycle=1, reltol=None):
+        period = 1 / input_data.F
+        rms_voltage = input_data.V / math.sqrt(2)
+        circuit.R('cs', 'input', 'input_dummy', input_data.Rcs)
+        circuit.AcLine('Current', circuit.gnd, 'input_dummy', rms_voltage=rms_voltage, frequency=input_data.F)
+        self.input_data = input_data
+        self.lendata = lendata
+        self.name = name.lower()
+        self.values = {}
+        # сохраняются только нужные векторы и только последний период
+        saved = [self.name, 'vcurrent#branch']
+        options = '' if reltol is None else '.options reltol={:e}\n'.format(reltol)
+        self.netlist = str(circuit) + options + '.save {}\n.tran {:e} {:e} {:e}\n.end\n'.format(
+            ' '.join(saved), period / lendata, period * cycle, period * (cycle-1))
+        self._ngspice = NgSpiceShared.new_instance()
+
+    def _load(self):
+        self._ngspice.destroy()
+        self._ngspice.remove_circuit()
+        self._ngspice.load_circuit(self.netlist)
+        self.values = {}
+        CompiledCircuit._loaded = self
+
+    # values - словарь {имя элемента: номинал}, меняются только изменившиеся номиналы
+    def run(self, values):
+        with SPICE_LOCK:
+            if CompiledCircuit._loaded is not self:
+                self._load()
+
+            commands = ['alter {} = {:e}'.format(k.lower(), v) for k, v in values.items() if self.values.get(k) != v]
+            for command in commands:
+                self._ngspice.exec_command(command)
+            self.values.update(values)
+
+            self._ngspice.destroy()
+            self._ngspice.run()
+            plot = self._ngspice.plot(None, self._ngspice.last_plot)
+            input_dummy = numpy.array(plot[self.name].to_waveform(), dtype=float)[-self.lendata:]
+            VCurrent = numpy.array(plot['vcurrent#branch'].to_waveform(), dtype=float)[-self.lendata:]
+        return CVC_Data(AddNoise(input_dummy, self.input_data.SNR), AddNoise(VCurrent, self.input_data.SNR))
+
+    def release(self):
+        with SPICE_LOCK:
+            if CompiledCircuit._loaded is self:
+                self._ngspice.destroy()
+                self._ngspice.remove_circuit()
+                CompiledCircuit._loaded = None
@@ -1,6 +1,6 @@
-from ctypes import CDLL, Structure, Array, c_ubyte, \
-    c_double, c_size_t, POINTER
+from ctypes import CDLL, c_double, c_size_t, POINTER
 from platform import system
+from threading import Lock
 import numpy as np
 VOLTAGE_AMPL = 12.
 R_CS = 475.
@@ -16,73 +16,166 @@ def _get_dll():
         raise NotImplementedError("Unsupported platform {0}".format(system()))
 
 
-lib = _get_dll()
 MAX_NUM_POINTS = 1000
+_c_double_p = POINTER(c_double)
 
+# чем сравнивать кривые: 'native' - библиотекой ivcmp, 'numpy' - аналогом
+# CompareIvcNumpy. Оценки аналога численно не совпадают с CompareIVC, поэтому
+# он включается только явно и со своим порогом (см. NUMPY_TOLERANCE)
+ENGINE = 'native'
 
-class _IterableStructure(Structure):
-    def __iter__(self):
-        return (getattr(self, n) for n, t in self._fields_)
+try:
+    lib = _get_dll()
+except (OSError, NotImplementedError):
+    lib = None
 
+if lib is not None:
+    # прототипы функций библиотеки задаются один раз при загрузке
+    lib.SetMinVC.argtypes = c_double, c_double
+    lib.SetMinVC.restype = None
+    lib.CompareIVC.argtypes = _c_double_p, _c_double_p, c_size_t, _c_double_p, _c_double_p, c_size_t
+    lib.CompareIVC.restype = c_double
 
-def _normalize_arg(value, desired_ctype):
-    from collections import Sequence
 
-    if isinstance(value, desired_ctype):
-        return value
-    elif issubclass(desired_ctype, Array) and isinstance(value, Sequence):
-        member_type = desired_ctype._type_
+def _native_lib():
+    if lib is None:
+        raise OSError("ivcmp library (libivcmp.so, ivcmp.dll) is not found, "
+                      "the numpy comparison is enabled only explicitly: ENGINE = 'numpy'")
+    return lib
 
-        if desired_ctype._length_ < len(value):
-            raise ValueError()
 
-        if issubclass(member_type, c_ubyte) and isinstance(value, bytes):
-            return desired_ctype.from_buffer_copy(value)
-        elif issubclass(member_type, c_ubyte) and isinstance(value, bytearray):
-            return value
-        else:
-            return desired_ctype(*value)
-    else:
-        return value
+# пороги шума, последние переданные в SetMinVC
+_min_var = [0., 0.]
 
 
-class IvCurve(_IterableStructure):
-    _fields_ = (
-        ("voltages", c_double*MAX_NUM_POINTS),
-        ("currents", c_double*MAX_NUM_POINTS),
-        ("length", c_size_t)
-    )
+# Кривая хранит напряжения и токи в массивах numpy (float64, непрерывных в памяти),
+# в библиотеку передаются указатели на эти массивы без копирования.
+# Без аргументов создается кривая из MAX_NUM_POINTS нулевых точек.
+class IvCurve:
+    def __init__(self, voltages=None, currents=None):
+        if voltages is None:
+            voltages = np.zeros(MAX_NUM_POINTS)
+        if currents is None:
+            currents = np.zeros(len(voltages))
+        self.voltages = np.ascontiguousarray(voltages, dtype=np.float64)
+        self.currents = np.ascontiguousarray(currents, dtype=np.float64)
+        if len(self.voltages) != len(self.currents):
+            raise ValueError('voltages and currents must have the same length')
+        self.length = len(self.voltages)
 
-    def __init__(self):
-        self.length = MAX_NUM_POINTS
+    def _pointers(self):
+        return (self.voltages.ctypes.data_as(_c_double_p), self.currents.ctypes.data_as(_c_double_p),
+                min(self.length, len(self.voltages)))
 
 
 def SetMinVC(min_var_v, min_var_c):
-    lib_func = lib.SetMinVC
-    lib_func.argtype = c_double, c_double
-    lib_func(c_double(min_var_v),  c_double(min_var_c))
-
-
-def CompareIvc(first_iv_curve, second_iv_curve):
-    lib_func = lib.CompareIVC
-    lib_func.argtype = POINTER(c_double), POINTER(c_double), c_size_t, POINTER(c_double), POINTER(c_double), c_size_t
-    lib_func.restype = c_double
-    res = lib_func(first_iv_curve.voltages, first_iv_curve.currents, first_iv_curve.length,
-                   second_iv_curve.voltages, second_iv_curve.currents, second_iv_curve.length)
-    res = _normalize_arg(res, c_double)
+    _min_var[0] = min_var_v
+    _min_var[1] = min_var_c
+    if lib is not None:
+        lib.SetMinVC(min_var_v, min_var_c)
+
+
+# Пороги SetMinVC хранятся в библиотеке глобально, поэтому сравнение со своими
+# порогами (min_var_v, min_var_c) выполняется под блокировкой
+_lock = Lock()
+
+
+# engine - 'native' или 'numpy', по умолчанию ENGINE
+def CompareIvc(first_iv_curve, second_iv_curve, min_var_v=None, min_var_c=None, engine=None):
+    if (engine or ENGINE) == 'numpy':
+        return CompareIvcNumpy(first_iv_curve, second_iv_curve, min_var_v, min_var_c)
+
+    native = _native_lib()
+    first = first_iv_curve._pointers()
+    second = second_iv_curve._pointers()
+    with _lock:
+        if min_var_v is not None:
+            SetMinVC(min_var_v, min_var_c)
+        res = native.CompareIVC(*(first + second))
     return res
 
 
+# первая кривая (target) против стопки кривых voltages, currents формы (N, points).
+# Возвращает массив из N оценок несовпадения
+def CompareIvcBatch(target_iv_curve, voltages, currents, min_var_v=None, min_var_c=None, engine=None):
+    if (engine or ENGINE) == 'numpy':
+        return CompareIvcBatchNumpy(target_iv_curve, voltages, currents, min_var_v, min_var_c)
+
+    voltages = np.atleast_2d(voltages)
+    currents = np.atleast_2d(currents)
+    return np.array([CompareIvc(target_iv_curve, IvCurve(v, c), min_var_v, min_var_c, 'native')
+                     for v, c in zip(voltages, currents)])
+
+
+# СРАВНЕНИЕ НА NUMPY ##########################################################
+# Отдельная приближенная мера, а не перенос алгоритма CompareIVC: исходный код
+# библиотеки не поставляется, и оценки численно с ним не совпадают. Напряжения и
+# токи нормируются на размах сигнала, но не меньше порогов шума SetMinVC, после
+# чего считается среднее расстояние от точек одной кривой до ближайших точек
+# другой, в обе стороны (0 - кривые совпадают). Поэтому у аналога свой порог
+# совпадения NUMPY_TOLERANCE, результаты подбора с ENGINE = 'numpy' и 'native'
+# могут различаться.
+# Порог подобран на кривых разной формы (пороги шума - 1% амплитуды, см.
+# tests/test_ivcmp.py): резистор, RC цепь, резистор с диодом, диод с резистором
+# параллельно резистору, два встречных диода. Изменение определяющего номинала
+# на 6% дает оценки 0.042, 0.032, 0.027, 0.015, 0.012 - все не больше порога,
+# изменение на 30% - 0.164, 0.108, 0.097, 0.056, 0.047 - все больше порога.
+# Чем меньшую часть кривой меняет номинал, тем большее его отклонение допускает порог
+NUMPY_TOLERANCE = 4.5e-2
+
+# ограничение на число элементов промежуточного массива расстояний
+BATCH_MAX_ELEMENTS = 8000000
+
+
+def _noise_floors(min_var_v, min_var_c):
+    if min_var_v is None:
+        return _min_var[0], _min_var[1]
+    return min_var_v, min_var_c
+
+
+# масштаб по оси: среднеквадратичное отклонение, но не меньше порога шума
+def _axis_scale(target, candidates, min_var):
+    scale = np.maximum(np.std(candidates, axis=1), np.std(target))
+    return np.maximum(scale, abs(min_var) + np.finfo(float).tiny)
+
+
+def CompareIvcBatchNumpy(target_iv_curve, voltages, currents, min_var_v=None, min_var_c=None):
+    min_var_v, min_var_c = _noise_floors(min_var_v, min_var_c)
+    tv = np.asarray(target_iv_curve.voltages[:target_iv_curve.length], dtype=np.float64)
+    tc = np.asarray(target_iv_curve.currents[:target_iv_curve.length], dtype=np.float64)
+    voltages = np.atleast_2d(np.asarray(voltages, dtype=np.float64))
+    currents = np.atleast_2d(np.asarray(currents, dtype=np.float64))
+
+    n, points = voltages.shape
+    result = np.empty(n)
+    chunk = max(1, BATCH_MAX_ELEMENTS // (points * len(tv)))
+    for k in range(0, n, chunk):
+        v = voltages[k:k + chunk]
+        c = currents[k:k + chunk]
+        sv = _axis_scale(tv, v, min_var_v)[:, None, None]
+        sc = _axis_scale(tc, c, min_var_c)[:, None, None]
+        # квадраты расстояний (кривая, точка кандидата, точка цели)
+        d2 = ((v[:, :, None] - tv[None, None, :]) / sv) ** 2
+        d2 += ((c[:, :, None] - tc[None, None, :]) / sc) ** 2
+        to_target = np.sqrt(d2.min(axis=2)).mean(axis=1)
+        from_target = np.sqrt(d2.min(axis=1)).mean(axis=1)
+        result[k:k + chunk] = (to_target + from_target) / 2
+    return result
+
+
+def CompareIvcNumpy(first_iv_curve, second_iv_curve, min_var_v=None, min_var_c=None):
+    return float(CompareIvcBatchNumpy(first_iv_curve, second_iv_curve.voltages[None, :second_iv_curve.length],
+                                      second_iv_curve.currents[None, :second_iv_curve.length],
+                                      min_var_v, min_var_c)[0])
+
+
 if __name__ == "__main__":
-    iv_curve = IvCurve()
-    ivc_curve = IvCurve()
-    for i in range(MAX_NUM_POINTS):
-        iv_curve.voltages[i] = 0.47 * VOLTAGE_AMPL * np.sin(2 * 3.14 * i / MAX_NUM_POINTS)
-        iv_curve.currents[i] = 0.63 * CURRENT_AMPL * np.sin(2 * 3.14 * i / MAX_NUM_POINTS)
-        ivc_curve.voltages[i] = VOLTAGE_AMPL * np.sin(2 * 3.14 * i / MAX_NUM_POINTS)
-        ivc_curve.currents[i] = CURRENT_AMPL * np.cos(2 * 3.14 * i / MAX_NUM_POINTS)
+    phase = 2 * 3.14 * np.arange(MAX_NUM_POINTS) / MAX_NUM_POINTS
+    iv_curve = IvCurve(0.47 * VOLTAGE_AMPL * np.sin(phase), 0.63 * CURRENT_AMPL * np.sin(phase))
+    ivc_curve = IvCurve(VOLTAGE_AMPL * np.sin(phase), CURRENT_AMPL * np.cos(phase))
     SetMinVC(0, 0)
     f = CompareIvc(iv_curve, ivc_curve)
     print(f)
+    print(CompareIvcNumpy(iv_curve, ivc_curve))
     # for i in range(MAX_NUM_POINTS):
     #     print(iv_curve.currents[i], iv_curve.voltages[i])
@@ -20,8 +20,9 @@ import scipy.fft as scf
 import math
 import numpy as np
 import matplotlib.pyplot as plt
-from ctypes import c_double
 import json
+import multiprocessing
+import os
 # внешние модули
 import MySpice.MySpice as spice
 import ivcmp.ivcmp as ivcmp
@@ -29,6 +30,8 @@ import gc
 
 
 # SETTINGS ################################################################
+# Настройки ниже - значения по умолчанию. Каждый SolverContext при создании
+# копирует их себе, и дальше работает только со своей копией.
 
 # метод сравнения кривых тока и напряжения
 # может быть : 'ivcmp','type_ps'
@@ -68,6 +71,9 @@ BIG_R = 1e8  # 100 МОм
 # "мизерное сопротивление"
 NULL_R = 1e-6  # 1 мкОм
 
+# наименьшее сопротивление резисторов R1, R2, R3 при подборе
+R_MIN = 1e-2
+
 # "мизерная емкость","огромная емкость"
 NONE_C = 1e-15  # 0.001 пФ
 HUGE_C = 1e-3  # 1000 мкФ
@@ -76,112 +82,164 @@ HUGE_C = 1e-3  # 1000 мкФ
 # IVCMP_TOLERANCE = 5e-3
 IVCMP_TOLERANCE = 6e-2
 
+# чем сравнивать кривые: 'native' - библиотекой ivcmp, 'numpy' - отдельной
+# приближенной мерой ivcmp.CompareIvcNumpy (включается только явно). У нее своя
+# шкала оценок, и вместо IVCMP_TOLERANCE действует порог IVCMP_NUMPY_TOLERANCE,
+# поэтому результат подбора зависит от выбранного сравнения
+IVCMP_ENGINE = 'native'
+IVCMP_NUMPY_TOLERANCE = ivcmp.NUMPY_TOLERANCE
+
 
-# погрешность подбора номиналов в процентах. Номиналы емкостей считаются по
-# реактивному сопротивлению!. Подробности см. scipy.minimize(method='Powell')
+# относительная погрешность подбора номиналов. Номиналы емкостей считаются по
+# реактивному сопротивлению!. Подбор идет в декадах, для scipy.minimize(method='Powell')
+# это xtol = log10(1+VALUES_TOLERANCE)
 VALUES_TOLERANCE = 1e-2
 
 # число вычислений функции в процессе оптимизации. При малых значениях-
 # минимально возможное число
 MAXFEV = 100
 
+# порядок подбора сессий после пристрелки:
+# 'sequential' - по очереди, каждой сессии MAXFEV вычислений;
+# 'halving' - все сессии получают по HALVING_MIN_FEV вычислений, лучшая доля
+# HALVING_KEEP продолжает подбор с удвоенным числом вычислений, и так далее,
+# пока не останется одна сессия с MAXFEV вычислений. Каждый раунд отсеивает
+# хотя бы одну сессию, HALVING_MIN_FEV не меньше 1
+FITTER_SCHEDULE = 'sequential'
+HALVING_MIN_FEV = 10
+HALVING_KEEP = 0.5
+
+# метод подбора номиналов в сессии, см. FITTER_METHODS:
+# 'powell' - scipy.optimize.minimize(method='Powell'),
+# 'de' - дифференциальная эволюция, точки вычисляются поколениями,
+# 'lm' - метод Левенберга-Марквардта по вектору невязок токов
+# (scipy.optimize.least_squares), столбцы якобиана вычисляются одним пакетом
+FITTER_METHOD = 'powell'
+# параметры дифференциальной эволюции: размер поколения на один параметр,
+# сила мутации, вероятность скрещивания, во сколько раз номинал может
+# отличаться от начального, начальное значение генератора случайных чисел
+# каждого подбора (None - случайное, подбор не воспроизводится)
+DE_POPULATION = 5
+DE_F = 0.7
+DE_CR = 0.9
+DE_SPAN = 10.
+DE_SEED = None
+# шаг конечных разностей якобиана для 'lm', в декадах номинала
+LM_STEP = 1e-3
+
+# подбирать ветви диодов по полуволнам: D1 открыт только в положительной
+# полуволне, D3 - в отрицательной. Сначала R1, C1 подбираются по невязкам
+# тока положительной полуволны, R3, C3 - отрицательной, при общих номиналах
+# ветви 2 (см. Session_run_halfwave), на это уходит доля HALFWAVE_FEV_SHARE
+# вычислений. Затем все номиналы уточняются совместно. При BATCH_WORKERS > 1
+# полуволны подбираются одновременно в процессах batch_pool. Подбор, на одну
+# полуволну которого приходится меньше HALFWAVE_MIN_FEV вычислений (короткие
+# раунды 'halving'), не делится
+HALFWAVE_SPLIT = False
+HALFWAVE_FEV_SHARE = 0.5
+HALFWAVE_MIN_FEV = 10
+
+# число процессов для вычисления поколений точек методами, которые считают
+# точки пакетами. Не используется внутри процессов FITTER_WORKERS
+BATCH_WORKERS = 1
+
+# число процессов для параллельного подбора сессий, у каждого процесса свой
+# экземпляр ngspice. 1 - сессии подбираются последовательно
+FITTER_WORKERS = 1
+
 # число точек в массивах тока и напряжения, может измениться при загрузке
 # внешнего файла данных
 MAX_NUM_POINTS = 100
 
-
-min_ivc = 1
-#############################################################################
-
-# результат последнего моделирования в PySpice
-analysis = None
-
-# целевая кривая с током. Та, которую мы подбираем
-target_VCurrent = None
-# измеренное прибором напряжение в точке после резистора Rcs
-target_input_dummy = None
-
-target_fileName = ''
-
-# целевая кривая с током для сравнения в библиотеке ivcmp
-target_IVCurve = None
-
-
 # название временного файла схемы для запуска PySpice
 circuit_SessionFileName = 'var1.cir'
 
-# список значений для файла шаблона схемы. Число элементов - не меньше, чем
-# знаков {} в файле шаблона схемы
-# Xi_long = [0.,0.,0.,0., 0.,0.,0., 0.,0.,0.,0.]
-Xi_long = np.array([0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0.])
-
-
-# Маска оптимизируемых параметров - список булевого типа, например -
-# Xi_long = [a, b, c, d]
-# Xi_mask = [False,True,False,True] -> X_short = [b,d]
-Xi_mask = [False, False, False, False, False, False, False, False, False, False, False]
-
-
-# ФУНКЦИИ ДЛЯ ШАБЛОНА, ЦЕЛЕВОЙ МОДЕЛИ И МАСКИ ПАРАМЕТРОВ ##################
-def Xi_unroll(x_short):
-    XL = Xi_long.copy()
-
-    j = 0
-    for i in range(0, len(Xi_mask)):
-        if Xi_mask[i]:
-            XL[i] += x_short[j]
-            j += 1
-
-    return XL
-
-
-def Xi_pack(Xi_):
-    xi = []
-
-    for i in range(0, len(Xi_mask)):
-        if Xi_mask[i]:
-            xi += [Xi_[i]]
+# строить схему для моделирования в памяти, не записывая и не разбирая
+# файл circuit_SessionFileName на каждом вычислении функции
+CIRCUIT_IN_MEMORY = True
+
+# в пределах сессии подбора загружать схему в ngspice один раз и менять
+# только номиналы элементов (alter), не пересоздавая схему и симулятор.
+# Включается явно: совпадение с spice.CreateCVC1 проверяет tests/test_compiled.py,
+# только если доступна библиотека ngspice
+CIRCUIT_COMPILED = False
+
+# установившийся режим: останавливаться, когда два последних периода совпадают
+# с этой точностью (доля от размаха сигнала), но не дольше INIT_CYCLE периодов.
+# В ngspice схема считается порциями (см. spice.STEADY_CHUNK) через spice.CreateCVC1,
+# без CIRCUIT_COMPILED; встроенный решатель (SIMULATOR = 'numpy') проверяет каждый
+# период. None - всегда моделировать INIT_CYCLE периодов
+STEADY_STATE_TOLERANCE = None
+
+# чем моделировать пакеты схем при подборе: 'ngspice' или 'numpy' - встроенный
+# решатель трех ветвей схемы замещения (spice.BranchNetworkCVC), который
+# считает сразу пакет вариантов номиналов. Одиночные схемы и итоговая схема
+# (Sch_saveToFile) всегда моделируются в ngspice, и успех по результатам
+# встроенного решателя проверяется в ngspice (см. Session_verify)
+SIMULATOR = 'ngspice'
+
+# пакеты схем (стартовые схемы сессий, поколения методов подбора с пакетным
+# вычислением точек) моделировать в ngspice по SPICE_BATCH_SIZE схем за один
+# запуск, см. spice.CreateCVCBatch. 1 - каждая схема моделируется отдельно
+SPICE_BATCH_SIZE = 1
+
+# схемы без диодов (D1 и D3 закорочены или их ветви отключены) считать
+# методом комплексных амплитуд, без ngspice
+LINEAR_PHASOR = True
+
+# грубое моделирование для отсева: COARSE_POINTS точек на период (не меньше 60),
+# COARSE_CYCLE периодов, относительная точность ngspice COARSE_RELTOL. Результат
+# интерполируется на MAX_NUM_POINTS точек. При MULTI_FIDELITY = True грубо
+# оцениваются стартовые схемы сессий, все вычисления коротких раундов 'halving'
+# и первая доля COARSE_FEV_SHARE вычислений остальных подборов. Точно пересчитываются
+# точка подбора, грубый misfit которой не больше лучшего грубого в (1+COARSE_MARGIN)
+# раз, и стартовая схема, грубое сравнение ivcmp которой не больше порога останова
+# в (1+COARSE_MARGIN) раз. Результат подбора и достижение IVCMP_TOLERANCE - всегда
+# по точному расчету
+MULTI_FIDELITY = False
+COARSE_POINTS = 60
+COARSE_CYCLE = 3
+COARSE_RELTOL = 1e-2
+COARSE_MARGIN = 0.5
+COARSE_FEV_SHARE = 0.5
+
+# до моделирования распознавать по целевым массивам простые кривые: обрыв
+# (сопротивление больше BIG_R), короткое замыкание (меньше R_MIN) и резистор.
+# Такие кривые решаются без пристрелки и подбора, см. classify_target
+TRIVIAL_CLASSIFIER = True
+# резистор: СКО тока от прямой I = V/R + I0, доля размаха тока
+TRIVIAL_LINEAR_TOLERANCE = 1e-2
+
+# в схемах, где все включенные ветви без конденсаторов, находить проводимости
+# ветвей сразу линейным МНК по целевой кривой (см. resistive_lsq). Если схема
+# без диодов и кривая ложится на модель с точностью TRIVIAL_LINEAR_TOLERANCE,
+# найденные R1, R2, R3 больше не подбираются, иначе служат начальными значениями.
+# Для схемы с диодами оценка - дополнительная стартовая сессия (Session_resistive_seed)
+RESISTIVE_LSQ = True
+
+# выводить графики пристрелки и результата подбора
+SHOW_PLOTS = True
+
+# пристрелка R1, R2, R3: кроме аналитических вариантов перебирается сетка
+# Z123_GRID_POINTS**3 вариантов (0 - не перебирать) в пределах
+# Z123_GRID_DECADES декад вокруг аналитической оценки
+Z123_GRID_POINTS = 9
+Z123_GRID_DECADES = 1.
+
+# кэш результатов моделирования, общий для всех контекстов. Оптимизатор часто
+# возвращается в почти те же точки, а разные коды переключателей дают одну и
+# ту же схему. spice.SimulationCache(maxsize, path) - path задает каталог для
+# хранения на диске. None - кэш не используется
+SIM_CACHE = spice.SimulationCache(1024)
 
-    return xi
-
-
-# установить все известные номиналы
-def set_circuit_nominals(nominals):
-    global Xi_long
-    Xi_long = nominals.copy()
-
-
-def reset_Xi_variable():
-    for i in range(len(Xi_mask)):
-        Xi_mask[i] = False
-
-
-def set_Xi_variable(vlist):
-    for v in vlist:
-        if v == 'R1':
-            Xi_mask[0] = True
-        if v == 'C1':
-            Xi_mask[1] = True
-        if v == '_R_C1':
-            Xi_mask[2] = True
-        if v == '_R_D1':
-            Xi_mask[3] = True
-
-        if v == 'R2':
-            Xi_mask[4] = True
-        if v == 'C2':
-            Xi_mask[5] = True
-        if v == '_R_C2':
-            Xi_mask[6] = True
+#############################################################################
 
-        if v == 'R3':
-            Xi_mask[7] = True
-        if v == 'C3':
-            Xi_mask[8] = True
-        if v == '_R_C3':
-            Xi_mask[9] = True
-        if v == '_R_D3':
-            Xi_mask[10] = True
+# модель диодов D1, D3 схемы замещения
+DIODE_MODEL_NAME = 'DMOD_D1'
+DIODE_MODEL = {'Is': 2.22e-10, 'N': 1.65, 'Cj0': 4e-12, 'M': 0.333, 'Vj': 0.7, 'Fc': 0.5,
+               'Rs': 0.0686, 'Tt': 5.76e-09, 'Ikf': 0, 'Kf': 0, 'Af': 1, 'Bv': 75, 'Ibv': 1e-06,
+               'Xti': 3, 'Eg': 1.11, 'Tcv': 0, 'Trs': 0, 'Ttt1': 0, 'Ttt2': 0, 'Tm1': 0, 'Tm2': 0,
+               'Tnom': 26.85}
 
 
 def sign(value):
@@ -191,206 +249,6 @@ def sign(value):
         return 1
 
 
-# инициализировать целевую модель, промоделировав файл схемы
-def init_target_by_circuitFile(fileName=circuit_SessionFileName):
-    global target_VCurrent, target_input_dummy, target_IVCurve
-    global circuit_SessionFileName
-    global Z123_sch
-    Z123_sch = None
-
-    var1 = circuit_SessionFileName
-    circuit_SessionFileName = fileName
-    process_circuitFile()
-    circuit_SessionFileName = var1
-
-    target_VCurrent = analysis.VCurrent
-    target_input_dummy = analysis.input_dummy
-
-    iv_curve = ivcmp.IvCurve()
-    iv_curve.length = MAX_NUM_POINTS-1
-    for i in range(MAX_NUM_POINTS-1):
-        iv_curve.voltages[i] = c_double(analysis.input_dummy[i])  # Ток и напряжение были поменяны местами
-        iv_curve.currents[i] = c_double(analysis.VCurrent[i])
-
-    min_var_c = 0.01 * np.max(iv_curve.currents[:MAX_NUM_POINTS-1])  # value of noise for current
-    min_var_v = 0.01 * np.max(iv_curve.voltages[:MAX_NUM_POINTS-1])  # value of noise for voltage
-    # if (abs(min_var_c) < INIT_V/INIT_Rcs*0.03):
-    #    min_var_c = sign(min_var_c)*INIT_V/INIT_Rcs*0.03
-    ivcmp.SetMinVC(min_var_v, min_var_c)  # Правильные значения фильтров для корректной работы
-
-    target_IVCurve = iv_curve
-
-
-# инициализировать целевую модель данными из json файла, установить число точек на кривой MAX_NUM_POINTS
-# определенными из файла
-def init_target_from_jsnFile(fileName, N):
-
-    global target_fileName
-
-    target_fileName = fileName
-
-    ivc_real = open_board(fileName)
-    if ivc_real is None:
-        print('open_board() failed')
-        return
-
-    print('record number = '+str(N))
-    target_voltages = ivc_real["elements"][0]["pins"][N]["iv_curves"][0]["voltages"]
-    target_currents = ivc_real["elements"][0]["pins"][N]["iv_curves"][0]["currents"]
-
-    # частота, Гц
-    initF = ivc_real["elements"][0]["pins"][N]["iv_curves"][0]["measurement_settings"]["probe_signal_frequency"]
-    print('INIT_F = '+str(initF))
-    # амплитудное напряжение, Вольт, может изменится при загрузке внешнего файла данных
-    initV = ivc_real["elements"][0]["pins"][N]["iv_curves"][0]["measurement_settings"]["max_voltage"]
-    print('INIT_V = '+str(initV))
-    # токоограничивающий резистор, Ом
-    initRcs = ivc_real["elements"][0]["pins"][N]["iv_curves"][0]["measurement_settings"]["internal_resistance"]
-    print('INIT_Rcs = '+str(initRcs))
-    return initF, initV, initRcs, target_voltages, target_currents
-
-
-def init_target_Data(target_voltages,
-                     target_currents,
-                     initF=1e4,
-                     initV=5,
-                     initRcs=1e2,
-                     initSNR=120,
-                     cycle=10,
-                     ivcmpTolerance=6e-2):
-    global MAX_NUM_POINTS, INIT_V, INIT_F, INIT_Rcs
-    global target_VCurrent, target_input_dummy, target_IVCurve
-
-    target_input_dummy = target_voltages
-    target_VCurrent = target_currents
-    INIT_F = initF
-    INIT_V = initV
-    INIT_Rcs = initRcs
-    MAX_NUM_POINTS = len(target_input_dummy)
-    print('MAX_NUM_POINTS = '+str(MAX_NUM_POINTS))
-
-    iv_curve1 = ivcmp.IvCurve()
-    iv_curve1.length = MAX_NUM_POINTS-1
-    for i in range(MAX_NUM_POINTS-1):
-        iv_curve1.voltages[i] = c_double(target_input_dummy[i])  # Ток и напряжение были поменяны местами
-        iv_curve1.currents[i] = c_double(target_VCurrent[i])
-
-    min_var_c = 0.01 * np.max(iv_curve1.currents[:MAX_NUM_POINTS-1])  # value of noise for current
-    min_var_v = 0.01 * np.max(iv_curve1.voltages[:MAX_NUM_POINTS-1])  # value of noise for voltage
-
-    ivcmp.SetMinVC(min_var_v, min_var_c)  # Правильные значения фильтров для корректной работы
-
-    target_IVCurve = iv_curve1
-    return
-
-
-def Xi_to_RC(Xi):
-    RC = Xi.copy()
-
-    RC[0] = np.abs(Xi[0])
-    RC[1] = np.abs(R_to_C(Xi[1]))  # C1
-    RC[2] = np.abs(Xi[2])
-    RC[3] = np.abs(Xi[3])
-
-    RC[4] = np.abs(Xi[4])
-    RC[5] = np.abs(R_to_C(Xi[5]))  # C2
-    RC[6] = np.abs(Xi[6])
-
-    RC[7] = np.abs(Xi[7])
-    RC[8] = np.abs(R_to_C(Xi[8]))  # C3
-    RC[9] = np.abs(Xi[9])
-    RC[10] = np.abs(Xi[10])
-    return RC
-
-
-# в наборе строк шаблона схемы сделать замену {} на значения
-# варьирования Xi_values, сохранить заданным с именем
-def generate_circuitFile_by_values(Xi_values):
-    rc_values = Xi_to_RC(Xi_values)
-    with open(circuit_SessionFileName, 'w') as newF:
-        newF.write('* cir file corresponding to the equivalent circuit.\n')
-        # * Цепь 1
-        if rc_values[0] < BIG_R:  # цепь R1 присутствует
-            if rc_values[2] >= BIG_R:  # C1 присутствует
-                newF.write('R1 _net1 input {:e}\n'.format(rc_values[0]))
-                newF.write('C1 _net0 _net1 {:e}\n'.format(rc_values[1]))
-            else:  # С1 нет
-                newF.write('R1 _net0 input {:e}\n'.format(rc_values[0]))
-
-            if rc_values[3] >= BIG_R:  # D1 присутствует
-                newF.write('D1 _net0 0 DMOD_D1 AREA=1.0 Temp=26.85\n')
-            else:  # вместо D1 перемычка
-                newF.write('R_D1 0 _net0 {:e}\n'.format(rc_values[3]))
-
-        # * Цепь 2
-        if rc_values[4] < BIG_R:
-            if rc_values[6] >= BIG_R:  # C2 присутствует
-                newF.write('R2 _net4 input {:e}\n'.format(rc_values[4]))
-                newF.write('C2 0 _net4 {:e}\n'.format(rc_values[5]))
-            else:  # вместо С2 перемычка, R2 сразу на землю
-                newF.write('R2 0 input {:e}\n'.format(rc_values[4]))
-
-        # * Цепь 3
-        if rc_values[7] < BIG_R:
-            if rc_values[9] >= BIG_R:  # C3 присутствует
-                newF.write('R3 _net3 input {:e}\n'.format(rc_values[7]))
-                newF.write('C3 _net2 _net3 {:e}\n'.format(rc_values[8]))
-            else:  # С3 нет
-                newF.write('R3 _net2 input {:e}\n'.format(rc_values[7]))
-
-            if rc_values[10] >= BIG_R:  # D3 присутствует
-                newF.write('D3 0 _net2 DMOD_D1 AREA=1.0 Temp=26.85\n')
-            else:  # вместо D3 перемычка
-                newF.write('R_D3 0 _net2 {:e}\n'.format(rc_values[10]))
-
-        # есть диоды, добавляем модель
-        if (rc_values[10] >= BIG_R) or (rc_values[3] >= BIG_R):
-            newF.write('.MODEL DMOD_D1 D (Is=2.22e-10 N=1.65 Cj0=4e-12 M=0.333 '
-                       'Vj=0.7 Fc=0.5 Rs=0.0686 Tt=5.76e-09 Ikf=0 Kf=0 Af=1 Bv=75 '
-                       'Ibv=1e-06 Xti=3 Eg=1.11 Tcv=0 Trs=0 Ttt1=0 Ttt2=0 Tm1=0 Tm2=0 Tnom=26.85 )\n')
-
-        newF.write('.END')
-    # end of with
-
-
-input_data = None
-
-
-# промоделировать файл схемы
-def process_circuitFile():
-    global analysis, input_data
-
-    if input_data is None:
-        input_data = spice.Init_Data(INIT_F, INIT_V, INIT_Rcs, INIT_SNR)
-
-    try:
-        circuit = spice.LoadFile(circuit_SessionFileName)
-    except Exception:
-        print('spice.LoadFile() failed.')
-
-    try:
-        analysis = spice.CreateCVC1(circuit, input_data, MAX_NUM_POINTS, "input", INIT_CYCLE)
-    except Exception:
-        print('spice.CreateCVC1() failed.')
-
-
-# последний анализ перевести в форму, пригодную для сравнения в ivcmp
-iv_curve = None
-
-
-def analysis_to_IVCurve():
-    global iv_curve
-
-    if iv_curve is None:
-        iv_curve = ivcmp.IvCurve()
-        iv_curve.length = MAX_NUM_POINTS-1
-    for i in range(MAX_NUM_POINTS-1):
-        iv_curve.voltages[i] = c_double(analysis.input_dummy[i])
-        iv_curve.currents[i] = c_double(analysis.VCurrent[i])
-
-    return iv_curve
-
-
 def V_div_I(v, i):
     try:
         r = v/i
@@ -399,195 +257,31 @@ def V_div_I(v, i):
     return r
 
 
-# вывести на график результат моделирования
-def analysis_plot(title='', pngName=''):
-    plt.figure(1, (20, 10))
-    plt.grid()
-
-    # целевая ВАХ
-    plt.plot(target_input_dummy, target_VCurrent, color='red')
-    # ВАХ результат подбора
-    plt.plot(analysis.input_dummy, analysis.VCurrent, color='blue')
-
-    s = ''
-    if (not title == ''):
-        s = title
-    elif not target_fileName == '':
-        s = target_fileName
-
-    s = s+', misfit=' + format(misfit_result, '0.5E')+', ivcmp='+format(ivcmp_result, '0.5E')
-
-    plt.title(s)
-
-    plt.xlabel('Напряжение [В]')
-    plt.ylabel('Сила тока [А]')
-
-    if (not pngName == ''):
-        plt.savefig(pngName)
-    plt.xlim([-INIT_V, INIT_V])
-    plt.ylim([-INIT_V/INIT_Rcs, INIT_V/INIT_Rcs])
-    plt.show()
-
-
-# ФУНКЦИИ СРАВНЕНИЯ ВАХ ###################################################
-def C_to_R(c):
-    r = 1/(2.*np.pi*INIT_F*c)
-    return r
-
-
-def R_to_C(r):
-    c = 1/(2.*np.pi*INIT_F*r)
-    if math.isinf(c):
-        c = 1e20
-    return c
-
-
-def analysis_misfit_ivcmp():
-    global min_ivc
-    step_IVCurve = analysis_to_IVCurve()
-    res = ivcmp.CompareIvc(target_IVCurve, step_IVCurve)
-    if min_ivc > res:
-        min_ivc = res
-    return res
-
-
-# вычислить несовпадение последнего анализа и целевой функции.
-def analysis_misfit():
-    curr_t = target_VCurrent
-    curr_a = analysis.VCurrent
-    volt_t = target_input_dummy
-    volt_a = analysis.input_dummy
-
-    # метод сравнения кривых по несовпадению кривых мощности.
-    # учитывает возможное несогласование фаз сигналов
-    if MISFIT_METHOD == 'type_ps':
-        fullV_target = np.zeros_like(target_input_dummy)
-        fullV_A = np.zeros_like(target_input_dummy)
-        signal_target = np.zeros_like(target_input_dummy)
-        signal_A = np.zeros_like(target_input_dummy)
-        signal_cmp = np.zeros_like(target_input_dummy)
-
-        for i in range(len(fullV_target)):
-            # полные напряжения возбуждения
-            fullV_target[i] = target_input_dummy[i]+INIT_Rcs*target_VCurrent[i]
-            fullV_A[i] = analysis.input_dummy[i]+INIT_Rcs*analysis.VCurrent[i]
-            # мощности, ушедшие в нагрузку
-            # signal_target[i] = fullV_target[i]*target_VCurrent[i]
-            # signal_A[i] = fullV_A[i]*analysis.VCurrent[i]
-            signal_target[i] = target_VCurrent[i]
-            signal_A[i] = analysis.VCurrent[i]
-
-        # выравнивание фаз по максимуму сигнала
-        index_target = np.argmax(fullV_target)
-        index_A = np.argmax(fullV_A)
-        # фазовый сдвиг в отсчетах
-        phase_shift = index_A - index_target + len(signal_target)
-
-        for i in range(len(signal_target)):
-            i_A = (i+phase_shift) % len(signal_target)
-            # разница мгновенной мощности
-            signal_cmp[i] = (signal_target[i]-signal_A[i_A])**2
-
-        return math.fsum(signal_cmp)
-
-    if MISFIT_METHOD == 'power_fft':
-        r = scf.rfft(curr_t*volt_t-curr_a*volt_a)
-        return math.fsum(r)
-
-    if MISFIT_METHOD == 'sko':
-        r = (curr_t-curr_a)
-        r2 = np.abs(r)
-        return math.fsum(r2)
-
-    if MISFIT_METHOD == 'ivcmp':
-        step_IVCurve = analysis_to_IVCurve()
-        res = ivcmp.CompareIvc(target_IVCurve, step_IVCurve)
-        return res
-
-    ###
-    s = "unknown MISFIT_METHOD = '"+str(MISFIT_METHOD)+"'"
-    raise RuntimeError(s)
-
-
-# ФУНКЦИИ РЕШАТЕЛЯ ########################################################
-# вектор, обеспечивающий минимум оптимизируемой функции
-Xi_result = np.array([0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0.])
-
-# текущий найденный минимум оптимизируемой функции
-misfit_result = 0.
-# результат сравнения найденного минимума по функцией CompareIvc()
-ivcmp_result = 0.
-
-# счетчик числа вызовов функции оптимизатором
-FitterCount = 0
-BestMisfitCount = 0
-FITTER_SUCCESS = False
-
-
-def calculate_misfit(Xi):
-    generate_circuitFile_by_values(Xi)
-    process_circuitFile()
-    misfit = analysis_misfit()
-    return misfit
-
-
-# функция вызывается оптимизатором
-def fitter_subroutine(Xargs):
-    global Xi_result, misfit_result, FitterCount, BestMisfitCount, ivcmp_result, FITTER_SUCCESS
-    FitterCount += 1
-    xi = Xi_unroll(Xargs)
-    misfit = calculate_misfit(xi)
-    if MISFIT_METHOD == 'ivcmp':
-        ivcmp_result = misfit
-    # первый запуск
-    if FitterCount <= 1:
-        Xi_result = xi.copy()
-        misfit_result = misfit
-        ivcmp_result = analysis_misfit_ivcmp()
-        BestMisfitCount = 0
-
-    # лучший случай
-    if misfit < misfit_result:
-        Xi_result = xi.copy()
-        misfit_result = misfit
-        ivcmp_result = analysis_misfit_ivcmp()
-        BestMisfitCount += 1
-
-    # дополнительная проверка
-    if ivcmp_result <= IVCMP_TOLERANCE:  # достигли необходимой точности
-        FITTER_SUCCESS = True
-
-    return misfit
-
-
-def fitter_callback(Xk):
-    global FITTER_SUCCESS
-    if ivcmp_result <= IVCMP_TOLERANCE:  # достигли необходимой точности
-        FITTER_SUCCESS = True
-        return True
-
+# есть ли в списке элементов диоды
+def has_diodes(elements):
+    for e in elements:
+        if e[0][0] == 'D':
+            return True
     return False
 
 
-# запустить автоподбор - сравнение по сумме отклонений точек
-def run_fitter(result_cir_file_name='', result_csv_file_name=''):
-    Xargs = Xi_pack(Xi_long)
+# топология схемы - элементы и узлы без номиналов
+def circuit_topology(elements):
+    return tuple(e[:3] for e in elements)
 
-    for i in range(0, len(Xargs)):
-        Xargs[i] = 0.
 
-    resX = spo.minimize(fitter_subroutine,
-                        Xargs,
-                        method='Powell',
-                        callback=fitter_callback,
-                        options={'maxfev': MAXFEV, 'xtol': VALUES_TOLERANCE})
+# проверить границы номиналов емкости,
+# установить граничные значения, если выходит за пределы
+def C_to_norm(C):
+    if C < NONE_C:
+        return NONE_C
+    if C > HUGE_C:
+        return HUGE_C
+    return C
 
-    if (not result_csv_file_name == ''):
-        spice.SaveFile(analysis, result_csv_file_name)
-    if (not result_cir_file_name == ''):
-        generate_circuitFile_by_values(resX.x)
 
-    return True
+def phase_to_norm(phase):
+    pass
 
 
 # элементарная схема ###
@@ -612,246 +306,1359 @@ def Sch_init():
     return sch
 
 
-def Sch_get_Xi(sch):
-    xi = []
-    for k in sch:
-        if (k == 'C1') or (k == 'C2') or (k == 'C3'):
-            xi += [C_to_R(sch[k])]
-        else:
-            xi += [sch[k]]
-
-    return xi
-
-
-def Sch_load_from_Xi(sch, Xi):
-    j = 0
-    for k in sch:
-        if (k == 'C1') or (k == 'C2') or (k == 'C3'):
-            sch[k] = R_to_C(Xi[j])
-        else:
-            sch[k] = Xi[j]
-        j += 1
-
-
 CODE2_COUNT = 4
 
 
-# ses - сессия варьирования, которую необходимо проинициализировать
-# swcode - числовой код,от 0 до 255 включительно, задает положения переключателей
-# code2 - дополнительный код, для каждого варианта swcode передавать code2=0,1,2, ...
-# до тех пор, пока функция не вернет False
-def Session_init_by_approximation(ses, swcode, code2, title=''):
-    sch = ses['start_sch']
-    res = Z123_approximation(sch, swcode, code2, title)
-    Session_set_switchers(ses, swcode)
-    Session_run1(ses)
-
-    return res  # функция больше не вызывается
-
-
-#############################################################################
-# ФУНКЦИИ НУЛЕВОГО ПОДБОРА (ПРИСТРЕЛКА) ####################################
-#############################################################################
-
-# полное напряжение цепи - до резистора Rcs.
-target_fullVoltage = None
-# ток цепи, с коррекцией смещения нуля
-corrected_VCurrent = None
-
-
-# ток через нашу упрощенную цепь
-def I_from_VR1R2R3(V, R1, R2, R3):
-    I_ = V/(INIT_Rcs+R2)
-    R1 = np.abs(R1)
-    R2 = np.abs(R2)
-    R3 = np.abs(R3)
-    V2 = R2*I_
-
-    # диод VD1 открыт
-    if V2 >= DIODE_VOLTAGE:
-        up_part = V*(R1+R2)-R2*DIODE_VOLTAGE
-        down_part = R1*R2+R1*INIT_Rcs+R2*INIT_Rcs
-        Id = up_part/down_part
-        return Id
-
-    # диод VD3 открыт
-    if V2 <= -DIODE_VOLTAGE:
-        up_part = V*(R3+R2)+R2*DIODE_VOLTAGE
-        down_part = R3*R2+R3*INIT_Rcs+R2*INIT_Rcs
-        Id = up_part/down_part
-        return Id
-
-    # случай, когда диоды VD1 и VD3 закрыты - просто закон ома
-    return I_
-
-
-# сопротивление из известных значений
-def R1_from_R2VI(R2, V, I_):
-    I2 = V/(INIT_Rcs+R2)
-    # диод открыт
-    if (I2*R2) < (DIODE_VOLTAGE-SMALL_VOLTAGE):
-        print('R1_from_R2VI() Error: DIODE VD1 CLOSED!!')
-        raise RuntimeError("R1_from_R2VI() Error: DIODE VD1 CLOSED!!") from None
-
-    up_part = R2*(V - I_*INIT_Rcs - DIODE_VOLTAGE)
-    down_part = I_*(R2+INIT_Rcs)-V
-    return up_part/down_part
-
-
-# сопротивление из известных значений
-def R3_from_R2VI(R2, V, I_):
-    I2 = V/(INIT_Rcs+R2)
-    # диод открыт
-    if (I2*R2) > -(DIODE_VOLTAGE-SMALL_VOLTAGE):
-        raise RuntimeError("R3_from_R2VI() Error: DIODE VD3 CLOSED!!") from None
-
-    up_part = R2*(V-I_*INIT_Rcs+DIODE_VOLTAGE)
-    down_part = I_*(R2+INIT_Rcs)-V
-    return up_part/down_part
-
-
-# измерить непосредственно r2
-def measure_r2():
-    v_r2 = target_input_dummy
-
-    r_summ = 0.
-    r_count = 0
-
-    for i in range(len(v_r2)):
-        if (np.abs(v_r2[i]) > SMALL_VOLTAGE) and (np.abs(v_r2[i]) < DIODE_VOLTAGE):
-            r_i = V_div_I(v_r2[i], corrected_VCurrent[i])
-            if (r_i >= HUGE_R):
-                continue
-            r_summ += np.abs(r_i)
-            r_count += 1
-    try:
-        R = r_summ/r_count
-    except ZeroDivisionError:
-        R = HUGE_R
-    return R
-
-
-# измерить непосредственно r1
-def measure_r1_by_R2(R2):
-    i = np.argmax(target_fullVoltage)
-    try:
-        r = R1_from_R2VI(R2, target_fullVoltage[i], corrected_VCurrent[i])
-    except Exception:
-        r = NULL_R
-
-    return r
-
-
-# измерить непосредственно r3
-def measure_r3_by_R2(R2):
-    i = np.argmin(target_fullVoltage)
-    try:
-        r = R3_from_R2VI(R2, target_fullVoltage[i], corrected_VCurrent[i])
-    except Exception:
-        r = NULL_R
-
-    return r
-
+def Session_create(start_sch):
+    s = {}
+    s['start_sch'] = start_sch
+    return s
 
-def get_r_high():
-    i = np.argmax(target_fullVoltage)
-    r = V_div_I(target_fullVoltage[i], corrected_VCurrent[i])
-    return r
 
+# проверить, имеет ли смысл такая установка переключателей в схеме
+def is_valid_switchers(swcode):
+    if swcode & (1+2+3):  # все ветви заглушены
+        return False
 
-def get_r_low():
-    i = np.argmin(target_fullVoltage)
-    r = V_div_I(target_fullVoltage[i], corrected_VCurrent[i])
-    return r
+    # все разыгрывание по заглушенной первой ветке
+    if (swcode == 1) or (swcode == 1+8) or (swcode == 1+16) or (swcode == 1+8+16):
+        return False
 
+    # все разыгрывание по заглушенной второй ветке
+    if (swcode == 2) or (swcode == 2+128):
+        return False
 
-def get_r_hight_sub_diode():
-    i = np.argmax(target_fullVoltage)
-    r = V_div_I(target_fullVoltage[i]-DIODE_VOLTAGE, corrected_VCurrent[i])
-    return r
+    # все разыгрывание по заглушенной третьей ветке
+    if (swcode == 3) or (swcode == 3+32) or (swcode == 3+64) or (swcode == 3+32+64):
+        return False
 
+    return True
 
-def get_r_low_sub_diode():
-    i = np.argmin(target_fullVoltage)
-    r = V_div_I(target_fullVoltage[i]+DIODE_VOLTAGE, corrected_VCurrent[i])
-    return r
 
+# есть ли в схеме с кодом переключателей swcode диоды: ветвь 1 или 3 включена,
+# и ее диод не закорочен
+def switchers_diodes(swcode):
+    return (not swcode & (1+16)) or (not swcode & (4+64))
+
+
+# канонический код переключателей. У отключенной ветви (R = HUGE_R) биты ее
+# C и D не меняют схему, поэтому они устанавливаются: C и D закорочены и не
+# попадают в число подбираемых номиналов. Коды с одинаковым каноническим
+# кодом дают одну и ту же схему
+def canonical_switchers(swcode):
+    if swcode & 1:  # ветка 1 отключена
+        swcode |= 8+16
+    if swcode & 2:  # ветка 2 отключена
+        swcode |= 128
+    if swcode & 4:  # ветка 3 отключена
+        swcode |= 32+64
+    return swcode
+
+
+# список кодов переключателей для перебора, по одному на каждую различную
+# схему (канонический код, если он сам допустим), и словарь пропущенных
+# кодов {код: код, дающий ту же схему}
+# ветви схемы: бит отключения ветви, биты перемычек C и D (0 - диода в ветви нет),
+# имена R, C и перемычек C и D
+SWITCHER_BRANCHES = [(1, 8, 16, 'R1', 'C1', '_R_C1', '_R_D1'),
+                     (2, 128, 0, 'R2', 'C2', '_R_C2', None),
+                     (4, 32, 64, 'R3', 'C3', '_R_C3', '_R_D3')]
+
+# переключатели схем без конденсаторов
+CAPACITORS_SHORTED = 8+32+128
+
+
+# канонический код переключателей схемы sch: ветвь с R >= BIG_R отключена,
+# C и D с перемычкой меньше BIG_R закорочены
+def switchers_by_sch(sch):
+    swcode = 0
+    for off_bit, c_bit, d_bit, r, c, r_c, r_d in SWITCHER_BRANCHES:
+        if sch[r] >= BIG_R:
+            swcode |= off_bit
+        if sch[r_c] < BIG_R:
+            swcode |= c_bit
+        if d_bit and (sch[r_d] < BIG_R):
+            swcode |= d_bit
+    return canonical_switchers(swcode)
+
+
+# коды переключателей для подбора на более высокой частоте по схеме swcode,
+# найденной на низкой: включенные ветви не меняются, каждая отключенная ветвь
+# остается отключенной или включается с конденсатором, с диодом или без
+def reopened_switchers(swcode):
+    variants = [swcode]
+    for off_bit, c_bit, d_bit, *names in SWITCHER_BRANCHES:
+        if not swcode & off_bit:
+            continue
+        opened = []
+        for v in variants:
+            v &= ~(off_bit | c_bit | d_bit)
+            opened += [v, v | d_bit] if d_bit else [v]
+        variants += opened
+    return sorted(set(canonical_switchers(v) for v in variants if (v & 7) != 7))
 
-# при вычислений запоминает лучший результат по совпадению
-# кривых.
-min_r123_misfit = None
-min_r123_x = None
 
+def switchers_list():
+    codes = {}
+    skipped = {}
+    for swcode in range(255):
+        if not is_valid_switchers(swcode):
+            continue
+        canonical = canonical_switchers(swcode)
+        if canonical in codes:
+            skipped[swcode] = codes[canonical]
+            continue
+        codes[canonical] = canonical if is_valid_switchers(canonical) else swcode
+    return list(codes.values()), skipped
 
-def min_r123_subroutine(x):
-    global min_r123_misfit, min_r123_x
 
-    r1 = x[0]
-    r2 = x[1]
-    r3 = x[2]
+def open_board(path):
+    with open(path, "r") as dump_file:
+        ivc_real = json.load(dump_file)
+        return ivc_real
+    return None
 
-    E_r123 = np.zeros_like(target_fullVoltage)
 
-    for i in range(len(E_r123)):
-        I_ = I_from_VR1R2R3(target_fullVoltage[i], r1, r2, r3)
-        E_r123[i] = (I_-corrected_VCurrent[i])**2
+#############################################################################
+# Состояние решателя для одной целевой кривой. Разные контексты независимы,
+# так что несколько кривых можно подбирать одновременно в разных потоках.
+class SolverContext:
+    # настройки, копируемые из одноименных глобальных переменных модуля
+    SETTINGS = ['MISFIT_METHOD', 'INIT_F', 'INIT_V', 'INIT_Rcs', 'INIT_SNR', 'INIT_CYCLE',
+                'IVCMP_TOLERANCE', 'IVCMP_ENGINE', 'IVCMP_NUMPY_TOLERANCE',
+                'VALUES_TOLERANCE', 'MAXFEV', 'FITTER_WORKERS', 'MAX_NUM_POINTS',
+                'FITTER_SCHEDULE', 'HALVING_MIN_FEV', 'HALVING_KEEP', 'FITTER_METHOD', 'BATCH_WORKERS',
+                'circuit_SessionFileName', 'CIRCUIT_IN_MEMORY', 'CIRCUIT_COMPILED', 'SHOW_PLOTS', 'SIM_CACHE',
+                'STEADY_STATE_TOLERANCE', 'LINEAR_PHASOR', 'SIMULATOR', 'SPICE_BATCH_SIZE', 'MULTI_FIDELITY',
+                'COARSE_POINTS', 'COARSE_CYCLE', 'COARSE_RELTOL', 'COARSE_MARGIN', 'COARSE_FEV_SHARE',
+                'TRIVIAL_CLASSIFIER', 'TRIVIAL_LINEAR_TOLERANCE', 'RESISTIVE_LSQ', 'HALFWAVE_SPLIT',
+                'HALFWAVE_FEV_SHARE', 'HALFWAVE_MIN_FEV', 'DE_POPULATION', 'DE_F', 'DE_CR', 'DE_SPAN',
+                'DE_SEED', 'LM_STEP', 'Z123_GRID_POINTS', 'Z123_GRID_DECADES']
+
+    def __init__(self, **settings):
+        for name in SolverContext.SETTINGS:
+            setattr(self, name, globals()[name])
+        for name, value in settings.items():
+            if name not in SolverContext.SETTINGS:
+                raise TypeError("unknown setting '{}'".format(name))
+            setattr(self, name, value)
+
+        self.min_ivc = 1
+
+        # результат последнего моделирования в PySpice
+        self.analysis = None
+
+        # целевая кривая с током. Та, которую мы подбираем
+        self.target_VCurrent = None
+        # измеренное прибором напряжение в точке после резистора Rcs
+        self.target_input_dummy = None
+
+        self.target_fileName = ''
+
+        # целевая кривая с током для сравнения в библиотеке ivcmp
+        self.target_IVCurve = None
+        # сопряженный спектр полного напряжения цели для метода 'type_ps'
+        self.target_fullV_spectrum = None
+        # пороги шума тока и напряжения для ivcmp, см. ivcmp.SetMinVC()
+        self.min_var_v = None
+        self.min_var_c = None
+
+        # список значений для файла шаблона схемы. Число элементов - не меньше, чем
+        # знаков {} в файле шаблона схемы
+        self.Xi_long = np.array([0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0.])
+
+        # Маска оптимизируемых параметров - список булевого типа, например -
+        # Xi_long = [a, b, c, d]
+        # Xi_mask = [False,True,False,True] -> X_short = [b,d]
+        self.Xi_mask = [False, False, False, False, False, False, False, False, False, False, False]
+
+        self.input_data = None
+        # схема текущей сессии подбора, загруженная в ngspice один раз
+        self.compiled_circuit = None
+        # последний анализ в форме, пригодной для сравнения в ivcmp
+        self.iv_curve = None
+
+        # вектор, обеспечивающий минимум оптимизируемой функции
+        self.Xi_result = np.array([0., 0., 0., 0., 0., 0., 0., 0., 0., 0., 0.])
+        # текущий найденный минимум оптимизируемой функции
+        self.misfit_result = 0.
+        # результат сравнения найденного минимума по функцией CompareIvc()
+        self.ivcmp_result = 0.
+
+        # процессы для вычисления поколений точек, см. BATCH_WORKERS
+        self.batch_pool = None
+
+        # моделировать грубо (см. MULTI_FIDELITY)
+        self.coarse = False
+        # число первых вычислений подбора, которые считаются грубо
+        self.coarse_fev = 0
+        # лучший грубый misfit текущего подбора
+        self.coarse_best = None
+        # подбор по полуволне: 1 - положительной, -1 - отрицательной, None - по всей кривой
+        self.halfwave = None
+        # схема, найденная на более низкой частоте. Номиналы ее включенных ветвей
+        # не подбираются, см. solve_multifrequency
+        self.frozen_sch = None
+
+        # счетчик числа вызовов функции оптимизатором
+        self.FitterCount = 0
+        self.BestMisfitCount = 0
+        self.FITTER_SUCCESS = False
+
+        # полное напряжение цепи - до резистора Rcs.
+        self.target_fullVoltage = None
+        # ток цепи, с коррекцией смещения нуля
+        self.corrected_VCurrent = None
+
+        # при вычислений запоминает лучший результат по совпадению
+        # кривых.
+        self.min_r123_misfit = None
+        self.min_r123_x = None
+
+        # инициализация, исходя из того Rcs может быть
+        # десятки килоОм
+        self.Z123_sch = None
+
+    def settings(self):
+        return {name: getattr(self, name) for name in SolverContext.SETTINGS}
+
+    # ФУНКЦИИ ДЛЯ ШАБЛОНА, ЦЕЛЕВОЙ МОДЕЛИ И МАСКИ ПАРАМЕТРОВ ##################
+    # Подбираемые параметры x_short - логарифмы (по основанию 10) отношения
+    # номинала к начальному номиналу из Xi_long, с ограничением по Xi_bounds.
+    # Нулевой вектор соответствует Xi_long
+    def Xi_unroll(self, x_short):
+        XL = np.array(self.Xi_long, dtype=float)
+        low, high = self.Xi_log_bounds()
+
+        j = 0
+        for i in range(0, len(self.Xi_mask)):
+            if self.Xi_mask[i]:
+                XL[i] = self.Xi_nominal(i)*10**np.clip(x_short[j], low[j], high[j])
+                j += 1
+
+        return XL
+
+    # допустимые пределы номинала элемента с индексом i в Xi
+    def Xi_bounds(self, i):
+        if i in (1, 5, 8):  # емкости, в виде реактивного сопротивления
+            return self.C_to_R(HUGE_C), self.C_to_R(NONE_C)
+        if i in (0, 4, 7):  # R1, R2, R3
+            return R_MIN, HUGE_R
+        return NULL_R, HUGE_R
+
+    # начальный номинал элемента i, приведенный в допустимые пределы
+    def Xi_nominal(self, i):
+        low, high = self.Xi_bounds(i)
+        return np.clip(np.abs(self.Xi_long[i]), low, high)
+
+    # пределы подбираемых параметров, в декадах относительно начальных номиналов
+    def Xi_log_bounds(self):
+        low = []
+        high = []
+        for i in range(0, len(self.Xi_mask)):
+            if self.Xi_mask[i]:
+                x0 = self.Xi_nominal(i)
+                bounds = self.Xi_bounds(i)
+                low += [np.log10(bounds[0]/x0)]
+                high += [np.log10(bounds[1]/x0)]
+        return np.array(low), np.array(high)
+
+    def Xi_pack(self, Xi_):
+        xi = []
+
+        for i in range(0, len(self.Xi_mask)):
+            if self.Xi_mask[i]:
+                xi += [Xi_[i]]
+
+        return xi
+
+    # установить все известные номиналы
+    def set_circuit_nominals(self, nominals):
+        self.Xi_long = nominals.copy()
+
+    def reset_Xi_variable(self):
+        for i in range(len(self.Xi_mask)):
+            self.Xi_mask[i] = False
+
+    def set_Xi_variable(self, vlist):
+        Xi_mask = self.Xi_mask
+        for v in vlist:
+            if v == 'R1':
+                Xi_mask[0] = True
+            if v == 'C1':
+                Xi_mask[1] = True
+            if v == '_R_C1':
+                Xi_mask[2] = True
+            if v == '_R_D1':
+                Xi_mask[3] = True
+
+            if v == 'R2':
+                Xi_mask[4] = True
+            if v == 'C2':
+                Xi_mask[5] = True
+            if v == '_R_C2':
+                Xi_mask[6] = True
+
+            if v == 'R3':
+                Xi_mask[7] = True
+            if v == 'C3':
+                Xi_mask[8] = True
+            if v == '_R_C3':
+                Xi_mask[9] = True
+            if v == '_R_D3':
+                Xi_mask[10] = True
+
+    # инициализировать целевую модель, промоделировав файл схемы
+    def init_target_by_circuitFile(self, fileName=circuit_SessionFileName):
+        self.Z123_sch = None
+
+        var1 = self.circuit_SessionFileName
+        self.circuit_SessionFileName = fileName
+        self.process_circuitFile()
+        self.circuit_SessionFileName = var1
+        if self.analysis is not None:
+            self.analysis = self.add_noise(self.analysis)
+        self.init_target_by_analysis()
+
+    # инициализировать целевую модель результатом последнего моделирования
+    def init_target_by_analysis(self):
+        MAX_NUM_POINTS = self.MAX_NUM_POINTS
+        analysis = self.analysis
+        self.target_VCurrent = analysis.VCurrent
+        self.target_input_dummy = analysis.input_dummy
+        self.target_fullV_spectrum = None
+
+        iv_curve = ivcmp.IvCurve(analysis.input_dummy[:MAX_NUM_POINTS-1], analysis.VCurrent[:MAX_NUM_POINTS-1])
+
+        min_var_c = 0.01 * np.max(iv_curve.currents[:MAX_NUM_POINTS-1])  # value of noise for current
+        min_var_v = 0.01 * np.max(iv_curve.voltages[:MAX_NUM_POINTS-1])  # value of noise for voltage
+        # if (abs(min_var_c) < INIT_V/INIT_Rcs*0.03):
+        #    min_var_c = sign(min_var_c)*INIT_V/INIT_Rcs*0.03
+        # Правильные значения фильтров для корректной работы
+        self.min_var_v = min_var_v
+        self.min_var_c = min_var_c
+
+        self.target_IVCurve = iv_curve
+
+    # инициализировать целевую модель данными из json файла, установить число точек на кривой MAX_NUM_POINTS
+    # определенными из файла
+    def init_target_from_jsnFile(self, fileName, N):
+        self.target_fileName = fileName
+
+        ivc_real = open_board(fileName)
+        if ivc_real is None:
+            print('open_board() failed')
+            return
+
+        print('record number = '+str(N))
+        target_voltages = ivc_real["elements"][0]["pins"][N]["iv_curves"][0]["voltages"]
+        target_currents = ivc_real["elements"][0]["pins"][N]["iv_curves"][0]["currents"]
+
+        # частота, Гц
+        initF = ivc_real["elements"][0]["pins"][N]["iv_curves"][0]["measurement_settings"]["probe_signal_frequency"]
+        print('INIT_F = '+str(initF))
+        # амплитудное напряжение, Вольт, может изменится при загрузке внешнего файла данных
+        initV = ivc_real["elements"][0]["pins"][N]["iv_curves"][0]["measurement_settings"]["max_voltage"]
+        print('INIT_V = '+str(initV))
+        # токоограничивающий резистор, Ом
+        initRcs = ivc_real["elements"][0]["pins"][N]["iv_curves"][0]["measurement_settings"]["internal_resistance"]
+        print('INIT_Rcs = '+str(initRcs))
+        return initF, initV, initRcs, target_voltages, target_currents
+
+    # инициализировать целевую модель кривой curve из файла платы (элемент списка iv_curves)
+    def init_target_by_curve(self, curve):
+        ms = curve['measurement_settings']
+        self.init_target_Data(curve['voltages'], curve['currents'], initF=ms['probe_signal_frequency'],
+                              initV=ms['max_voltage'], initRcs=ms['internal_resistance'])
+
+    def init_target_Data(self,
+                         target_voltages,
+                         target_currents,
+                         initF=1e4,
+                         initV=5,
+                         initRcs=1e2,
+                         initSNR=120,
+                         cycle=10,
+                         ivcmpTolerance=6e-2):
+        self.target_input_dummy = target_voltages
+        self.target_VCurrent = target_currents
+        self.target_fullV_spectrum = None
+        self.INIT_F = initF
+        self.INIT_V = initV
+        self.INIT_Rcs = initRcs
+        MAX_NUM_POINTS = len(self.target_input_dummy)
+        self.MAX_NUM_POINTS = MAX_NUM_POINTS
+        print('MAX_NUM_POINTS = '+str(MAX_NUM_POINTS))
+        # параметры измерения изменились
+        self.input_data = None
+        self.Z123_sch = None
+
+        iv_curve1 = ivcmp.IvCurve(target_voltages[:MAX_NUM_POINTS-1], target_currents[:MAX_NUM_POINTS-1])
+
+        min_var_c = 0.01 * np.max(iv_curve1.currents[:MAX_NUM_POINTS-1])  # value of noise for current
+        min_var_v = 0.01 * np.max(iv_curve1.voltages[:MAX_NUM_POINTS-1])  # value of noise for voltage
+
+        # Правильные значения фильтров для корректной работы
+        self.min_var_v = min_var_v
+        self.min_var_c = min_var_c
+
+        self.target_IVCurve = iv_curve1
+        return
 
-    Result = math.fsum(E_r123)
-    if (min_r123_misfit is None) or (Result < min_r123_misfit):
-        min_r123_x = [r1, r2, r3]
-        min_r123_misfit = Result
+    def Xi_to_RC(self, Xi):
+        RC = Xi.copy()
+
+        RC[0] = np.abs(Xi[0])
+        RC[1] = np.abs(self.R_to_C(Xi[1]))  # C1
+        RC[2] = np.abs(Xi[2])
+        RC[3] = np.abs(Xi[3])
+
+        RC[4] = np.abs(Xi[4])
+        RC[5] = np.abs(self.R_to_C(Xi[5]))  # C2
+        RC[6] = np.abs(Xi[6])
+
+        RC[7] = np.abs(Xi[7])
+        RC[8] = np.abs(self.R_to_C(Xi[8]))  # C3
+        RC[9] = np.abs(Xi[9])
+        RC[10] = np.abs(Xi[10])
+        return RC
+
+    # список элементов схемы для значений варьирования Xi_values.
+    # Элемент - (имя, узел+, узел-, номинал), для диода вместо номинала имя модели.
+    # Ветви с сопротивлением больше BIG_R в схему не попадают.
+    def circuit_elements_by_values(self, Xi_values):
+        rc_values = self.Xi_to_RC(Xi_values)
+        elements = []
+        # * Цепь 1
+        if rc_values[0] < BIG_R:  # цепь R1 присутствует
+            if rc_values[2] >= BIG_R:  # C1 присутствует
+                elements += [('R1', '_net1', 'input', rc_values[0])]
+                elements += [('C1', '_net0', '_net1', rc_values[1])]
+            else:  # С1 нет
+                elements += [('R1', '_net0', 'input', rc_values[0])]
 
-    return Result
+            if rc_values[3] >= BIG_R:  # D1 присутствует
+                elements += [('D1', '_net0', '0', DIODE_MODEL_NAME)]
+            else:  # вместо D1 перемычка
+                elements += [('R_D1', '0', '_net0', rc_values[3])]
 
+        # * Цепь 2
+        if rc_values[4] < BIG_R:
+            if rc_values[6] >= BIG_R:  # C2 присутствует
+                elements += [('R2', '_net4', 'input', rc_values[4])]
+                elements += [('C2', '0', '_net4', rc_values[5])]
+            else:  # вместо С2 перемычка, R2 сразу на землю
+                elements += [('R2', '0', 'input', rc_values[4])]
 
-# измерить смещение нуля в пределах напряжений, где диоды закрыты
-def measure_zero_drift():
-    z_value = 0.
-    z_count = 0
-    for i in range(len(target_VCurrent)):
-        if (np.abs(target_input_dummy[i]) < (DIODE_VOLTAGE)):
-            z_value += target_VCurrent[i]
-            z_count += 1
-    try:
-        z_drift = z_value/z_count
-    except ZeroDivisionError:
-        z_drift = 0.
-    print('z_drift='+str(z_drift))
-    return z_drift
+        # * Цепь 3
+        if rc_values[7] < BIG_R:
+            if rc_values[9] >= BIG_R:  # C3 присутствует
+                elements += [('R3', '_net3', 'input', rc_values[7])]
+                elements += [('C3', '_net2', '_net3', rc_values[8])]
+            else:  # С3 нет
+                elements += [('R3', '_net2', 'input', rc_values[7])]
 
+            if rc_values[10] >= BIG_R:  # D3 присутствует
+                elements += [('D3', '0', '_net2', DIODE_MODEL_NAME)]
+            else:  # вместо D3 перемычка
+                elements += [('R_D3', '0', '_net2', rc_values[10])]
 
-# проверить границы номиналов емкости,
-# установить граничные значения, если выходит за пределы
-def C_to_norm(C):
-    if C < NONE_C:
-        return NONE_C
-    if C > HUGE_C:
-        return HUGE_C
-    return C
+        return elements
 
+    # текст файла схемы для значений варьирования Xi_values
+    def generate_netlist_by_values(self, Xi_values):
+        elements = self.circuit_elements_by_values(Xi_values)
+        lines = ['* cir file corresponding to the equivalent circuit.']
+        for name, node_plus, node_minus, value in elements:
+            if name[0] == 'D':
+                lines += ['{} {} {} {} AREA=1.0 Temp=26.85'.format(name, node_plus, node_minus, value)]
+            else:
+                lines += ['{} {} {} {:e}'.format(name, node_plus, node_minus, value)]
 
-def phase_to_norm(phase):
-    pass
+        # есть диоды, добавляем модель
+        if has_diodes(elements):
+            params = ' '.join('{}={}'.format(k, v) for k, v in DIODE_MODEL.items())
+            lines += ['.MODEL {} D ({} )'.format(DIODE_MODEL_NAME, params)]
+
+        return '\n'.join(lines)+'\n.END'
+
+    # в наборе строк шаблона схемы сделать замену {} на значения
+    # варьирования Xi_values, сохранить заданным с именем
+    def generate_circuitFile_by_values(self, Xi_values):
+        with open(self.circuit_SessionFileName, 'w') as newF:
+            newF.write(self.generate_netlist_by_values(Xi_values))
+
+    # построить схему PySpice в памяти, без файла circuit_SessionFileName
+    def generate_circuit_by_values(self, Xi_values):
+        elements = self.circuit_elements_by_values(Xi_values)
+        models = None
+        if has_diodes(elements):
+            models = {DIODE_MODEL_NAME: ('D', DIODE_MODEL)}
+        return spice.CreateCircuit(elements, models)
+
+    # входные данные моделирования. Схемы моделируются без шума, шум INIT_SNR
+    # добавляется к каждому результату отдельно (add_noise), уже после кэша
+    def get_input_data(self):
+        if self.input_data is None:
+            self.input_data = spice.Init_Data(self.INIT_F, self.INIT_V, self.INIT_Rcs, None)
+        return self.input_data
+
+    # результат моделирования с шумом измерения INIT_SNR, свой на каждом вычислении
+    def add_noise(self, analysis):
+        return spice.CVC_Data(spice.AddNoise(analysis.input_dummy, self.INIT_SNR),
+                              spice.AddNoise(analysis.VCurrent, self.INIT_SNR))
+
+    # число точек на период, число периодов и точность ngspice для текущей точности моделирования
+    def sim_points(self):
+        return min(self.COARSE_POINTS, self.MAX_NUM_POINTS) if self.coarse else self.MAX_NUM_POINTS
+
+    def sim_cycle(self):
+        return min(self.COARSE_CYCLE, self.INIT_CYCLE) if self.coarse else self.INIT_CYCLE
+
+    def sim_reltol(self):
+        return self.COARSE_RELTOL if self.coarse else None
+
+    # результат грубого моделирования перевести на MAX_NUM_POINTS точек
+    def full_points(self, analysis):
+        if self.coarse:
+            return spice.ResampleCVC(analysis, self.MAX_NUM_POINTS)
+        return analysis
+
+    # промоделировать схему
+    def process_circuit(self, circuit):
+        try:
+            analysis = spice.CreateCVC1(circuit, self.get_input_data(), self.sim_points(), "input",
+                                        self.sim_cycle(), self.sim_reltol(), self.STEADY_STATE_TOLERANCE)
+            self.analysis = self.full_points(analysis)
+        except Exception:
+            print('spice.CreateCVC1() failed.')
+
+    # промоделировать файл схемы
+    def process_circuitFile(self):
+        try:
+            circuit = spice.LoadFile(self.circuit_SessionFileName)
+        except Exception:
+            print('spice.LoadFile() failed.')
+            return
+
+        self.process_circuit(circuit)
+
+    def release_compiled_circuit(self):
+        if self.compiled_circuit is not None:
+            self.compiled_circuit.release()
+        self.compiled_circuit = None
+
+    # промоделировать схему, меняя в ngspice только номиналы R и C.
+    # Схема загружается заново только при смене топологии, например когда
+    # сопротивление ветви при подборе перешло через BIG_R, или точности моделирования
+    def process_compiled_circuit(self, Xi_values):
+        elements = self.circuit_elements_by_values(Xi_values)
+        topology = (circuit_topology(elements), self.coarse)
+        values = {}
+        for name, node_plus, node_minus, value in elements:
+            if name[0] in ('R', 'C'):
+                values[name] = value
+
+        try:
+            if (self.compiled_circuit is None) or (self.compiled_circuit.topology != topology):
+                self.release_compiled_circuit()
+                circuit = self.generate_circuit_by_values(Xi_values)
+                self.compiled_circuit = spice.CompiledCircuit(circuit, self.get_input_data(), self.sim_points(),
+                                                              "input", self.sim_cycle(), self.sim_reltol())
+                self.compiled_circuit.topology = topology
+            self.analysis = self.full_points(self.compiled_circuit.run(values))
+        except Exception:
+            print('spice.CompiledCircuit.run() failed.')
+
+    # ключ кэша моделирования: текст схемы (номиналы в нем уже округлены форматом {:e},
+    # отключенные ветви выброшены) и входные данные
+    def simulation_key(self, Xi_values):
+        d = self.get_input_data()
+        return '{}\nF={!r} V={!r} Rcs={!r} N={} cycle={} steady={!r} phasor={} simulator={}{}'.format(
+            self.generate_netlist_by_values(Xi_values), d.F, d.V, d.Rcs, self.MAX_NUM_POINTS, self.INIT_CYCLE,
+            self.STEADY_STATE_TOLERANCE, self.LINEAR_PHASOR, self.SIMULATOR,
+            ' coarse={} {} {!r}'.format(self.sim_points(), self.sim_cycle(), self.sim_reltol()) if self.coarse else '')
+
+    # промоделировать схему для значений варьирования Xi_values. В кэше хранится
+    # результат без шума, шум добавляется после
+    def process_circuit_by_values(self, Xi_values):
+        key = None if self.SIM_CACHE is None else self.simulation_key(Xi_values)
+        analysis = None if key is None else self.SIM_CACHE.get(key)
+        if analysis is None:
+            last_analysis = self.analysis
+            self.simulate_by_values(Xi_values)
+            if self.analysis is last_analysis:  # моделирование не удалось
+                return
+            analysis = self.analysis
+            if key is not None:
+                self.SIM_CACHE.put(key, analysis)
+        self.analysis = self.add_noise(analysis)
+
+    def simulate_by_values(self, Xi_values):
+        # схема без диодов линейна, ее установившийся режим считается без ngspice
+        if self.LINEAR_PHASOR:
+            elements = self.circuit_elements_by_values(Xi_values)
+            if not has_diodes(elements):
+                try:
+                    self.analysis = spice.PhasorCVC(elements, self.get_input_data(), self.MAX_NUM_POINTS)
+                    return
+                except (ValueError, np.linalg.LinAlgError):
+                    print('spice.PhasorCVC() failed.')
+
+        # одиночная схема всегда считается в ngspice, встроенный решатель
+        # выгоден только для пакетов (см. SIMULATOR). Установившийся режим
+        # считается только в spice.CreateCVC1
+        if self.CIRCUIT_COMPILED and (self.STEADY_STATE_TOLERANCE is None):
+            self.process_compiled_circuit(Xi_values)
+        elif self.CIRCUIT_IN_MEMORY:
+            self.process_circuit(self.generate_circuit_by_values(Xi_values))
+        else:
+            self.generate_circuitFile_by_values(Xi_values)
+            self.process_circuitFile()
+
+    # параметры ветвей схемы для spice.BranchNetworkCVC: (R, C, D) по ветвям 1, 2, 3,
+    # так же, как в circuit_elements_by_values
+    def branch_parameters(self, Xi_values):
+        rc = self.Xi_to_RC(Xi_values)
+        R = [np.inf, np.inf, np.inf]
+        C = [0., 0., 0.]
+        D = [0, 0, 0]
+        if rc[0] < BIG_R:  # цепь 1
+            R[0] = rc[0]
+            if rc[2] >= BIG_R:  # C1 присутствует
+                C[0] = rc[1]
+            if rc[3] >= BIG_R:  # D1 присутствует
+                D[0] = 1
+            else:
+                R[0] += rc[3]
+        if rc[4] < BIG_R:  # цепь 2
+            R[1] = rc[4]
+            if rc[6] >= BIG_R:  # C2 присутствует
+                C[1] = rc[5]
+        if rc[7] < BIG_R:  # цепь 3
+            R[2] = rc[7]
+            if rc[9] >= BIG_R:  # C3 присутствует
+                C[2] = rc[8]
+            if rc[10] >= BIG_R:  # D3 присутствует
+                D[2] = -1
+            else:
+                R[2] += rc[10]
+        return R, C, D
+
+    # промоделировать пакет векторов Xi встроенным решателем, список CVC_Data
+    def simulate_batch(self, Xi_list):
+        R, C, D = zip(*[self.branch_parameters(xi) for xi in Xi_list])
+        analyses = spice.BranchNetworkCVC(R, C, D, self.get_input_data(), self.sim_points(), DIODE_MODEL,
+                                          self.sim_cycle(), self.STEADY_STATE_TOLERANCE)
+        return [self.full_points(analysis) for analysis in analyses]
+
+    # промоделировать пакет векторов Xi в ngspice, по SPICE_BATCH_SIZE схем за один запуск.
+    # Схемы из кэша и линейные схемы (LINEAR_PHASOR) считаются как обычно. Список анализов с шумом
+    def simulate_spice_batch(self, Xi_list):
+        analyses = [None]*len(Xi_list)
+        pending = []
+        for i, xi in enumerate(Xi_list):
+            elements = self.circuit_elements_by_values(xi)
+            if self.LINEAR_PHASOR and not has_diodes(elements):
+                self.process_circuit_by_values(xi)
+                analyses[i] = self.analysis
+                continue
+            key = None if self.SIM_CACHE is None else self.simulation_key(xi)
+            if key is not None:
+                analyses[i] = self.SIM_CACHE.get(key)
+            if analyses[i] is None:
+                pending += [(i, key, elements)]
+            else:
+                analyses[i] = self.add_noise(analyses[i])
+
+        models = {DIODE_MODEL_NAME: ('D', DIODE_MODEL)}
+        for start in range(0, len(pending), self.SPICE_BATCH_SIZE):
+            chunk = pending[start:start+self.SPICE_BATCH_SIZE]
+            try:
+                results = spice.CreateCVCBatch([elements for i, key, elements in chunk], self.get_input_data(),
+                                               self.sim_points(), models, "input", self.sim_cycle(),
+                                               self.sim_reltol())
+            except Exception:
+                print('spice.CreateCVCBatch() failed.')
+                results = [None]*len(chunk)
+            for (i, key, elements), analysis in zip(chunk, results):
+                if analysis is None:  # пакет не посчитался, схема моделируется отдельно
+                    self.process_circuit_by_values(Xi_list[i])
+                    analyses[i] = self.analysis
+                    continue
+                analyses[i] = self.full_points(analysis)
+                if key is not None:
+                    self.SIM_CACHE.put(key, analyses[i])
+                analyses[i] = self.add_noise(analyses[i])
+        return analyses
+
+    # последний анализ перевести в форму, пригодную для сравнения в ivcmp
+    def analysis_to_IVCurve(self):
+        MAX_NUM_POINTS = self.MAX_NUM_POINTS
+        analysis = self.analysis
+        # массивы анализа передаются в ivcmp без копирования
+        self.iv_curve = ivcmp.IvCurve(analysis.input_dummy[:MAX_NUM_POINTS-1], analysis.VCurrent[:MAX_NUM_POINTS-1])
+        return self.iv_curve
+
+    # вывести на график результат моделирования
+    def analysis_plot(self, title='', pngName=''):
+        if not self.SHOW_PLOTS:
+            return
+
+        plt.figure(1, (20, 10))
+        plt.grid()
+
+        # целевая ВАХ
+        plt.plot(self.target_input_dummy, self.target_VCurrent, color='red')
+        # ВАХ результат подбора
+        plt.plot(self.analysis.input_dummy, self.analysis.VCurrent, color='blue')
+
+        s = ''
+        if (not title == ''):
+            s = title
+        elif not self.target_fileName == '':
+            s = self.target_fileName
+
+        s = s+', misfit=' + format(self.misfit_result, '0.5E')+', ivcmp='+format(self.ivcmp_result, '0.5E')
+
+        plt.title(s)
+
+        plt.xlabel('Напряжение [В]')
+        plt.ylabel('Сила тока [А]')
+
+        if (not pngName == ''):
+            plt.savefig(pngName)
+        plt.xlim([-self.INIT_V, self.INIT_V])
+        plt.ylim([-self.INIT_V/self.INIT_Rcs, self.INIT_V/self.INIT_Rcs])
+        plt.show()
+
+    # ФУНКЦИИ СРАВНЕНИЯ ВАХ ###################################################
+    def C_to_R(self, c):
+        r = 1/(2.*np.pi*self.INIT_F*c)
+        return r
+
+    def R_to_C(self, r):
+        c = 1/(2.*np.pi*self.INIT_F*r)
+        if math.isinf(c):
+            c = 1e20
+        return c
+
+    # сравнить кривые в ivcmp с порогами шума этого контекста
+    def compare_IVCurve(self, first_iv_curve, second_iv_curve):
+        return ivcmp.CompareIvc(first_iv_curve, second_iv_curve, self.min_var_v, self.min_var_c, self.IVCMP_ENGINE)
+
+    # сравнить целевую кривую сразу с N кривыми, массивы напряжений и токов формы (N, MAX_NUM_POINTS)
+    def compare_IVCurves_batch(self, voltages, currents):
+        n = self.MAX_NUM_POINTS-1
+        voltages = np.atleast_2d(voltages)[:, :n]
+        currents = np.atleast_2d(currents)[:, :n]
+        return ivcmp.CompareIvcBatch(self.target_IVCurve, voltages, currents, self.min_var_v, self.min_var_c,
+                                     self.IVCMP_ENGINE)
+
+    # порог совпадения кривых для сравнения IVCMP_ENGINE
+    def ivcmp_tolerance(self):
+        return self.IVCMP_NUMPY_TOLERANCE if self.IVCMP_ENGINE == 'numpy' else self.IVCMP_TOLERANCE
+
+    def analysis_misfit_ivcmp(self):
+        step_IVCurve = self.analysis_to_IVCurve()
+        res = self.compare_IVCurve(self.target_IVCurve, step_IVCurve)
+        if self.min_ivc > res:
+            self.min_ivc = res
+        return res
 
+    # невязки токов после выравнивания фаз. Фазовый сдвиг в отсчетах -
+    # максимум круговой взаимной корреляции полных напряжений возбуждения,
+    # считается через БПФ. Спектр целевого напряжения считается один раз.
+    def analysis_residuals_type_ps(self):
+        analysis = self.analysis
+        if self.target_fullV_spectrum is None:
+            # полное напряжение цепи - до резистора Rcs
+            fullV_target = np.asarray(self.target_input_dummy)+self.INIT_Rcs*np.asarray(self.target_VCurrent)
+            self.target_fullV_spectrum = np.conj(scf.rfft(fullV_target))
+
+        n = len(analysis.VCurrent)
+        fullV_A = analysis.input_dummy+self.INIT_Rcs*analysis.VCurrent
+        correlation = scf.irfft(self.target_fullV_spectrum*scf.rfft(fullV_A), n)
+        phase_shift = np.argmax(correlation)
+
+        # ток анализа, сдвинутый на phase_shift: signal_A[(i+phase_shift) % n]
+        signal_cmp = np.roll(analysis.VCurrent, -phase_shift)
+        signal_cmp -= self.target_VCurrent
+        return signal_cmp
+
+    # несовпадение токов после выравнивания фаз
+    def analysis_misfit_type_ps(self):
+        signal_cmp = self.analysis_residuals_type_ps()
+        return float(np.dot(signal_cmp, signal_cmp))
+
+    # вектор невязок последнего анализа для метода наименьших квадратов:
+    # для 'type_ps' - токи после выравнивания фаз, для остальных методов -
+    # разность токов в каждой точке. При подборе по полуволне (halfwave) невязки
+    # точек другой полуволны целевого напряжения обнуляются
+    def analysis_residuals(self):
+        if self.MISFIT_METHOD == 'type_ps':
+            residuals = self.analysis_residuals_type_ps()
+        else:
+            residuals = self.analysis.VCurrent-self.target_VCurrent
+        if self.halfwave is not None:
+            residuals = np.where(self.halfwave*np.asarray(self.target_input_dummy) > 0, residuals, 0.)
+        return residuals
+
+    # вычислить несовпадение последнего анализа и целевой функции.
+    def analysis_misfit(self):
+        analysis = self.analysis
+        target_input_dummy = self.target_input_dummy
+        target_VCurrent = self.target_VCurrent
+        curr_t = target_VCurrent
+        curr_a = analysis.VCurrent
+        volt_t = target_input_dummy
+        volt_a = analysis.input_dummy
+
+        # подбор по полуволне - сумма квадратов невязок полуволны при любом методе
+        if self.halfwave is not None:
+            residuals = self.analysis_residuals()
+            return float(np.dot(residuals, residuals))
+
+        # метод сравнения кривых по несовпадению кривых мощности.
+        # учитывает возможное несогласование фаз сигналов
+        if self.MISFIT_METHOD == 'type_ps':
+            return self.analysis_misfit_type_ps()
+
+        if self.MISFIT_METHOD == 'power_fft':
+            r = scf.rfft(curr_t*volt_t-curr_a*volt_a)
+            return math.fsum(r)
+
+        if self.MISFIT_METHOD == 'sko':
+            r = (curr_t-curr_a)
+            r2 = np.abs(r)
+            return math.fsum(r2)
+
+        if self.MISFIT_METHOD == 'ivcmp':
+            step_IVCurve = self.analysis_to_IVCurve()
+            res = self.compare_IVCurve(self.target_IVCurve, step_IVCurve)
+            return res
+
+        ###
+        s = "unknown MISFIT_METHOD = '"+str(self.MISFIT_METHOD)+"'"
+        raise RuntimeError(s)
+
+    # ФУНКЦИИ РЕШАТЕЛЯ ########################################################
+    def calculate_misfit(self, Xi):
+        self.process_circuit_by_values(Xi)
+        misfit = self.analysis_misfit()
+        return misfit
+
+    # грубый misfit текущей точности моделирования
+    def calculate_coarse_misfit(self, Xi):
+        self.coarse = True
+        try:
+            return self.calculate_misfit(Xi)
+        finally:
+            self.coarse = False
+
+    # сколько из n следующих вычислений подбора грубые: вычисления с номерами
+    # 1..coarse_fev (см. fitter_subroutine, fitter_batch_residuals)
+    def coarse_count(self, n):
+        return min(n, max(0, self.coarse_fev-self.FitterCount))
+
+    # может ли схема с грубым значением сравнения ivcmp_value удовлетворить
+    # условию останова при точном расчете (см. COARSE_MARGIN)
+    def coarse_may_succeed(self, ivcmp_value):
+        return (ivcmp_value is not None) and (ivcmp_value <= self.ivcmp_tolerance()*(1+self.COARSE_MARGIN))
+
+    # стоит ли пересчитывать точно точку с грубым misfit (см. COARSE_MARGIN)
+    def coarse_competitive(self, misfit):
+        competitive = (self.coarse_best is None) or (misfit <= self.coarse_best*(1+self.COARSE_MARGIN))
+        if (self.coarse_best is None) or (misfit < self.coarse_best):
+            self.coarse_best = misfit
+        return competitive
+
+    # запомнить точно вычисленную точку xi, если она лучшая. ivcmp_value - значение
+    # сравнения в ivcmp, если None - считается по последнему анализу
+    def fitter_record(self, xi, misfit, ivcmp_value=None):
+        if (self.MISFIT_METHOD == 'ivcmp') and (self.halfwave is None):
+            ivcmp_value = misfit
+        first = self.FitterCount <= 1  # первый запуск
+        if first or (misfit < self.misfit_result):  # лучший случай
+            if ivcmp_value is None:
+                ivcmp_value = self.analysis_misfit_ivcmp()
+            self.BestMisfitCount = 0 if first else self.BestMisfitCount+1
+            self.Xi_result = xi.copy()
+            self.misfit_result = misfit
+            self.ivcmp_result = ivcmp_value
+
+        if (ivcmp_value is not None) and (ivcmp_value <= self.ivcmp_tolerance()):  # достигли необходимой точности
+            self.FITTER_SUCCESS = True
+
+    # функция вызывается оптимизатором. Первые coarse_fev вычислений - грубые,
+    # оптимизатор получает грубый misfit, а конкурентные точки пересчитываются точно
+    def fitter_subroutine(self, Xargs):
+        coarse = self.coarse_count(1) > 0
+        self.FitterCount += 1
+        xi = self.Xi_unroll(Xargs)
+        if not coarse:
+            misfit = self.calculate_misfit(xi)
+            self.fitter_record(xi, misfit)
+            return misfit
+
+        misfit = self.calculate_coarse_misfit(xi)
+        if self.coarse_competitive(misfit):
+            self.fitter_record(xi, self.calculate_misfit(xi))
+        return misfit
+
+    # misfit, значение сравнения ivcmp и вектор невязок последнего анализа
+    def analysis_evaluate(self):
+        misfit = self.analysis_misfit()
+        if (self.MISFIT_METHOD == 'ivcmp') and (self.halfwave is None):
+            ivcmp_value = misfit
+        else:
+            ivcmp_value = self.analysis_misfit_ivcmp()
+        return misfit, ivcmp_value, self.analysis_residuals()
+
+    # misfit, значение сравнения ivcmp и вектор невязок для вектора Xi
+    def evaluate_Xi(self, Xi):
+        self.process_circuit_by_values(Xi)
+        return self.analysis_evaluate()
+
+    # вычислить пакет векторов xis с текущей точностью моделирования: встроенным
+    # решателем одним пакетом (SIMULATOR = 'numpy'), в процессах batch_pool,
+    # пакетами схем в одном запуске ngspice (SPICE_BATCH_SIZE) или по очереди
+    def evaluate_batch(self, xis):
+        if len(xis) == 0:
+            return []
+        if self.SIMULATOR == 'numpy':
+            analyses = [self.add_noise(analysis) for analysis in self.simulate_batch(xis)]
+        elif self.batch_pool is not None:
+            return self.batch_pool.map(_worker_evaluate, [(xi, self.coarse, self.halfwave) for xi in xis])
+        elif self.SPICE_BATCH_SIZE > 1:
+            analyses = self.simulate_spice_batch(xis)
+        else:
+            analyses = []
+            for xi in xis:
+                self.process_circuit_by_values(xi)
+                analyses += [self.analysis]
+        return self.analyses_evaluate(analyses)
+
+    # пакетный вариант analysis_evaluate: все кривые сравниваются с целевой
+    # одним вызовом compare_IVCurves_batch
+    def analyses_evaluate(self, analyses):
+        ivcmp_values = self.compare_IVCurves_batch([analysis.input_dummy for analysis in analyses],
+                                                   [analysis.VCurrent for analysis in analyses])
+        self.min_ivc = min(self.min_ivc, np.min(ivcmp_values))
+
+        results = []
+        for analysis, ivcmp_value in zip(analyses, ivcmp_values):
+            self.analysis = analysis
+            if (self.MISFIT_METHOD == 'ivcmp') and (self.halfwave is None):
+                misfit = ivcmp_value
+            else:
+                misfit = self.analysis_misfit()
+            results += [(misfit, ivcmp_value, self.analysis_residuals())]
+        return results
+
+    # пакетный вариант fitter_subroutine для методов, которые вычисляют сразу
+    # поколение точек X_list. Возвращает массивы misfit и невязок точек.
+    # Грубые и точные вычисления разделяются так же, как в fitter_subroutine
+    def fitter_batch_residuals(self, X_list):
+        xis = [self.Xi_unroll(x) for x in X_list]
+        n_coarse = self.coarse_count(len(xis))
+        self.coarse = True
+        try:
+            results = self.evaluate_batch(xis[:n_coarse])
+        finally:
+            self.coarse = False
+        exact = [i for i in range(n_coarse) if self.coarse_competitive(results[i][0])]
+        exact += list(range(n_coarse, len(xis)))
+        full_results = dict(zip(exact, self.evaluate_batch([xis[i] for i in exact])))
+        results += [full_results[i] for i in range(n_coarse, len(xis))]
+
+        for i, xi in enumerate(xis):
+            self.FitterCount += 1
+            if i in full_results:
+                self.fitter_record(xi, full_results[i][0], full_results[i][1])
+
+        return np.array([r[0] for r in results]), np.array([r[2] for r in results])
+
+    def fitter_batch(self, X_list):
+        return self.fitter_batch_residuals(X_list)[0]
+
+    # как fitter_batch, и массив признаков грубо вычисленных точек
+    def fitter_batch_fidelity(self, X_list):
+        coarse = np.arange(len(X_list)) < self.coarse_count(len(X_list))
+        return self.fitter_batch(X_list), coarse
+
+    def fitter_callback(self, Xk):
+        if self.ivcmp_result <= self.ivcmp_tolerance():  # достигли необходимой точности
+            self.FITTER_SUCCESS = True
+            return True
 
-# инициализация, исходя из того Rcs может быть
-# десятки килоОм
-Z123_sch = None
+        return False
 
+    # запустить автоподбор - сравнение по сумме отклонений точек
+    # maxfev - число вычислений функции, по умолчанию MAXFEV,
+    # coarse_fev - сколько первых из них считать грубо (см. MULTI_FIDELITY)
+    def run_fitter(self, result_cir_file_name='', result_csv_file_name='', maxfev=None, coarse_fev=0):
+        if maxfev is None:
+            maxfev = self.MAXFEV
+        self.coarse_fev = coarse_fev
+        self.coarse_best = None
+        Xargs = self.Xi_pack(self.Xi_long)
+
+        for i in range(0, len(Xargs)):
+            Xargs[i] = 0.
+
+        fitter = FITTER_METHODS[self.FITTER_METHOD]
+        if len(Xargs) == 0:  # все номиналы известны (см. Session_resistive_lsq), схема только вычисляется
+            fitter = fitter_none
+        x = fitter(self, np.array(Xargs), maxfev)
+
+        if (not result_csv_file_name == ''):
+            spice.SaveFile(self.analysis, result_csv_file_name)
+        if (not result_cir_file_name == ''):
+            self.generate_circuitFile_by_values(self.Xi_unroll(x))
 
-def Z123_approximation(sch, swcode, code2, title=''):
-    global Z123_sch, target_fullVoltage, min_r123_misfit, corrected_VCurrent
+        return True
 
-    if Z123_sch is None:
-        Z123_sch = Sch_init()
+    def Sch_get_Xi(self, sch):
+        xi = []
+        for k in sch:
+            if (k == 'C1') or (k == 'C2') or (k == 'C3'):
+                xi += [self.C_to_R(sch[k])]
+            else:
+                xi += [sch[k]]
+
+        return xi
+
+    def Sch_load_from_Xi(self, sch, Xi):
+        j = 0
+        for k in sch:
+            if (k == 'C1') or (k == 'C2') or (k == 'C3'):
+                sch[k] = self.R_to_C(Xi[j])
+            else:
+                sch[k] = Xi[j]
+            j += 1
 
-        target_fullVoltage = np.copy(target_VCurrent)
-        corrected_VCurrent = np.copy(target_VCurrent)
-        for i in range(len(target_input_dummy)):
-            target_fullVoltage[i] = target_input_dummy[i]+INIT_Rcs*target_VCurrent[i]
-            corrected_VCurrent[i] = target_VCurrent[i]
-    else:
-        # копирование
+    # ses - сессия варьирования, которую необходимо проинициализировать
+    # swcode - числовой код,от 0 до 255 включительно, задает положения переключателей
+    # code2 - дополнительный код, для каждого варианта swcode передавать code2=0,1,2, ...
+    # до тех пор, пока функция не вернет False
+    # run - сразу выполнить схему сессии, иначе см. Session_run_batch
+    def Session_init_by_approximation(self, ses, swcode, code2, title='', run=True):
+        sch = ses['start_sch']
+        res = self.Z123_approximation(sch, swcode, code2, title)
+        self.Session_set_switchers(ses, swcode)
+        if self.RESISTIVE_LSQ:
+            self.Session_resistive_lsq(ses, swcode)
+        if self.frozen_sch is not None:
+            self.Session_freeze(ses)
+        if run:
+            self.Session_run_start(ses)
+
+        return res  # функция больше не вызывается
+
+    # выполнить стартовую схему сессии
+    def Session_run_start(self, ses):
+        if self.MULTI_FIDELITY:
+            # стартовые схемы отсеиваются грубо, точно пересчитываются только
+            # те, что могут удовлетворить условию останова
+            if not self.coarse_may_succeed(self.Session_run_coarse(ses)):
+                return
+        self.Session_run1(ses)
+
+    #############################################################################
+    # ФУНКЦИИ НУЛЕВОГО ПОДБОРА (ПРИСТРЕЛКА) ####################################
+    #############################################################################
+
+    # ток через нашу упрощенную цепь. Аргументы - числа или массивы numpy,
+    # результат вычисляется поэлементно с учетом правил broadcasting
+    def I_from_VR1R2R3(self, V, R1, R2, R3):
+        INIT_Rcs = self.INIT_Rcs
+        R1 = np.abs(R1)
+        R2 = np.abs(R2)
+        R3 = np.abs(R3)
+        I_ = V/(INIT_Rcs+R2)
+        V2 = R2*I_
+
+        # формулы для открытых диодов считаются для всех точек, лишние
+        # деления на ноль отбрасываются в np.where
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # диод VD1 открыт
+            up_part = V*(R1+R2)-R2*DIODE_VOLTAGE
+            down_part = R1*R2+R1*INIT_Rcs+R2*INIT_Rcs
+            I_1 = up_part/down_part
+
+            # диод VD3 открыт
+            up_part = V*(R3+R2)+R2*DIODE_VOLTAGE
+            down_part = R3*R2+R3*INIT_Rcs+R2*INIT_Rcs
+            I_3 = up_part/down_part
+
+        # когда диоды VD1 и VD3 закрыты - просто закон ома
+        return np.where(V2 >= DIODE_VOLTAGE, I_1, np.where(V2 <= -DIODE_VOLTAGE, I_3, I_))
+
+    # сопротивление из известных значений
+    def R1_from_R2VI(self, R2, V, I_):
+        INIT_Rcs = self.INIT_Rcs
+        I2 = V/(INIT_Rcs+R2)
+        # диод открыт
+        if (I2*R2) < (DIODE_VOLTAGE-SMALL_VOLTAGE):
+            print('R1_from_R2VI() Error: DIODE VD1 CLOSED!!')
+            raise RuntimeError("R1_from_R2VI() Error: DIODE VD1 CLOSED!!") from None
+
+        up_part = R2*(V - I_*INIT_Rcs - DIODE_VOLTAGE)
+        down_part = I_*(R2+INIT_Rcs)-V
+        return up_part/down_part
+
+    # сопротивление из известных значений
+    def R3_from_R2VI(self, R2, V, I_):
+        INIT_Rcs = self.INIT_Rcs
+        I2 = V/(INIT_Rcs+R2)
+        # диод открыт
+        if (I2*R2) > -(DIODE_VOLTAGE-SMALL_VOLTAGE):
+            raise RuntimeError("R3_from_R2VI() Error: DIODE VD3 CLOSED!!") from None
+
+        up_part = R2*(V-I_*INIT_Rcs+DIODE_VOLTAGE)
+        down_part = I_*(R2+INIT_Rcs)-V
+        return up_part/down_part
+
+    # измерить непосредственно r2
+    def measure_r2(self):
+        v_r2 = self.target_input_dummy
+
+        r_summ = 0.
+        r_count = 0
+
+        for i in range(len(v_r2)):
+            if (np.abs(v_r2[i]) > SMALL_VOLTAGE) and (np.abs(v_r2[i]) < DIODE_VOLTAGE):
+                r_i = V_div_I(v_r2[i], self.corrected_VCurrent[i])
+                if (r_i >= HUGE_R):
+                    continue
+                r_summ += np.abs(r_i)
+                r_count += 1
+        try:
+            R = r_summ/r_count
+        except ZeroDivisionError:
+            R = HUGE_R
+        return R
+
+    # измерить непосредственно r1
+    def measure_r1_by_R2(self, R2):
+        i = np.argmax(self.target_fullVoltage)
+        try:
+            r = self.R1_from_R2VI(R2, self.target_fullVoltage[i], self.corrected_VCurrent[i])
+        except Exception:
+            r = NULL_R
+
+        return r
+
+    # измерить непосредственно r3
+    def measure_r3_by_R2(self, R2):
+        i = np.argmin(self.target_fullVoltage)
+        try:
+            r = self.R3_from_R2VI(R2, self.target_fullVoltage[i], self.corrected_VCurrent[i])
+        except Exception:
+            r = NULL_R
+
+        return r
+
+    def get_r_high(self):
+        i = np.argmax(self.target_fullVoltage)
+        r = V_div_I(self.target_fullVoltage[i], self.corrected_VCurrent[i])
+        return r
+
+    def get_r_low(self):
+        i = np.argmin(self.target_fullVoltage)
+        r = V_div_I(self.target_fullVoltage[i], self.corrected_VCurrent[i])
+        return r
+
+    def get_r_hight_sub_diode(self):
+        i = np.argmax(self.target_fullVoltage)
+        r = V_div_I(self.target_fullVoltage[i]-DIODE_VOLTAGE, self.corrected_VCurrent[i])
+        return r
+
+    def get_r_low_sub_diode(self):
+        i = np.argmin(self.target_fullVoltage)
+        r = V_div_I(self.target_fullVoltage[i]+DIODE_VOLTAGE, self.corrected_VCurrent[i])
+        return r
+
+    # несовпадение упрощенной цепи с целевой кривой сразу для всех вариантов
+    # сопротивлений x - массива (r1, r2, r3) формы (K, 3). Запоминает лучший вариант
+    def min_r123_batch(self, x):
+        x = np.asarray(x, dtype=float).reshape(-1, 3)
+        V = self.target_fullVoltage
+        Result = np.empty(len(x))
+        # ограничиваем размер промежуточного массива (K, N)
+        chunk = max(1, 4000000//len(V))
+        for k in range(0, len(x), chunk):
+            r = x[k:k+chunk]
+            I_ = self.I_from_VR1R2R3(V, r[:, 0:1], r[:, 1:2], r[:, 2:3])
+            E_r123 = I_-self.corrected_VCurrent
+            Result[k:k+chunk] = np.einsum('ij,ij->i', E_r123, E_r123)
+
+        i = np.argmin(np.where(np.isnan(Result), np.inf, Result))
+        if (self.min_r123_misfit is None) or (Result[i] < self.min_r123_misfit):
+            self.min_r123_x = list(x[i])
+            self.min_r123_misfit = Result[i]
+
+        return Result
+
+    def min_r123_subroutine(self, x):
+        return self.min_r123_batch([x])[0]
+
+    # сетка вариантов (r1, r2, r3): для каждого сопротивления Z123_GRID_POINTS значений,
+    # равномерно по логарифму в пределах Z123_GRID_DECADES декад вокруг оценки, и HUGE_R
+    def r123_grid(self, r1, r2, r3):
+        if self.Z123_GRID_POINTS <= 0:
+            return np.empty((0, 3))
+        factors = np.logspace(-self.Z123_GRID_DECADES, self.Z123_GRID_DECADES, self.Z123_GRID_POINTS)
+        axes = [np.append(np.clip(np.abs(r)*factors, NULL_R, HUGE_R), HUGE_R) for r in (r1, r2, r3)]
+        return np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+
+    # измерить смещение нуля в пределах напряжений, где диоды закрыты
+    def measure_zero_drift(self):
+        z_value = 0.
+        z_count = 0
+        for i in range(len(self.target_VCurrent)):
+            if (np.abs(self.target_input_dummy[i]) < (DIODE_VOLTAGE)):
+                z_value += self.target_VCurrent[i]
+                z_count += 1
+        try:
+            z_drift = z_value/z_count
+        except ZeroDivisionError:
+            z_drift = 0.
+        print('z_drift='+str(z_drift))
+        return z_drift
+
+    def Z123_approximation(self, sch, swcode, code2, title=''):
+        target_input_dummy = self.target_input_dummy
+        target_VCurrent = self.target_VCurrent
+
+        if self.Z123_sch is None:
+            self.Z123_sch = Sch_init()
+
+            self.target_fullVoltage = np.asarray(target_input_dummy)+self.INIT_Rcs*np.asarray(target_VCurrent)
+            self.corrected_VCurrent = np.array(target_VCurrent, dtype=float)
+        else:
+            # копирование
+            sch['R1'] = self.Z123_sch['R1']
+            sch['C1'] = self.Z123_sch['C1']
+            sch['R2'] = self.Z123_sch['R2']
+            sch['C2'] = self.Z123_sch['C2']
+            sch['R3'] = self.Z123_sch['R3']
+            sch['C3'] = self.Z123_sch['C3']
+
+            return False  # больше не вызывать
+
+        Z123_sch = self.Z123_sch
+        target_fullVoltage = self.target_fullVoltage
+        min_r123_batch = self.min_r123_batch
+        measure_r1_by_R2 = self.measure_r1_by_R2
+        measure_r3_by_R2 = self.measure_r3_by_R2
+        ########################################################
+
+        r2 = self.measure_r2()
+        r1 = measure_r1_by_R2(r2)
+        r3 = measure_r3_by_R2(r2)
+
+        #  обнуляем пристрелку
+        self.min_r123_misfit = None
+        # варианты значений сопротивлений схем
+        r1_0 = self.get_r_high()
+        r1_d = self.get_r_hight_sub_diode()
+        r3_0 = self.get_r_low()
+        r3_d = self.get_r_low_sub_diode()
+        candidates = [
+            # основной вариант аналитического приближения, срабатывает почти всегда
+            [r1, r2, r3],
+            # разные варианты с меньшей абсолютной  погрешностью
+            # для аналитического приближения
+            [r1, HUGE_R, r3],
+            [r1, HUGE_R, measure_r3_by_R2(HUGE_R)],
+            [measure_r1_by_R2(HUGE_R), HUGE_R, r3],
+            [measure_r1_by_R2(HUGE_R), HUGE_R, measure_r3_by_R2(HUGE_R)],
+            [measure_r1_by_R2(HUGE_R), HUGE_R, r3],
+            [measure_r1_by_R2(HUGE_R), HUGE_R, HUGE_R],
+            [HUGE_R, HUGE_R, measure_r3_by_R2(HUGE_R)],
+            # разные варианты с меньшей абсолютной  погрешностью
+            # для приближения диода с идеальной ВАХ
+            [r1_d, HUGE_R, r3_d],
+            [r1_d, r3_0, HUGE_R],
+            [HUGE_R, r1_0, r3_d],
+            [HUGE_R, r3_0, HUGE_R],
+            [HUGE_R, r1_0, HUGE_R],
+            [NULL_R, r2, NULL_R],
+            [NULL_R, r2, r3],
+            [r1, r2, NULL_R],
+            # маловероятно, но пусть будет
+            [r1, NULL_R, r3]]
+        # все варианты и сетка вокруг аналитического приближения считаются за один вызов
+        min_r123_batch(np.concatenate([candidates, self.r123_grid(r1, r2, r3)]))
+
+        r1 = np.abs(self.min_r123_x[0])
+        r2 = np.abs(self.min_r123_x[1])
+        r3 = np.abs(self.min_r123_x[2])
+
+        Rc1 = 1./(1./r1+1./r2)
+        Rc2 = 1./(1./r1+1./r2+1./r3)
+        Rc3 = 1./(1./r2+1./r3)
+
+        phase_1 = 360*(np.argmax(target_fullVoltage)-np.argmax(target_VCurrent))/self.MAX_NUM_POINTS
+        phase_3 = 360*(np.argmin(target_fullVoltage)-np.argmin(target_VCurrent))/self.MAX_NUM_POINTS
+        print('phase_1='+str(phase_1))
+        print('phase_3='+str(phase_3))
+        phase_1 = np.abs(phase_1) % 90
+        phase_3 = np.abs(phase_3) % 90
+
+        if phase_1 < 5:
+            phase_1 = 5
+        if phase_3 < 5:
+            phase_3 = 5
+        if phase_1 > 85:
+            phase_1 = 85
+        if phase_3 > 85:
+            phase_3 = 85
+
+        phase_2 = (phase_1+phase_3)/2.
+        print('phase_1*='+str(phase_1))
+        print('phase_2*='+str(phase_2))
+        print('phase_3*='+str(phase_3))
+
+        с1 = self.R_to_C(Rc1*np.cos(phase_1*np.pi/180))
+        с1 = C_to_norm(с1)
+        с2 = self.R_to_C(Rc2*np.cos(phase_2*np.pi/180))
+        с2 = C_to_norm(с2)
+        с3 = self.R_to_C(Rc3*np.cos(phase_3*np.pi/180))
+        с3 = C_to_norm(с3)
+
+        Z123_sch['R1'] = r1
+        Z123_sch['C1'] = с1
+        Z123_sch['R2'] = r2
+        Z123_sch['C2'] = с2
+        Z123_sch['R3'] = r3
+        Z123_sch['C3'] = с3
+
+        print('r1_o = '+str(r1))
+        print('r2_o = '+str(r2))
+        print('r3_o = '+str(r3))
+        print('с1_o = '+str(с1))
+        print('с2_o = '+str(с2))
+        print('с3_o = '+str(с3))
+
+        if self.SHOW_PLOTS:
+            str_0 = '\nr1_o={:2.1e}, r2_o={:2.1e}, r3_o={:2.1e}'.format(r1, r2, r3)
+            plt.title('Пристрелка '+title+str_0)
+            plt.plot(target_input_dummy, target_VCurrent, c='red')
+
+            curr_r123 = self.I_from_VR1R2R3(target_fullVoltage, r1, r2, r3)
+            plt.plot(target_input_dummy, curr_r123, c='blue')
+            plt.legend(['реальные даные', 'Н.У. подбора'])
+            plt.show()
+
+        # plt.plot(target_input_dummy)
+        # plt.show()
+        # plt.plot(target_VCurrent)
+        # plt.show()
+
+        # именно такое копирование, ибо надо сохранить ссылку
         sch['R1'] = Z123_sch['R1']
         sch['C1'] = Z123_sch['C1']
         sch['R2'] = Z123_sch['R2']
@@ -859,342 +1666,823 @@ def Z123_approximation(sch, swcode, code2, title=''):
         sch['R3'] = Z123_sch['R3']
         sch['C3'] = Z123_sch['C3']
 
-        return False  # больше не вызывать
-
-    ########################################################
-
-    r2 = measure_r2()
-    r1 = measure_r1_by_R2(r2)
-    r3 = measure_r3_by_R2(r2)
-
-    #  обнуляем пристрелку
-    min_r123_misfit = None
-    # варианты значений сопротивлений схем
-    # основной вариант аналитического приближения, срабатывает почти всегда
-    min_r123_subroutine([r1, r2, r3])
-    # разные варианты с меньшей абсолютной  погрешностью
-    # для аналитического приближения
-    min_r123_subroutine([r1, HUGE_R, r3])
-    min_r123_subroutine([r1, HUGE_R, measure_r3_by_R2(HUGE_R)])
-    min_r123_subroutine([measure_r1_by_R2(HUGE_R), HUGE_R, r3])
-    min_r123_subroutine([measure_r1_by_R2(HUGE_R), HUGE_R, measure_r3_by_R2(HUGE_R)])
-    min_r123_subroutine([measure_r1_by_R2(HUGE_R), HUGE_R, r3])
-    min_r123_subroutine([measure_r1_by_R2(HUGE_R), HUGE_R, HUGE_R])
-    min_r123_subroutine([HUGE_R, HUGE_R, measure_r3_by_R2(HUGE_R)])
-    # разные варианты с меньшей абсолютной  погрешностью
-    # для приближения диода с идеальной ВАХ
-    r1_0 = get_r_high()
-    r1_d = get_r_hight_sub_diode()
-    r3_0 = get_r_low()
-    r3_d = get_r_low_sub_diode()
-
-    min_r123_subroutine([r1_d, HUGE_R, r3_d])
-    min_r123_subroutine([r1_d, r3_0, HUGE_R])
-    min_r123_subroutine([HUGE_R, r1_0, r3_d])
-    min_r123_subroutine([HUGE_R, r3_0, HUGE_R])
-    min_r123_subroutine([HUGE_R, r1_0, HUGE_R])
-    min_r123_subroutine([NULL_R, r2, NULL_R])
-    min_r123_subroutine([NULL_R, r2, r3])
-    min_r123_subroutine([r1, r2, NULL_R])
-    # маловероятно, но пусть будет
-    min_r123_subroutine([r1, NULL_R, r3])
-
-    r1 = np.abs(min_r123_x[0])
-    r2 = np.abs(min_r123_x[1])
-    r3 = np.abs(min_r123_x[2])
-
-    Rc1 = 1./(1./r1+1./r2)
-    Rc2 = 1./(1./r1+1./r2+1./r3)
-    Rc3 = 1./(1./r2+1./r3)
-
-    phase_1 = 360*(np.argmax(target_fullVoltage)-np.argmax(target_VCurrent))/MAX_NUM_POINTS
-    phase_3 = 360*(np.argmin(target_fullVoltage)-np.argmin(target_VCurrent))/MAX_NUM_POINTS
-    print('phase_1='+str(phase_1))
-    print('phase_3='+str(phase_3))
-    phase_1 = np.abs(phase_1) % 90
-    phase_3 = np.abs(phase_3) % 90
-
-    if phase_1 < 5:
-        phase_1 = 5
-    if phase_3 < 5:
-        phase_3 = 5
-    if phase_1 > 85:
-        phase_1 = 85
-    if phase_3 > 85:
-        phase_3 = 85
-
-    phase_2 = (phase_1+phase_3)/2.
-    print('phase_1*='+str(phase_1))
-    print('phase_2*='+str(phase_2))
-    print('phase_3*='+str(phase_3))
-
-    с1 = R_to_C(Rc1*np.cos(phase_1*np.pi/180))
-    с1 = C_to_norm(с1)
-    с2 = R_to_C(Rc2*np.cos(phase_2*np.pi/180))
-    с2 = C_to_norm(с2)
-    с3 = R_to_C(Rc3*np.cos(phase_3*np.pi/180))
-    с3 = C_to_norm(с3)
-
-    Z123_sch['R1'] = r1
-    Z123_sch['C1'] = с1
-    Z123_sch['R2'] = r2
-    Z123_sch['C2'] = с2
-    Z123_sch['R3'] = r3
-    Z123_sch['C3'] = с3
-
-    str_0 = '\nr1_o={:2.1e}, r2_o={:2.1e}, r3_o={:2.1e}'.format(r1, r2, r3)
-    plt.title('Пристрелка '+title+str_0)
-    plt.plot(target_input_dummy, target_VCurrent, c='red')
-
-    print('r1_o = '+str(r1))
-    print('r2_o = '+str(r2))
-    print('r3_o = '+str(r3))
-    print('с1_o = '+str(с1))
-    print('с2_o = '+str(с2))
-    print('с3_o = '+str(с3))
-
-    curr_r123 = np.zeros_like(target_fullVoltage)
-    for i in range(len(curr_r123)):
-        curr_r123[i] = I_from_VR1R2R3(target_fullVoltage[i], r1, r2, r3)
-
-    plt.plot(target_input_dummy, curr_r123, c='blue')
-    plt.legend(['реальные даные', 'Н.У. подбора'])
-    plt.show()
-
-    # plt.plot(target_input_dummy)
-    # plt.show()
-    # plt.plot(target_VCurrent)
-    # plt.show()
-
-    # именно такое копирование, ибо надо сохранить ссылку
-    sch['R1'] = Z123_sch['R1']
-    sch['C1'] = Z123_sch['C1']
-    sch['R2'] = Z123_sch['R2']
-    sch['C2'] = Z123_sch['C2']
-    sch['R3'] = Z123_sch['R3']
-    sch['C3'] = Z123_sch['C3']
-
-    return
+        return
+
+    #############################################################################
+    #############################################################################
+    #############################################################################
+
+    def Sch_saveToFile(self, sch, fileName):
+        s = self.circuit_SessionFileName
+        simulator = self.SIMULATOR
+        self.circuit_SessionFileName = fileName
+        # итоговая схема проверяется в ngspice
+        self.SIMULATOR = 'ngspice'
+        try:
+            self.Session_run1(sch)
+            self.generate_circuitFile_by_values(self.Xi_long)
+        except Exception:
+            with open(fileName, 'w') as newF:
+                json.dump(sch, newF)
+
+        print(sch['Xi_variable'])
+        self.circuit_SessionFileName = s
+        self.SIMULATOR = simulator
+        return
 
-#############################################################################
-#############################################################################
-#############################################################################
+    def init_target_by_Sch(self, sch):
+        self.Z123_sch = None
+
+        if not self.CIRCUIT_IN_MEMORY:
+            self.generate_circuitFile_by_values(self.Sch_get_Xi(sch))
+            self.init_target_by_circuitFile()
+            return
+
+        self.process_circuit_by_values(self.Sch_get_Xi(sch))
+        self.init_target_by_analysis()
+
+    #############################################################################
+    # выполнить схемы сессий одним пакетом (см. evaluate_batch), как Session_run1 для
+    # каждой сессии. При MULTI_FIDELITY схемы отсеиваются грубо, как в Session_run_start
+    def Session_run_batch(self, ses_list):
+        xis = [self.Sch_get_Xi(ses.get('result_sch', ses['start_sch'])) for ses in ses_list]
+        self.coarse = self.MULTI_FIDELITY
+        try:
+            results = self.evaluate_batch(xis)
+        finally:
+            self.coarse = False
+        if not self.MULTI_FIDELITY:
+            for ses, result in zip(ses_list, results):
+                ses['misfit'] = result[0]
+            return
+
+        for ses, result in zip(ses_list, results):
+            self.Session_set_coarse_misfit(ses, result[0])
+        confirm = [i for i in range(len(ses_list)) if self.coarse_may_succeed(results[i][1])]
+        for i, result in zip(confirm, self.evaluate_batch([xis[i] for i in confirm])):
+            ses_list[i]['misfit'] = result[0]
+
+    # грубо выполнить схему сессии (см. MULTI_FIDELITY), возвращает грубое значение сравнения ivcmp
+    def Session_run_coarse(self, session):
+        xi = self.Sch_get_Xi(session.get('result_sch', session['start_sch']))
+        self.coarse = True
+        try:
+            misfit, ivcmp_value, residuals = self.evaluate_Xi(xi)
+        finally:
+            self.coarse = False
+        self.Session_set_coarse_misfit(session, misfit)
+        return ivcmp_value
+
+    # грубый misfit хранится отдельно, точного misfit у сессии пока нет
+    def Session_set_coarse_misfit(self, session, misfit):
+        session['coarse_misfit'] = misfit
+        session['misfit'] = np.inf
+
+    # выполнить схему один раз
+    def Session_run1(self, session):
+        try:
+            sch = session['result_sch']
+        except KeyError:
+            sch = session['start_sch']
+
+        xi = self.Sch_get_Xi(sch)
+        self.set_circuit_nominals(xi)
+        session['misfit'] = self.calculate_misfit(xi)
+        self.misfit_result = session['misfit']
+        if self.MISFIT_METHOD == 'ivcmp':
+            self.ivcmp_result = self.misfit_result
+
+    # сколько первых из maxfev вычислений подбора считать грубо (см. MULTI_FIDELITY).
+    # Короткие раунды 'halving' (short) только отсеивают сессии и считаются грубо
+    def fitter_coarse_fev(self, maxfev, short):
+        if not self.MULTI_FIDELITY:
+            return 0
+        return maxfev if short else int(self.COARSE_FEV_SHARE*maxfev)
+
+    # запустить подбор для сессии, продолжая с результата прошлого подбора, если он был.
+    # coarse_fev - по умолчанию см. fitter_coarse_fev, split - подбирать по полуволнам
+    # при HALFWAVE_SPLIT
+    def Session_run_fitter(self, session, maxfev=None, coarse_fev=None, split=True):
+        if split and self.HALFWAVE_SPLIT and (self.halfwave is None) and self.Session_run_halfwave(session, maxfev):
+            return
+        self.FitterCount = 0
+        try:
+            sch = session['result_sch']
+        except KeyError:
+            sch = session['start_sch']
+        else:
+            session['start_sch'] = sch
+
+        var_list = session['Xi_variable']
+        self.set_circuit_nominals(self.Sch_get_Xi(sch))
+        self.reset_Xi_variable()
+        self.set_Xi_variable(var_list)
+
+        if maxfev is None:
+            maxfev = self.MAXFEV
+        if coarse_fev is None:
+            coarse_fev = self.fitter_coarse_fev(maxfev, maxfev < self.MAXFEV)
+
+        self.release_compiled_circuit()
+        try:
+            self.run_fitter(maxfev=maxfev, coarse_fev=coarse_fev)
+        except Exception:
+            print('NGSPICE EXCEPTION')
+        self.release_compiled_circuit()
+
+        sch2 = Sch_init()
+        self.Sch_load_from_Xi(sch2, self.Xi_result)
+        session['result_sch'] = sch2
+
+        session['misfit'] = self.misfit_result
+        session['fCount'] = self.FitterCount
+        session['mCount'] = self.BestMisfitCount
+
+    # подбор сессии по полуволнам (см. HALFWAVE_SPLIT): номиналы ветви 1 - по
+    # положительной полуволне, ветви 3 - по отрицательной, ветвь 2 не меняется.
+    # Найденные номиналы объединяются и уточняются совместным подбором.
+    # Возвращает False, если подбираемых номиналов нет в одной из ветвей диодов
+    # или вычислений слишком мало для деления (см. HALFWAVE_MIN_FEV)
+    def Session_run_halfwave(self, session, maxfev=None):
+        if maxfev is None:
+            maxfev = self.MAXFEV
+        var_list = session['Xi_variable']
+        branches = {1: [v for v in var_list if v in ('R1', 'C1')], -1: [v for v in var_list if v in ('R3', 'C3')]}
+        if not (branches[1] and branches[-1]):
+            return False
+
+        sch = session.get('result_sch', session['start_sch'])
+        short = maxfev < self.MAXFEV
+        sub_fev = int(self.HALFWAVE_FEV_SHARE*maxfev/2)
+        if sub_fev < self.HALFWAVE_MIN_FEV:
+            return False
+        sub_coarse_fev = self.fitter_coarse_fev(sub_fev, short)
+        subs = {}
+        for halfwave, variables in branches.items():
+            subs[halfwave] = Session_create(dict(sch))
+            subs[halfwave]['Xi_variable'] = variables
+
+        if self.batch_pool is not None:
+            # из процессов возвращаются копии сессий
+            fitted = self.batch_pool.map(_worker_run_halfwave, [(subs[h], sub_fev, sub_coarse_fev, h) for h in subs])
+        else:
+            fitted = []
+            for halfwave in subs:
+                self.FITTER_SUCCESS = False
+                self.Session_run_halfwave_fitter(subs[halfwave], sub_fev, sub_coarse_fev, halfwave)
+                fitted += [(subs[halfwave], self.FITTER_SUCCESS)]
+
+        fCount = sum(ses['fCount'] for ses, success in fitted)
+        for ses, success in fitted:
+            if success:  # схема с одной подобранной полуволной уже совпадает с целью
+                session['result_sch'] = ses['result_sch']
+                session['misfit'] = self.calculate_misfit(self.Sch_get_Xi(ses['result_sch']))
+                session['fCount'] = fCount
+                session['mCount'] = ses['mCount']
+                self.FITTER_SUCCESS = True
+                return True
+
+        joint = dict(sch)
+        for ses, success in fitted:
+            joint.update({v: ses['result_sch'][v] for v in ses['Xi_variable']})
+        session['start_sch'] = joint
+        session.pop('result_sch', None)
+        joint_fev = max(1, maxfev-fCount)
+        self.Session_run_fitter(session, joint_fev, self.fitter_coarse_fev(joint_fev, short), split=False)
+        session['fCount'] += fCount
+        return True
 
+    # подбор по одной полуволне halfwave (1 или -1)
+    def Session_run_halfwave_fitter(self, session, maxfev, coarse_fev, halfwave):
+        self.halfwave = halfwave
+        try:
+            self.Session_run_fitter(session, maxfev, coarse_fev)
+        finally:
+            self.halfwave = None
+
+    # проводимости резистивных ветвей линейным МНК. Диод - кусочно-линейный с
+    # падением Vd: ток ветви 1 - G1*(V-Vd1) при V > Vd1, ветви 3 - G3*(V+Vd3)
+    # при V < -Vd3, без диода и в ветви 2 - G*V. При известных состояниях
+    # диодов ток линеен по G и G*Vd, они находятся сразу неотрицательным МНК
+    # (scipy.optimize.nnls) вместе со смещением нуля тока. Состояния диодов
+    # уточняются по найденным Vd, начиная с DIODE_VOLTAGE. Настоящий диод
+    # открывается плавно, поэтому точки колена (0.55..1.15)*Vd в МНК не входят.
+    # Возвращает {'R1': .., ...} для включенных ветвей и СКО тока от модели
+    # или None, если в схеме есть конденсаторы
+    def resistive_lsq(self, swcode, iterations=3):
+        V = np.asarray(self.target_input_dummy, dtype=float)
+        current = np.asarray(self.target_VCurrent, dtype=float)
+        if (not swcode & 1 and not swcode & 8) or (not swcode & 2 and not swcode & 128) or \
+                (not swcode & 4 and not swcode & 32):  # есть конденсатор
+            return None
+        if (swcode & 7) == 7:  # все ветви отключены
+            return None
+
+        vd1 = DIODE_VOLTAGE
+        vd3 = DIODE_VOLTAGE
+        for _ in range(iterations):
+            # столбцы: ветви, затем G*Vd диодов, затем смещение нуля любого знака
+            columns = {}
+            diodes = {}
+            knee = np.zeros(len(V), dtype=bool)
+            if not swcode & 1:  # ветка 1
+                if swcode & 16:  # вместо D1 перемычка
+                    columns['R1'] = V
+                else:
+                    on = (V > vd1).astype(float)
+                    columns['R1'] = V*on
+                    diodes['R1'] = -on
+                    knee |= (V > 0.55*vd1) & (V < 1.15*vd1)
+            if not swcode & 2:  # ветка 2
+                columns['R2'] = V
+            if not swcode & 4:  # ветка 3
+                if swcode & 64:  # вместо D3 перемычка
+                    columns['R3'] = V
+                else:
+                    on = (V < -vd3).astype(float)
+                    columns['R3'] = V*on
+                    diodes['R3'] = on
+                    knee |= (V < -0.55*vd3) & (V > -1.15*vd3)
+
+            A = np.stack(list(columns.values())+list(diodes.values())+[np.ones(len(V)), -np.ones(len(V))], axis=1)
+            x, rnorm = spo.nnls(A[~knee], current[~knee])
+            G = dict(zip(columns, x))
+            GVd = dict(zip(diodes, x[len(columns):]))
+            if G.get('R1', 0) > 0 and 'R1' in GVd:
+                vd1 = GVd['R1']/G['R1']
+            if G.get('R3', 0) > 0 and 'R3' in GVd:
+                vd3 = GVd['R3']/G['R3']
+
+        R = {}
+        for name, g in G.items():
+            R[name] = HUGE_R if g*HUGE_R <= 1 else float(np.clip(1/g, R_MIN, HUGE_R))
+        return R, rnorm/np.sqrt(np.count_nonzero(~knee))
+
+    # для резистивной схемы сессии без диодов (см. resistive_lsq) установить R1, R2, R3
+    # по МНК. Модель здесь точная, и если она описывает кривую с точностью
+    # TRIVIAL_LINEAR_TOLERANCE, номиналы исключаются из подбираемых параметров
+    def Session_resistive_lsq(self, session, swcode):
+        if switchers_diodes(swcode):
+            return
+        res = self.resistive_lsq(swcode)
+        if res is None:
+            return
+        R, deviation = res
+        session['start_sch'].update(R)
+        if deviation <= self.TRIVIAL_LINEAR_TOLERANCE*np.ptp(self.target_VCurrent):
+            session['Xi_variable'] = [v for v in session['Xi_variable'] if v not in R]
+
+    # для резистивной схемы с диодами модель МНК кусочно-линейная и не всегда
+    # лучше пристрелки Z123_approximation. Оценка становится еще одной стартовой
+    # сессией с кодом swcode (копия session с подбираемыми R из МНК), которая
+    # отсеивается вместе с остальными. None - схема не резистивная или без диодов
+    def Session_resistive_seed(self, session, swcode):
+        if not switchers_diodes(swcode):
+            return None
+        res = self.resistive_lsq(swcode)
+        if res is None:
+            return None
+        R, deviation = res
+        seed = Session_create(dict(session['start_sch']))
+        seed['Xi_variable'] = list(session['Xi_variable'])
+        seed['start_sch'].update({name: r for name, r in R.items() if name in seed['Xi_variable']})
+        return seed
+
+    # перенести в схему сессии номиналы включенных ветвей frozen_sch и исключить
+    # их из подбираемых. Снова включенная ветвь, у которой пристрелка оставила
+    # R >= BIG_R (там misfit от R не зависит), начинает подбор с наименьшего R
+    # ветвей frozen_sch
+    def Session_freeze(self, session):
+        sch = session['start_sch']
+        frozen_R = [self.frozen_sch[names[0]] for off_bit, c_bit, d_bit, *names in SWITCHER_BRANCHES
+                    if self.frozen_sch[names[0]] < BIG_R]
+        for off_bit, c_bit, d_bit, *names in SWITCHER_BRANCHES:
+            if self.frozen_sch[names[0]] >= BIG_R:  # ветвь отключена
+                if frozen_R and (names[0] in session['Xi_variable']) and (sch[names[0]] >= BIG_R):
+                    sch[names[0]] = min(frozen_R)
+                continue
+            names = [name for name in names if name is not None]
+            sch.update({name: self.frozen_sch[name] for name in names})
+            session['Xi_variable'] = [v for v in session['Xi_variable'] if v not in names]
 
-def Sch_saveToFile(sch, fileName):
-    global circuit_SessionFileName
-    s = circuit_SessionFileName
-    circuit_SessionFileName = fileName
-    try:
-        Session_run1(sch)
-    except Exception:
-        with open(fileName, 'w') as newF:
-            json.dump(sch, newF)
+    # установить переключатели для схемы.
+    def Session_set_switchers(self, session, swcode):
+        sch = session['start_sch']
+        var_list = []
 
-    print(sch['Xi_variable'])
-    circuit_SessionFileName = s
-    return
+        if swcode & 1:  # ветка 1
+            sch['R1'] = HUGE_R
+        else:
+            var_list += ['R1']
 
+        if swcode & 2:  # ветка 2
+            sch['R2'] = HUGE_R
+        else:
+            var_list += ['R2']
 
-def init_target_by_Sch(sch):
-    global Z123_sch
-    Z123_sch = None
+        if swcode & 4:  # ветка 3
+            sch['R3'] = HUGE_R
+        else:
+            var_list += ['R3']
 
-    generate_circuitFile_by_values(Sch_get_Xi(sch))
-    init_target_by_circuitFile()
-    return
+        if swcode & 8:  # C1
+            sch['_R_C1'] = NULL_R
+        else:
+            sch['_R_C1'] = HUGE_R
+            var_list += ['C1']
 
+        if swcode & 16:  # D1
+            sch['_R_D1'] = NULL_R
+        else:
+            sch['_R_D1'] = HUGE_R
 
-#############################################################################
-def Session_create(start_sch):
-    s = {}
-    s['start_sch'] = start_sch
-    return s
+        if swcode & 32:  # C3
+            sch['_R_C3'] = NULL_R
+        else:
+            sch['_R_C3'] = HUGE_R
+            var_list += ['C3']
 
+        if swcode & 64:  # D3
+            sch['_R_D3'] = NULL_R
+        else:
+            sch['_R_D3'] = HUGE_R
 
-# выполнить схему один раз
-def Session_run1(session):
-    global misfit_result, ivcmp_result
-    try:
-        sch = session['result_sch']
-    except KeyError:
-        sch = session['start_sch']
+        if swcode & 128:  # C2
+            sch['_R_C2'] = NULL_R
+        else:
+            sch['_R_C2'] = HUGE_R
+            var_list += ['C2']
+
+        session['Xi_variable'] = var_list
+
+    # последовательный подбор сессий, возвращает сессии по мере завершения
+    def Session_run_fitter_serial(self, ses_list):
+        for ses in ses_list:
+            self.FITTER_SUCCESS = False
+            self.Session_run_fitter(ses)
+            yield ses, self.FITTER_SUCCESS
+
+    # параллельный подбор сессий в workers процессах. Сессии возвращаются по мере
+    # завершения, при закрытии генератора оставшиеся подборы прерываются
+    def Session_run_fitter_pool(self, ses_list, workers):
+        pool = self.create_fitter_pool(workers)
+        try:
+            for ses, success in pool.imap_unordered(_worker_run_fitter, [(ses, None) for ses in ses_list]):
+                yield ses, success
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def create_fitter_pool(self, workers):
+        target = (self.target_input_dummy, self.target_VCurrent, self.INIT_F, self.INIT_V, self.INIT_Rcs)
+        return multiprocessing.Pool(workers, _worker_init, (self.settings(), target))
+
+    # подбор сессий с последовательным делением пополам (см. FITTER_SCHEDULE).
+    # Сессии возвращаются по мере завершения, раунд за раундом
+    def Session_run_fitter_halving(self, ses_list, workers=1):
+        pool = None
+        if workers > 1:
+            pool = self.create_fitter_pool(workers)
+        try:
+            active = list(ses_list)
+            # не меньше одного вычисления, иначе бюджет не растет
+            budget = max(1, min(self.HALVING_MIN_FEV, self.MAXFEV))
+            while True:
+                print('halving: {} sessions, maxfev = {}'.format(len(active), budget))
+                fitted = []
+                if pool is None:
+                    for ses in active:
+                        self.FITTER_SUCCESS = False
+                        self.Session_run_fitter(ses, budget)
+                        fitted += [ses]
+                        yield ses, self.FITTER_SUCCESS
+                else:
+                    # из процессов возвращаются копии сессий
+                    for ses, success in pool.imap_unordered(_worker_run_fitter, [(ses, budget) for ses in active]):
+                        fitted += [ses]
+                        yield ses, success
+
+                if (len(fitted) <= 1) and (budget >= self.MAXFEV):
+                    return
+                fitted = sorted(fitted, key=lambda s: s['misfit'])
+                # в каждом раунде отсеивается хотя бы одна сессия, даже при HALVING_KEEP >= 1
+                keep = min(len(fitted)-1, math.ceil(len(fitted)*self.HALVING_KEEP))
+                active = fitted[:max(1, keep)]
+                budget = min(2*budget, self.MAXFEV)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    #############################################################################
+    # ПРОСТЫЕ КРИВЫЕ ############################################################
+    # классифицировать целевую кривую без моделирования. Ток приближается прямой
+    # I = V/R + I0 (I0 - смещение нуля прибора). Возвращает (вид, R):
+    # ('open', HUGE_R), ('short', R_MIN), ('resistor', R) или (None, None),
+    # если кривая не простая
+    def classify_target(self):
+        V = np.asarray(self.target_input_dummy, dtype=float)
+        current = np.asarray(self.target_VCurrent, dtype=float)
+        dV = np.ptp(V)
+        dI = np.ptp(current)
+        if dI*BIG_R <= dV:
+            return 'open', HUGE_R
+        if dV <= dI*R_MIN:
+            return 'short', R_MIN
+
+        # наименьшие квадраты по проводимости и смещению, сдвиг фазы и изломы
+        # диодов дают отклонение от прямой
+        (G, I0), residuals = np.linalg.lstsq(np.stack([V, np.ones(len(V))], axis=1), current, rcond=None)[:2]
+        if (G <= 0) or (len(residuals) == 0):
+            return None, None
+        if np.sqrt(residuals[0]/len(V)) > self.TRIVIAL_LINEAR_TOLERANCE*dI:
+            return None, None
+        return 'resistor', float(np.clip(1/G, R_MIN, BIG_R))
+
+    # подобрать простую кривую (см. classify_target) и записать схему в fileName.
+    # Резистор и короткое замыкание - ветвь 2 без C2, обрыв - все ветви отключены.
+    # Схема моделируется, как при подборе, и принимается по тому же условию
+    # останова. Возвращает сессию или None, если кривая не простая
+    def Session_trivial(self, fileName):
+        kind, R = self.classify_target()
+        if kind is None:
+            return None
+
+        ses = Session_create(Sch_init())
+        if kind == 'open':
+            self.Session_set_switchers(ses, 1+2+4+8+16+32+64+128)
+        else:
+            ses['start_sch']['R2'] = R
+            self.Session_set_switchers(ses, 1+4+8+16+32+64+128)
+        ses['result_sch'] = ses['start_sch']
+        ses['kind'] = kind
+        try:
+            self.Session_run1(ses)
+            self.ivcmp_result = self.analysis_misfit_ivcmp()
+        except Exception:
+            print('trivial curve: simulation failed')
+            return None
+        # принимается только то, что принял бы подбор
+        if self.ivcmp_result > self.ivcmp_tolerance():
+            return None
+
+        print('trivial curve: {}, R = {:e}'.format(kind, R))
+        self.FITTER_SUCCESS = True
+        self.Sch_saveToFile(ses, fileName)
+        return ses
+
+    # создать и выполнить сессии для старта, по одной на каждую различную схему.
+    # Возвращает список сессий и сессию, стартовая схема которой уже удовлетворяет
+    # условию останова (или None). codes - коды переключателей, по умолчанию switchers_list()
+    def Session_init_all(self, fileName, codes=None):
+        ses_list = []
+        if codes is None:
+            codes, skipped = switchers_list()
+            if skipped:
+                print('switchers: {} codes, {} duplicates skipped: {}'.format(
+                    len(codes), len(skipped), ', '.join('{}->{}'.format(k, v) for k, v in skipped.items())))
+        # стартовые схемы моделируются одним пакетом, если решатель это умеет
+        batch = (self.SIMULATOR == 'numpy') or (self.SPICE_BATCH_SIZE > 1)
+        for swcode in codes:
+            code2 = 0
+            next_code2 = True
+
+            while next_code2:
+                sch0 = Sch_init()
+                ses = Session_create(sch0)
+                next_code2 = self.Session_init_by_approximation(ses, swcode, code2, fileName, run=not batch)
+                code2 += 1
+                ses_list += [ses]
+
+                if (not batch) and (ses['misfit'] < self.ivcmp_tolerance()):  # условие останова удовлетворено
+                    return ses_list, ses
+
+                seed = self.Session_resistive_seed(ses, swcode) if self.RESISTIVE_LSQ else None
+                if seed is not None:
+                    ses_list += [seed]
+                    if not batch:
+                        self.Session_run_start(seed)
+                        if seed['misfit'] < self.ivcmp_tolerance():
+                            return ses_list, seed
+
+        # end_for
+        if batch:
+            self.Session_run_batch(ses_list)
+            for ses in ses_list:
+                if ses['misfit'] < self.ivcmp_tolerance():  # условие останова удовлетворено
+                    # пакет мог считаться встроенным решателем, условие проверяется заново
+                    # по одиночному моделированию, иначе сессия идет в подбор
+                    self.Session_run1(ses)
+                    if ses['misfit'] < self.ivcmp_tolerance():
+                        return ses_list, ses
+        return ses_list, None
+
+    # подобрать схему целевой кривой и сохранить в fileName. codes - коды
+    # переключателей перебираемых схем, по умолчанию все различные
+    def Session_processAll(self, fileName='result.txt', codes=None):
+        # процессы для пакетов точек и полуволн создаются один раз на весь подбор
+        if ((FITTER_METHODS[self.FITTER_METHOD].batch or self.HALFWAVE_SPLIT) and (self.BATCH_WORKERS > 1)
+                and not multiprocessing.current_process().daemon):
+            self.batch_pool = self.create_fitter_pool(self.BATCH_WORKERS)
+        try:
+            return self.Session_process_sessions(fileName, codes)
+        finally:
+            self.release_batch_pool()
+
+    def release_batch_pool(self):
+        if self.batch_pool is not None:
+            self.batch_pool.terminate()
+            self.batch_pool.join()
+        self.batch_pool = None
+
+    def Session_process_sessions(self, fileName, codes):
+        self.FITTER_SUCCESS = False
+
+        if self.TRIVIAL_CLASSIFIER and (self.frozen_sch is None):
+            ses = self.Session_trivial(fileName)
+            if ses is not None:
+                return ses
+
+        ses_list, ses = self.Session_init_all(fileName, codes)
+        if ses is not None:
+            return self.Session_start_success(ses, fileName)
+
+        print('pre init completed')
+        # сортируем сессии, чтобы начать подбор с наиболее подходящих
+        # сессии без точного расчета (см. MULTI_FIDELITY) - после остальных, по грубому misfit
+        ses_list = sorted(ses_list, key=lambda s: (s['misfit'], s.get('coarse_misfit', 0.)))
+        best_ses = ses_list[0]
+        best_misfit = best_ses['misfit']
+
+        # запускаем автоподбор, пока не будут удовлетворены условия останова
+        if self.FITTER_SCHEDULE == 'halving':
+            fitted = self.Session_run_fitter_halving(ses_list, self.FITTER_WORKERS)
+        elif self.FITTER_WORKERS > 1:
+            fitted = self.Session_run_fitter_pool(ses_list, self.FITTER_WORKERS)
+        else:
+            fitted = self.Session_run_fitter_serial(ses_list)
 
-    xi = Sch_get_Xi(sch)
-    set_circuit_nominals(xi)
-    session['misfit'] = calculate_misfit(xi)
-    misfit_result = session['misfit']
-    if MISFIT_METHOD == 'ivcmp':
-        ivcmp_result = misfit_result
+        for ses, success in fitted:
+            if success and (self.SIMULATOR == 'numpy'):
+                success = self.Session_verify(ses)
+            if (ses['misfit'] < best_misfit):
+                best_misfit = ses['misfit']
+                best_ses = ses
+                print('misfit = '+str(best_misfit))
+                if success:
+                    self.FITTER_SUCCESS = True
+                    # остальные сессии больше не нужны
+                    fitted.close()
+                    if self.FITTER_WORKERS > 1:  # подбор был в другом процессе
+                        self.Session_run1(ses)
+                    print(ses['result_sch'])
+                    self.analysis_plot('FITTER SUCCESS')
+
+                    print('FITTER_SUCCESS!!\nmisfit = '+str(best_misfit))
+                    self.Sch_saveToFile(best_ses, fileName)
+                    self.print_cache_stats()
+                    return best_ses
+        # end_for
+
+        # подбор завершился неудачно, выводим что есть
+        print('FITTER routine unsuccessfull\nmisfit = '+str(best_ses['misfit']))
+        self.Sch_saveToFile(best_ses, fileName)
+        self.Session_run1(best_ses)
+        self.analysis_plot('FITTER routine unsuccessfull')
+        self.print_cache_stats()
+        return best_ses
+
+    # успех подбора с пакетами точек встроенного решателя (SIMULATOR = 'numpy')
+    # проверяется одиночным моделированием в ngspice по тому же условию останова
+    def Session_verify(self, ses):
+        self.Session_run1(ses)
+        self.ivcmp_result = self.analysis_misfit_ivcmp()
+        if self.ivcmp_result <= self.ivcmp_tolerance():
+            return True
+        print('FITTER SUCCESS is not confirmed by ngspice, ivcmp = '+str(self.ivcmp_result))
+        return False
 
+    # стартовая схема сессии сразу удовлетворяет условию останова
+    def Session_start_success(self, ses, fileName):
+        self.FITTER_SUCCESS = True
+        print(ses['start_sch'])
+        self.analysis_plot('FITTER SUCCESS')
+        print('FITTER_SUCCESS!!\nmisfit = '+str(ses['misfit']))
+        self.Sch_saveToFile(ses, fileName)
+        print('good case!!')
+        self.print_cache_stats()
+        return ses
 
-# запустить подбор для сессии
-def Session_run_fitter(session):
-    global FitterCount
-    FitterCount = 0
-    try:
-        sch = session['result_sch']
-    except KeyError:
-        sch = session['start_sch']
-    else:
-        session['start_sch'] = sch
+    # счетчики кэша моделирования (в параллельном режиме - только этого процесса)
+    def print_cache_stats(self):
+        if self.SIM_CACHE is not None:
+            print('simulation cache: ' + str(self.SIM_CACHE.stats()))
 
-    var_list = session['Xi_variable']
-    set_circuit_nominals(Sch_get_Xi(sch))
-    set_Xi_variable(var_list)
 
-    try:
-        run_fitter()
-    except Exception:
-        print('NGSPICE EXCEPTION')
+# контекст процесса параллельного подбора, у каждого процесса свой ngspice
+_worker_context = None
 
-    sch2 = Sch_init()
-    Sch_load_from_Xi(sch2, Xi_result)
-    session['result_sch'] = sch2
 
-    session['misfit'] = misfit_result
-    session['fCount'] = FitterCount
-    session['mCount'] = BestMisfitCount
+def _worker_init(settings, target):
+    global _worker_context
+    _worker_context = SolverContext(**settings)
+    target_voltages, target_currents, initF, initV, initRcs = target
+    _worker_context.init_target_Data(target_voltages, target_currents, initF=initF, initV=initV, initRcs=initRcs)
 
 
-# проверить, имеет ли смысл такая установка переключателей в схеме
-def is_valid_switchers(swcode):
-    if swcode & (1+2+3):  # все ветви заглушены
-        return False
+def _worker_evaluate(args):
+    Xi, coarse, halfwave = args
+    _worker_context.coarse = coarse
+    _worker_context.halfwave = halfwave
+    try:
+        return _worker_context.evaluate_Xi(Xi)
+    finally:
+        _worker_context.coarse = False
+        _worker_context.halfwave = None
 
-    # все разыгрывание по заглушенной первой ветке
-    if (swcode == 1) or (swcode == 1+8) or (swcode == 1+16) or (swcode == 1+8+16):
-        return False
 
-    # все разыгрывание по заглушенной второй ветке
-    if (swcode == 2) or (swcode == 2+128):
-        return False
+def _worker_run_fitter(args):
+    ses, maxfev = args
+    _worker_context.FITTER_SUCCESS = False
+    _worker_context.Session_run_fitter(ses, maxfev)
+    return ses, _worker_context.FITTER_SUCCESS
 
-    # все разыгрывание по заглушенной третьей ветке
-    if (swcode == 3) or (swcode == 3+32) or (swcode == 3+64) or (swcode == 3+32+64):
-        return False
 
-    return True
+def _worker_run_halfwave(args):
+    ses, maxfev, coarse_fev, halfwave = args
+    _worker_context.FITTER_SUCCESS = False
+    _worker_context.Session_run_halfwave_fitter(ses, maxfev, coarse_fev, halfwave)
+    return ses, _worker_context.FITTER_SUCCESS
 
 
-# установить переключатели для схемы.
-def Session_set_switchers(session, swcode):
-    sch = session['start_sch']
-    var_list = []
+#############################################################################
+# МЕТОДЫ ПОДБОРА ############################################################
+# Метод подбора - функция (context, x0, maxfev), возвращающая найденную точку.
+# x0 - начальная точка подбираемых параметров (Xi_pack), точки вычисляются
+# функциями context.fitter_subroutine(x) или, для методов с атрибутом
+# batch = True, пакетами context.fitter_batch(X_list). Лучшая точка и признак
+# успеха запоминаются в контексте (Xi_result, FITTER_SUCCESS).
+def fitter_powell(context, x0, maxfev):
+    # пределы не передаются в Powell: с ними поиск вдоль направления начинается
+    # с краев всего допустимого диапазона. Выход за пределы ограничивает Xi_unroll
+    resX = spo.minimize(context.fitter_subroutine,
+                        x0,
+                        method='Powell',
+                        callback=context.fitter_callback,
+                        options={'maxfev': maxfev, 'xtol': np.log10(1+context.VALUES_TOLERANCE)})
+    return resX.x
+
+
+fitter_powell.batch = False
+
+
+# границы поиска для популяционных методов: номинал меняется не больше чем
+# в DE_SPAN раз в каждую сторону и не выходит за пределы Xi_bounds
+def fitter_bounds(context, x0):
+    low, high = context.Xi_log_bounds()
+    span = np.log10(context.DE_SPAN)
+    return np.clip(x0-span, low, high), np.clip(x0+span, low, high)
+
+
+# дифференциальная эволюция (rand/1/bin). Поколение вычисляется одним пакетом,
+# начальная точка входит в первое поколение. Пробная точка сравнивается с
+# родителем при той же точности моделирования: родители с грубым misfit, пробные
+# точки которых уже считаются точно, сначала пересчитываются точно
+def fitter_de(context, x0, maxfev):
+    random = np.random.RandomState(context.DE_SEED)
+    low, high = fitter_bounds(context, x0)
+    n = len(x0)
+    size = max(4, context.DE_POPULATION*n)
+    population = low + random.uniform(size=(size, n))*(high-low)
+    population[0] = x0
+    population = population[:max(1, maxfev)]
+    misfits, coarse = context.fitter_batch_fidelity(population)
+
+    while (context.FitterCount < maxfev) and not context.FITTER_SUCCESS:
+        count = min(len(population), maxfev-context.FitterCount)
+        trial = np.empty((count, n))
+        for i in range(count):
+            a, b, c = random.choice([j for j in range(len(population)) if j != i], 3, replace=len(population) < 4)
+            mutant = np.clip(population[a] + context.DE_F*(population[b]-population[c]), low, high)
+            cross = random.uniform(size=n) < context.DE_CR
+            cross[random.randint(n)] = True
+            trial[i] = np.where(cross, mutant, population[i])
+
+        trial_misfits, trial_coarse = context.fitter_batch_fidelity(trial)
+        stale = np.flatnonzero(coarse[:count] & ~trial_coarse)
+        if len(stale) > 0:
+            misfits[stale], coarse[stale] = context.fitter_batch_fidelity(population[stale])
+        better = trial_misfits <= misfits[:count]
+        population[:count][better] = trial[better]
+        misfits[:count][better] = trial_misfits[better]
+        coarse[:count][better] = trial_coarse[better]
+
+    return population[np.argmin(misfits)]
+
+
+fitter_de.batch = True
+
+
+# остановка least_squares: достигнута точность или исчерпан maxfev
+class _FitterStop(Exception):
+    pass
 
-    if swcode & 1:  # ветка 1
-        sch['R1'] = HUGE_R
-    else:
-        var_list += ['R1']
 
-    if swcode & 2:  # ветка 2
-        sch['R2'] = HUGE_R
-    else:
-        var_list += ['R2']
+# метод Левенберга-Марквардта. Невязки в точке x и в точках x+LM_STEP по
+# каждому параметру (столбцы якобиана) вычисляются одним пакетом
+def fitter_lm(context, x0, maxfev):
+    # последняя вычисленная точка и ее невязки, их повторно запрашивает якобиан
+    last = {}
+    best = {'x': np.array(x0, dtype=float), 'misfit': None}
+
+    def evaluate(X):
+        if context.FITTER_SUCCESS or (context.FitterCount >= maxfev):
+            raise _FitterStop()
+        misfits, residuals = context.fitter_batch_residuals(X)
+        for x, misfit in zip(X, misfits):
+            if (best['misfit'] is None) or (misfit < best['misfit']):
+                best['x'] = np.array(x)
+                best['misfit'] = misfit
+        return residuals
+
+    def fun(x):
+        residuals = evaluate([x])[0]
+        last['x'] = np.array(x)
+        last['residuals'] = residuals
+        return residuals
+
+    def jac(x):
+        if ('x' in last) and np.array_equal(last['x'], x):
+            X = x+context.LM_STEP*np.eye(len(x))
+            residuals = evaluate(X)
+            f0 = last['residuals']
+        else:
+            X = np.vstack([x, x+context.LM_STEP*np.eye(len(x))])
+            residuals = evaluate(X)
+            f0 = residuals[0]
+            residuals = residuals[1:]
+        return (residuals-f0).T/context.LM_STEP
 
-    if swcode & 4:  # ветка 3
-        sch['R3'] = HUGE_R
-    else:
-        var_list += ['R3']
+    try:
+        spo.least_squares(fun, x0, jac=jac, method='lm', xtol=np.log10(1+context.VALUES_TOLERANCE))
+    except _FitterStop:
+        pass
+    return best['x']
 
-    if swcode & 8:  # C1
-        sch['_R_C1'] = NULL_R
-    else:
-        sch['_R_C1'] = HUGE_R
-        var_list += ['C1']
 
-    if swcode & 16:  # D1
-        sch['_R_D1'] = NULL_R
-    else:
-        sch['_R_D1'] = HUGE_R
+fitter_lm.batch = True
 
-    if swcode & 32:  # C3
-        sch['_R_C3'] = NULL_R
-    else:
-        sch['_R_C3'] = HUGE_R
-        var_list += ['C3']
 
-    if swcode & 64:  # D3
-        sch['_R_D3'] = NULL_R
-    else:
-        sch['_R_D3'] = HUGE_R
+# подбирать нечего: точка x0 только вычисляется
+def fitter_none(context, x0, maxfev):
+    context.fitter_subroutine(x0)
+    return x0
 
-    if swcode & 128:  # C2
-        sch['_R_C2'] = NULL_R
-    else:
-        sch['_R_C2'] = HUGE_R
-        var_list += ['C2']
 
-    session['Xi_variable'] = var_list
+fitter_none.batch = False
 
+# доступные методы подбора, см. FITTER_METHOD
+FITTER_METHODS = {'powell': fitter_powell, 'de': fitter_de, 'lm': fitter_lm}
 
-def Session_processAll(fileName='result.txt'):
-    global FITTER_SUCCESS, VALUES_TOLERANCE, MAXFEV
-    FITTER_SUCCESS = False
-    ses_list = []
-    best_ses = None
-    best_misfit = 2  # заведомо большое число
 
-    # создаем список сессий для старта
-    for swcode in range(255):
-        if not is_valid_switchers(swcode):
-            continue
+#############################################################################
+# Функции модуля работают с контекстом по умолчанию. Функции init_target_*
+# создают новый контекст с текущими значениями настроек модуля.
+default_context = SolverContext()
 
-        code2 = 0
-        next_code2 = True
 
-        while next_code2:
-            sch0 = Sch_init()
-            ses = Session_create(sch0)
-            next_code2 = Session_init_by_approximation(ses, swcode, code2, fileName)
-            code2 += 1
-            ses_list += [ses]
+def init_target_by_circuitFile(fileName=circuit_SessionFileName):
+    global default_context
+    default_context = SolverContext()
+    default_context.init_target_by_circuitFile(fileName)
 
-            if ses['misfit'] < IVCMP_TOLERANCE:  # условие останова удовлетворено
-                best_ses = ses
-                best_misfit = best_ses['misfit']
-                print(ses['start_sch'])
-                analysis_plot('FITTER SUCCESS')
-                print('FITTER_SUCCESS!!\nmisfit = '+str(best_misfit))
-                Sch_saveToFile(best_ses, fileName)
-                print('good case!!')
-                return
 
-    # end_for
-    print('pre init completed')
-    # сортируем сессии, чтобы начать подбор с наиболее подходящих
-    ses_list = sorted(ses_list, key=lambda s: s['misfit'])
-    best_ses = ses_list[0]
-    best_misfit = best_ses['misfit']
-
-    # запускаем автоподбор, пока не будут удовлетворены условия останова
-    for ses in ses_list:
-        Session_run_fitter(ses)
-        if (ses['misfit'] < best_misfit):
-            best_misfit = ses['misfit']
-            best_ses = ses
-            print('misfit = '+str(best_misfit))
-            if FITTER_SUCCESS:
-                print(ses['result_sch'])
-                analysis_plot('FITTER SUCCESS')
-
-                print('FITTER_SUCCESS!!\nmisfit = '+str(best_misfit))
-                Sch_saveToFile(best_ses, fileName)
-                return
-    # end_for
+def init_target_from_jsnFile(fileName, N):
+    return default_context.init_target_from_jsnFile(fileName, N)
 
-    # подбор завершился неудачно, выводим что есть
-    print('FITTER routine unsuccessfull\nmisfit = '+str(best_ses['misfit']))
-    Sch_saveToFile(best_ses, fileName)
-    Session_run1(best_ses)
-    analysis_plot('FITTER routine unsuccessfull')
 
+def init_target_Data(target_voltages,
+                     target_currents,
+                     initF=1e4,
+                     initV=5,
+                     initRcs=1e2,
+                     initSNR=120,
+                     cycle=10,
+                     ivcmpTolerance=6e-2):
+    global default_context
+    default_context = SolverContext()
+    default_context.init_target_Data(target_voltages, target_currents, initF, initV, initRcs, initSNR, cycle,
+                                     ivcmpTolerance)
+
+
+def init_target_by_Sch(sch):
+    global default_context
+    default_context = SolverContext()
+    default_context.init_target_by_Sch(sch)
 
-def open_board(path):
-    with open(path, "r") as dump_file:
-        ivc_real = json.load(dump_file)
-        return ivc_real
-    return None
+
+def Session_processAll(fileName='result.txt'):
+    return default_context.Session_processAll(fileName)
 
 #############################################################################
 
@@ -1247,13 +2535,148 @@ def test5():
 
 
 def test_data_jsn(jsn_data, N, fileName='result.txt'):
-    global Z123_sch
+    global default_context
     gc.collect()
     print('\n')
     print(jsn_data)
-    InitF, InitV, InitRcs, target_voltages, target_currents = init_target_from_jsnFile(jsn_data, N)
-    init_target_Data(target_voltages, target_currents, initF=InitF, initV=InitV, initRcs=InitRcs, cycle=100)
-    Session_processAll(fileName)
+    default_context = SolverContext()
+    InitF, InitV, InitRcs, target_voltages, target_currents = default_context.init_target_from_jsnFile(jsn_data, N)
+    default_context.init_target_Data(target_voltages, target_currents, initF=InitF, initV=InitV, initRcs=InitRcs,
+                                     cycle=100)
+    return default_context.Session_processAll(fileName)
+
+
+# ПАКЕТНАЯ ОБРАБОТКА ФАЙЛА ПЛАТЫ #############################################
+# все кривые платы по очереди: ((element, pin, iv_curve), кривая)
+def board_iv_curves(board):
+    for i, element in enumerate(board['elements']):
+        for j, pin in enumerate(element['pins']):
+            for k, curve in enumerate(pin['iv_curves']):
+                yield (i, j, k), curve
+
+
+# ключи кривых, результат для которых уже записан в файл outFileName. Кривые,
+# подбор которых завершился ошибкой (поле 'error'), при продолжении подбираются снова
+def board_done_keys(outFileName):
+    done = set()
+    if not os.path.exists(outFileName):
+        return done
+
+    with open(outFileName, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:  # строка не дописана при прерывании
+                continue
+            if 'error' in record:
+                continue
+            done.add((record['element'], record['pin'], record['iv_curve']))
+    return done
+
+
+# подобрать схему для одной кривой из файла платы, вернуть запись результата
+def solve_iv_curve(key, curve, cirFileName, **settings):
+    record = {'element': key[0], 'pin': key[1], 'iv_curve': key[2]}
+    ctx = SolverContext(**settings)
+    try:
+        ctx.init_target_by_curve(curve)
+        ses = ctx.Session_processAll(cirFileName)
+    except Exception as e:
+        record['error'] = str(e)
+        return record
+
+    record['success'] = ctx.FITTER_SUCCESS
+    record['misfit'] = float(ses['misfit'])
+    record['sch'] = {k: float(v) for k, v in ses.get('result_sch', ses['start_sch']).items()}
+    record['Xi_variable'] = ses['Xi_variable']
+    record['cir_file'] = cirFileName
+    return record
+
+
+# Подобрать схемы для всех кривых файла платы. Результат по каждой кривой
+# дописывается строкой в outFileName (JSONL) сразу после подбора, поэтому
+# прерванный запуск с тем же outFileName продолжается с первой необработанной
+# кривой, кривые с ошибкой подбора подбираются снова. Схемы сохраняются в файлы
+# <outFileName без расширения>_<element>_<pin>_<iv_curve>.cir
+# Возвращает записи результата по мере подбора.
+def Board_process(boardFileName, outFileName, **settings):
+    settings.setdefault('SHOW_PLOTS', False)
+    board = open_board(boardFileName)
+    done = board_done_keys(outFileName)
+    cir_prefix = os.path.splitext(outFileName)[0]
+
+    pending = ((key, curve) for key, curve in board_iv_curves(board) if key not in done)
+    records = (solve_iv_curve(key, curve, '{}_{}_{}_{}.cir'.format(cir_prefix, *key), **settings)
+               for key, curve in pending)
+
+    with open(outFileName, 'a+') as out:
+        # последняя строка могла остаться недописанной
+        if out.tell() > 0:
+            out.seek(out.tell()-1)
+            if out.read(1) != '\n':
+                out.write('\n')
+
+        for record in records:
+            out.write(json.dumps(record)+'\n')
+            out.flush()
+            os.fsync(out.fileno())
+            yield record
+
+
+def Board_processAll(boardFileName, outFileName, **settings):
+    for record in Board_process(boardFileName, outFileName, **settings):
+        print('element {}, pin {}, iv_curve {}: misfit = {}'.format(
+            record['element'], record['pin'], record['iv_curve'], record.get('misfit', record.get('error'))))
+
+
+# ПОДБОР ПО НЕСКОЛЬКИМ ЧАСТОТАМ #############################################
+# Кривые curves одной точки платы, снятые на разных частотах, подбираются от
+# низкой частоты к высокой. На самой низкой частоте конденсаторы ветвей почти
+# не пропускают ток, поэтому перебираются только схемы без конденсаторов
+# (CAPACITORS_SHORTED): ветвь с конденсатором выглядит отключенной. На каждой
+# следующей частоте номиналы включенных ветвей не подбираются (frozen_sch),
+# а отключенные ветви могут включиться с конденсатором (reopened_switchers) -
+# подбираются только их R и C. Схема сохраняется в fileName после каждой
+# частоты, возвращается сессия последней. В ses['frequency_misfit'] - misfit
+# итоговой схемы на каждой частоте
+def solve_multifrequency(curves, fileName='result.txt', **settings):
+    settings.setdefault('SHOW_PLOTS', False)
+    curves = sorted(curves, key=lambda c: c['measurement_settings']['probe_signal_frequency'])
+    contexts = []
+    codes = [swcode for swcode in switchers_list()[0] if (swcode & CAPACITORS_SHORTED) == CAPACITORS_SHORTED]
+    sch = None
+    for curve in curves:
+        ctx = SolverContext(**settings)
+        ctx.init_target_by_curve(curve)
+        if sch is not None:
+            ctx.frozen_sch = sch
+            codes = reopened_switchers(switchers_by_sch(sch))
+        print('frequency {} Hz: {} circuits'.format(ctx.INIT_F, len(codes)))
+        ses = ctx.Session_processAll(fileName, codes)
+        sch = dict(ses.get('result_sch', ses['start_sch']))
+        contexts += [ctx]
+
+    ses['frequency_misfit'] = {ctx.INIT_F: ctx.calculate_misfit(ctx.Sch_get_Xi(sch)) for ctx in contexts}
+    print('misfit by frequency: {}'.format(ses['frequency_misfit']))
+    return ses
+
+
+# кривые точки платы (element, pin) из нескольких файлов плат, например снятых
+# на разных частотах: список (частота, кривая) по возрастанию частоты
+def board_frequency_curves(boardFileNames, element, pin):
+    curves = []
+    for boardFileName in boardFileNames:
+        board = open_board(boardFileName)
+        for curve in board['elements'][element]['pins'][pin]['iv_curves']:
+            curves += [(curve['measurement_settings']['probe_signal_frequency'], curve)]
+    return sorted(curves, key=lambda c: c[0])
+
+
+# подобрать схему точки платы (element, pin) по кривым всех частот из файлов
+# boardFileNames, см. solve_multifrequency
+def Board_solve_multifrequency(boardFileNames, element, pin, fileName='result.txt', **settings):
+    curves = [curve for frequency, curve in board_frequency_curves(boardFileNames, element, pin)]
+    return solve_multifrequency(curves, fileName, **settings)
 
 
 def test_circuit(circuitFile, resultFile='result.txt'):
@@ -1261,7 +2684,7 @@ def test_circuit(circuitFile, resultFile='result.txt'):
     print('\n')
     print(circuitFile)
     init_target_by_circuitFile(circuitFile)
-    Session_processAll(resultFile)
+    return Session_processAll(resultFile)
 ##############################################################
 
 
@@ -1269,6 +2692,7 @@ def main():
     k = 4
     test_data_jsn("vs_circuit_solver\\data\\100khz.json", k, 'vs_circuit_solver\\data\\100khz_{}.txt'.format(k))
 
+
 if __name__ == '__main__':
     main()
 